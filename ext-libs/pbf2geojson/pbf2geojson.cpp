@@ -7,6 +7,10 @@
 #include <sstream>
 #include <string>
 #include <iomanip>
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+#include <vector>
 
 struct tile_location {
     const bool clipTile;
@@ -210,11 +214,12 @@ std::string ringsToString(std::vector<std::vector<Point>>& rings) {
     return result;
 }
 
-std::string getPolygonFeatures(std::string& id, std::string& properties, std::vector<std::vector<Point>>& rings, const bool& splitPolygons) {
+// splits the rings into polygons: rings within the bounding box of the first ring are its holes,
+// every other ring is a polygon of its own
+std::vector<std::vector<std::vector<Point>>> getPolygons(std::vector<std::vector<Point>>& rings, const bool& splitPolygons) {
+    std::vector<std::vector<std::vector<Point>>> polygons;
     if (rings.size() == 0)
-        return "";
-
-    std::string result;
+        return polygons;
 
     std::vector<Point> mainRing = rings[0];
 
@@ -241,20 +246,18 @@ std::string getPolygonFeatures(std::string& id, std::string& properties, std::ve
         }
     }
 
-    std::vector<std::string> coords;
-    auto mainFeatureCoords = ringsToString(mainRings);
-    coords.push_back(mainFeatureCoords);
-    if (int(separateRings.size()) > 0) {
-        for (auto r: separateRings) {
-            std::string newRingString("[");
-             newRingString += ringToString(r);
-             newRingString += ']';
-            coords.push_back(newRingString);
-        }
+    polygons.push_back(mainRings);
+    for (auto r: separateRings) {
+        polygons.push_back(std::vector<std::vector<Point>>{r});
     }
+    return polygons;
+}
+
+std::string getPolygonFeatures(std::string& id, std::string& properties, std::vector<std::vector<Point>>& rings, const bool& splitPolygons) {
+    std::string result;
 
     int count = 0;
-    for (auto c: coords) {
+    for (auto polygon: getPolygons(rings, splitPolygons)) {
         if (count++>0) {
             result += ',';
         }
@@ -262,7 +265,7 @@ std::string getPolygonFeatures(std::string& id, std::string& properties, std::ve
         result += id;
         result += ",\"type\":\"Feature\",\"geometry\":{\"coordinates\":[";
 
-        result += c;
+        result += ringsToString(polygon);
         result += "],\n\"type\":\"MultiPolygon\"";
         result += "},\"properties\":";
         result += properties;
@@ -369,18 +372,7 @@ void getJson(tile_location& loc, vtzero::layer& layer, std::stringstream& result
 	result << '}';
 }
 
-std::string decodeAsJson(tile_location& loc, const char* hex){
-	std::string hexString(hex);
-	std::string data;
-	data.reserve(hexString.size() / 2);
-	for (int i = 0; i < int(hexString.size()); i += 2)
-	{
-		std::istringstream iss(hexString.substr(i, 2));
-		int temp;
-		iss >> std::hex >> temp;
-		data += static_cast<char>(temp);
-	}
-
+std::string decodeDataAsJson(tile_location& loc, vtzero::data_view data){
 	std::stringstream test;
 
 	vtzero::vector_tile tile{data};
@@ -399,6 +391,274 @@ std::string decodeAsJson(tile_location& loc, const char* hex){
 	return test.str();
 }
 
+/*
+ * Binary output: the features as WKB geometries and typed properties instead of GeoJSON text.
+ * All numbers are little endian (the byte order of the supported platforms).
+ *
+ * tile:     "VTRB", uint32 version, uint32 layer count, layer*
+ * layer:    string name, uint32 extent, then for Point, LineString and Polygon: uint32 feature count, feature*
+ * feature:  uint64 id, uint32 WKB length, WKB, uint32 property count, property*
+ * property: string key, uint8 type, value
+ *           0: string, 1: double (float and double), 2: int64 (int and sint), 3: uint64, 4: bool (uint8)
+ * string:   uint32 length, UTF-8 bytes
+ */
+const uint32_t binaryFormatVersion = 1;
+
+struct binary_writer {
+    std::string& output;
+
+    template <typename T>
+    void write(const T value) const {
+        output.append(reinterpret_cast<const char*>(&value), sizeof(T));
+    }
+
+    void writeString(const std::string& value) const {
+        write<uint32_t>(static_cast<uint32_t>(value.size()));
+        output += value;
+    }
+
+    void writePoints(const std::vector<Point>& points) const {
+        write<uint32_t>(static_cast<uint32_t>(points.size()));
+        for (auto p : points) {
+            write<double>(p.x);
+            write<double>(p.y);
+        }
+    }
+
+    void writeWkbHeader(const uint32_t wkbType) const {
+        write<uint8_t>(1);
+        write<uint32_t>(wkbType);
+    }
+};
+
+struct write_property {
+    const binary_writer& writer;
+
+    void operator()(const vtzero::data_view& value) const {
+        writer.write<uint8_t>(0);
+        writer.writeString(std::string(value));
+    }
+
+    void operator()(const float value) const {
+        writer.write<uint8_t>(1);
+        writer.write<double>(value);
+    }
+
+    void operator()(const double value) const {
+        writer.write<uint8_t>(1);
+        writer.write<double>(value);
+    }
+
+    void operator()(const int64_t value) const {
+        writer.write<uint8_t>(2);
+        writer.write<int64_t>(value);
+    }
+
+    void operator()(const uint64_t value) const {
+        writer.write<uint8_t>(3);
+        writer.write<uint64_t>(value);
+    }
+
+    void operator()(const bool value) const {
+        writer.write<uint8_t>(4);
+        writer.write<uint8_t>(value ? 1 : 0);
+    }
+};
+
+// collects the points, linestrings or rings of a feature with absolute coordinates
+struct parts_handler {
+    int extent;
+    tile_location& loc;
+    std::vector<std::vector<Point>>& parts;
+
+    Point absolute(const vtzero::point point) const {
+        return Point{loc.x + loc.spanX / extent * point.x, loc.y + loc.spanY / extent * point.y};
+    }
+
+    void points_begin(const uint32_t count) {
+        parts.emplace_back();
+        parts.back().reserve(count);
+    }
+
+    void points_point(const vtzero::point point) {
+        if (loc.clipTile && (point.x < 0 || point.x > extent || point.y < 0 || point.y > extent))
+            return;
+        parts.back().push_back(absolute(point));
+    }
+
+    void points_end() const noexcept {
+    }
+
+    void linestring_begin(const uint32_t count) {
+        parts.emplace_back();
+        parts.back().reserve(count);
+    }
+
+    void linestring_point(const vtzero::point point) {
+        parts.back().push_back(absolute(point));
+    }
+
+    void linestring_end() const noexcept {
+    }
+
+    void ring_begin(const uint32_t count) {
+        parts.emplace_back();
+        parts.back().reserve(count);
+    }
+
+    void ring_point(const vtzero::point point) {
+        parts.back().push_back(absolute(point));
+    }
+
+    void ring_end(const vtzero::ring_type) const noexcept {
+    }
+};
+
+void writeFeature(std::string& output, const uint64_t id, const std::string& wkb, const uint32_t nrProperties, const std::string& properties) {
+    binary_writer writer{output};
+    writer.write<uint64_t>(id);
+    writer.writeString(wkb);
+    writer.write<uint32_t>(nrProperties);
+    output += properties;
+}
+
+void writeLayer(tile_location& loc, vtzero::layer& layer, const binary_writer& writer) {
+    writer.writeString(std::string{layer.name()});
+    const int extent = layer.extent();
+    writer.write<uint32_t>(static_cast<uint32_t>(extent));
+
+    std::string points;
+    std::string lines;
+    std::string polygons;
+    uint32_t nrPoints = 0;
+    uint32_t nrLines = 0;
+    uint32_t nrPolygons = 0;
+
+    while (auto feature = layer.next_feature()) {
+        const auto geometryType = feature.geometry_type();
+        if (geometryType != vtzero::GeomType::POINT
+            && geometryType != vtzero::GeomType::LINESTRING
+            && geometryType != vtzero::GeomType::POLYGON) {
+            continue;
+        }
+        const uint64_t id = feature.has_id() ? feature.id() : 0;
+
+        std::string properties;
+        const binary_writer propertyWriter{properties};
+        uint32_t nrProperties = 0;
+        while (auto property = feature.next_property()) {
+            propertyWriter.writeString(std::string(property.key()));
+            vtzero::apply_visitor(write_property{propertyWriter}, property.value());
+            nrProperties++;
+        }
+
+        std::vector<std::vector<Point>> parts;
+        vtzero::decode_geometry(feature.geometry(), parts_handler{extent, loc, parts});
+
+        std::string wkb;
+        const binary_writer wkbWriter{wkb};
+        switch (geometryType) {
+            case vtzero::GeomType::POINT: {
+                if (parts.empty() || parts[0].empty())
+                    break;
+                auto& featurePoints = parts[0];
+                if (featurePoints.size() == 1) {
+                    wkbWriter.writeWkbHeader(1);
+                    wkbWriter.write<double>(featurePoints[0].x);
+                    wkbWriter.write<double>(featurePoints[0].y);
+                } else {
+                    wkbWriter.writeWkbHeader(4);
+                    wkbWriter.write<uint32_t>(static_cast<uint32_t>(featurePoints.size()));
+                    for (auto p : featurePoints) {
+                        wkbWriter.writeWkbHeader(1);
+                        wkbWriter.write<double>(p.x);
+                        wkbWriter.write<double>(p.y);
+                    }
+                }
+                writeFeature(points, id, wkb, nrProperties, properties);
+                nrPoints++;
+                break;
+            }
+            case vtzero::GeomType::LINESTRING: {
+                wkbWriter.writeWkbHeader(5);
+                wkbWriter.write<uint32_t>(static_cast<uint32_t>(parts.size()));
+                for (auto& line : parts) {
+                    wkbWriter.writeWkbHeader(2);
+                    wkbWriter.writePoints(line);
+                }
+                writeFeature(lines, id, wkb, nrProperties, properties);
+                nrLines++;
+                break;
+            }
+            default: {
+                // like the GeoJSON output, each polygon is a feature with a MultiPolygon of one polygon
+                for (auto& polygon : getPolygons(parts, true)) {
+                    wkb.clear();
+                    wkbWriter.writeWkbHeader(6);
+                    wkbWriter.write<uint32_t>(1);
+                    wkbWriter.writeWkbHeader(3);
+                    wkbWriter.write<uint32_t>(static_cast<uint32_t>(polygon.size()));
+                    for (auto& ring : polygon) {
+                        wkbWriter.writePoints(ring);
+                    }
+                    writeFeature(polygons, id, wkb, nrProperties, properties);
+                    nrPolygons++;
+                }
+            }
+        }
+    }
+
+    writer.write<uint32_t>(nrPoints);
+    writer.output += points;
+    writer.write<uint32_t>(nrLines);
+    writer.output += lines;
+    writer.write<uint32_t>(nrPolygons);
+    writer.output += polygons;
+}
+
+std::string decodeDataAsWkb(tile_location& loc, vtzero::data_view data) {
+	vtzero::vector_tile tile{data};
+
+	std::string layers;
+	const binary_writer layerWriter{layers};
+	uint32_t layerCount = 0;
+	while (auto layer = tile.next_layer()) {
+		writeLayer(loc, layer, layerWriter);
+		layerCount++;
+	}
+
+	std::string result("VTRB");
+	const binary_writer writer{result};
+	writer.write<uint32_t>(binaryFormatVersion);
+	writer.write<uint32_t>(layerCount);
+	result += layers;
+	return result;
+}
+
+int hexValue(const char c) {
+	if (c >= '0' && c <= '9') {
+		return c - '0';
+	}
+	if (c >= 'a' && c <= 'f') {
+		return c - 'a' + 10;
+	}
+	if (c >= 'A' && c <= 'F') {
+		return c - 'A' + 10;
+	}
+	return 0;
+}
+
+std::string decodeAsJson(tile_location& loc, const char* hex){
+	const std::size_t hexLength = std::strlen(hex);
+	std::string data;
+	data.reserve(hexLength / 2);
+	for (std::size_t i = 0; i + 1 < hexLength; i += 2)
+	{
+		data += static_cast<char>((hexValue(hex[i]) << 4) | hexValue(hex[i + 1]));
+	}
+	return decodeDataAsJson(loc, vtzero::data_view{data.data(), data.size()});
+}
+
 extern "C" {
 	char* decodeMvtToJson(const bool clipTile, const int zoom, const int col, const int row, const double tileX, const double tileY, const double tileSpanX, const double tileSpanY, const char* data) {
 		tile_location loc{clipTile, zoom, col, row, tileX, tileY, tileSpanX, tileSpanY};
@@ -408,6 +668,23 @@ extern "C" {
 		return new_buf;
 	}
 
+	// the tile data is passed as pointer and length, the buffer is read without copying it
+	char* decodeMvtBufferToJson(const bool clipTile, const int zoom, const int col, const int row, const double tileX, const double tileY, const double tileSpanX, const double tileSpanY, const char* data, const size_t length) {
+		tile_location loc{clipTile, zoom, col, row, tileX, tileY, tileSpanX, tileSpanY};
+		auto res = decodeDataAsJson(loc, vtzero::data_view{data, length});
+		return strdup(res.c_str());
+	}
+
+	// the features are returned in the binary format (see decodeDataAsWkb), the length is written to resultLength
+	char* decodeMvtBufferToWkb(const bool clipTile, const int zoom, const int col, const int row, const double tileX, const double tileY, const double tileSpanX, const double tileSpanY, const char* data, const size_t length, size_t* resultLength) {
+		tile_location loc{clipTile, zoom, col, row, tileX, tileY, tileSpanX, tileSpanY};
+		auto res = decodeDataAsWkb(loc, vtzero::data_view{data, length});
+		char *new_buf = static_cast<char*>(malloc(res.size()));
+		std::memcpy(new_buf, res.data(), res.size());
+		*resultLength = res.size();
+		return new_buf;
+	}
+
 	void freeme(char *ptr) {
 		//printf("freeing address: %p\n", ptr);
 		free(ptr);
@@ -20,6 +20,12 @@ class OptionsGroup(QGroupBox, Ui_OptionsGroup):
     _SET_BACKGROUND_COLOR = "set_background_color"
     _MODE = "mode"
     _IGNORE_CRS = "ignore_crs"
+    _PROGRESSIVE_UPDATE_INTERVAL = "progressive_update_interval_ms"
+    _DECODER_POOL_SIZE = "decoder_pool_size"
+    _DECODER_MAX_TASKS_PER_WORKER = "decoder_max_tasks_per_worker"
+    _DECODER_MAX_WORKER_MEMORY_MB = "decoder_max_worker_memory_mb"
+
+    _default_progressive_update_interval_ms = 500
 
     class Mode(object):
         MANUAL = "manual"
@@ -40,6 +46,10 @@ class OptionsGroup(QGroupBox, Ui_OptionsGroup):
         _SET_BACKGROUND_COLOR: True,
         _MODE: Mode.MANUAL,
         _IGNORE_CRS: False,
+        _PROGRESSIVE_UPDATE_INTERVAL: None,
+        _DECODER_POOL_SIZE: None,
+        _DECODER_MAX_TASKS_PER_WORKER: None,
+        _DECODER_MAX_WORKER_MEMORY_MB: None,
     }
 
     def __init__(self, settings, target_groupbox, zoom_change_handler):
@@ -281,6 +291,52 @@ class OptionsGroup(QGroupBox, Ui_OptionsGroup):
             return None
         return tile_limit
 
+    def progressive_update_interval(self):
+        """
+         * The interval in milliseconds in which the layers are updated while the tiles are being loaded.
+           The reader extends it, if the updates take long.
+         * There's no widget for this option, it can only be changed in the settings. 0 disables the updates.
+        """
+        interval = self._options[self._PROGRESSIVE_UPDATE_INTERVAL]
+        if interval is None or interval == "":
+            interval = self._default_progressive_update_interval_ms
+        interval = int(interval)
+        if interval <= 0:
+            return None
+        return interval
+
+    def decoder_pool_size(self):
+        """
+         * The number of processes which decode the tiles in parallel, None if the number of CPUs is used
+         * There's no widget for this option, it can only be changed in the settings
+        """
+        size = self._options[self._DECODER_POOL_SIZE]
+        if size is None or size == "" or int(size) <= 0:
+            return None
+        return int(size)
+
+    def decoder_max_tasks_per_worker(self):
+        """
+         * The number of tasks (chunks of tiles) after which a decoder process is replaced to release its memory,
+           0 keeps the processes forever and None uses the default
+         * There's no widget for this option, it can only be changed in the settings
+        """
+        max_tasks = self._options[self._DECODER_MAX_TASKS_PER_WORKER]
+        if max_tasks is None or max_tasks == "":
+            return None
+        return max(0, int(max_tasks))
+
+    def decoder_max_worker_memory_mb(self):
+        """
+         * The peak memory (MB) of a decoder process after which the processes are replaced,
+           0 disables the limit and None uses the default
+         * There's no widget for this option, it can only be changed in the settings
+        """
+        max_memory = self._options[self._DECODER_MAX_WORKER_MEMORY_MB]
+        if max_memory is None or max_memory == "":
+            return None
+        return max(0, int(max_memory))
+
     def apply_styles_enabled(self):
         enabled = self.chkApplyStyles.isChecked()
         self._set_option(self._APPLY_STYLES, enabled)
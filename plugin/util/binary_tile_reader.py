@@ -0,0 +1,214 @@
+import struct
+from typing import Callable, Dict, List, Tuple
+
+from .tile_helper import VectorTile
+
+"""
+ * Reads the binary output of the native decoder (decodeMvtBufferToWkb), see decodeDataAsWkb in pbf2geojson.cpp
+ * The buffer is read through a memoryview, i.e. the buffer allocated by the native decoder is read without copying it
+"""
+
+_MAGIC = b"VTRB"
+_VERSION = 1
+_GEO_TYPES = ["Point", "LineString", "Polygon"]
+
+_UINT8 = struct.Struct("<B")
+_UINT32 = struct.Struct("<I")
+_HEADER = struct.Struct("<II")
+_FEATURE_HEADER = struct.Struct("<QI")
+_WKB_HEADER = struct.Struct("<BI")
+_DOUBLE = struct.Struct("<d")
+_INT64 = struct.Struct("<q")
+_UINT64 = struct.Struct("<Q")
+_POINT = struct.Struct("<2d")
+
+_WKB_POINT = 1
+_WKB_LINE_STRING = 2
+_WKB_POLYGON = 3
+_WKB_TYPES = {
+    _WKB_POINT: "Point",
+    _WKB_LINE_STRING: "LineString",
+    _WKB_POLYGON: "Polygon",
+    4: "MultiPoint",
+    5: "MultiLineString",
+    6: "MultiPolygon",
+}
+
+
+def read_binary_tile(buffer, tile: VectorTile) -> Dict[str, dict]:
+    """
+     * Returns the decoded data in the same structure as the GeoJSON output of the native decoder, i.e. per layer
+       the extent and the features per geometry type
+     * Instead of a GeoJSON geometry, each feature contains its geometry as WKB (key 'wkb'), from which the
+       QGIS features are created without parsing coordinates in python (see to_geojson_feature)
+    :param buffer: A bytes-like object with the binary output
+    :param tile: The tile the data has been decoded for, its column, row and zoom level are added to the properties
+    :return:
+    """
+    view = memoryview(buffer)
+    if bytes(view[:4]) != _MAGIC:
+        raise RuntimeError("The data is not in the binary format of the native decoder")
+    version, nr_layers = _HEADER.unpack_from(view, 4)
+    if version != _VERSION:
+        raise RuntimeError("Version {} of the binary format is not supported".format(version))
+    offset = 4 + _HEADER.size
+
+    tile_properties = {"_col": tile.column, "_row": tile.row, "_zoom": tile.zoom_level}
+    decoded_data = {}
+    for _ in range(nr_layers):
+        layer_name, offset = _read_string(view, offset)
+        extent = _UINT32.unpack_from(view, offset)[0]
+        offset += _UINT32.size
+        layer = {"extent": extent, "isGeojson": True}
+        for geo_type in _GEO_TYPES:
+            nr_features = _UINT32.unpack_from(view, offset)[0]
+            offset += _UINT32.size
+            features = []
+            for _ in range(nr_features):
+                feature, offset = _read_feature(view, offset)
+                feature["properties"].update(tile_properties)
+                features.append(feature)
+            layer[geo_type] = features
+        decoded_data[layer_name] = layer
+    return decoded_data
+
+
+def _read_feature(view: memoryview, offset: int) -> Tuple[dict, int]:
+    feature_id, wkb_length = _FEATURE_HEADER.unpack_from(view, offset)
+    offset += _FEATURE_HEADER.size
+    wkb = bytes(view[offset : offset + wkb_length])
+    offset += wkb_length
+    nr_properties = _UINT32.unpack_from(view, offset)[0]
+    offset += _UINT32.size
+    properties = {}
+    for _ in range(nr_properties):
+        key, offset = _read_string(view, offset)
+        properties[key], offset = _read_value(view, offset)
+    return {"id": feature_id, "type": "Feature", "wkb": wkb, "properties": properties}, offset
+
+
+def _read_string(view: memoryview, offset: int) -> Tuple[str, int]:
+    length = _UINT32.unpack_from(view, offset)[0]
+    offset += _UINT32.size
+    return str(view[offset : offset + length], "utf-8", "replace"), offset + length
+
+
+def _read_value(view: memoryview, offset: int):
+    value_type = _UINT8.unpack_from(view, offset)[0]
+    offset += _UINT8.size
+    if value_type == 0:
+        return _read_string(view, offset)
+    if value_type == 1:
+        return _DOUBLE.unpack_from(view, offset)[0], offset + _DOUBLE.size
+    if value_type == 2:
+        return _INT64.unpack_from(view, offset)[0], offset + _INT64.size
+    if value_type == 3:
+        return _UINT64.unpack_from(view, offset)[0], offset + _UINT64.size
+    if value_type == 4:
+        return bool(_UINT8.unpack_from(view, offset)[0]), offset + _UINT8.size
+    raise RuntimeError("Unknown property type: {}".format(value_type))
+
+
+def to_geojson_feature(feature: dict) -> dict:
+    """
+     * Returns the GeoJSON feature of a feature returned by read_binary_tile
+    """
+    if "wkb" not in feature:
+        return feature
+    geojson_feature = {k: v for k, v in feature.items() if k != "wkb"}
+    geojson_feature["geometry"] = read_wkb(feature["wkb"])
+    return geojson_feature
+
+
+def map_wkb(buffer, map_point: Callable[[List[float]], List[float]]) -> bytes:
+    """
+     * Returns a copy of the little endian WKB geometry (2D) with each point mapped by map_point
+    """
+    view = memoryview(buffer)
+    mapped = bytearray(view)
+    _map_wkb_geometry(view, mapped, 0, map_point)
+    return bytes(mapped)
+
+
+def _map_wkb_geometry(view: memoryview, mapped: bytearray, offset: int, map_point) -> int:
+    byte_order, wkb_type = _WKB_HEADER.unpack_from(view, offset)
+    if byte_order != 1:
+        raise RuntimeError("Only little endian WKB is supported")
+    if wkb_type not in _WKB_TYPES:
+        raise RuntimeError("Unsupported WKB geometry type: {}".format(wkb_type))
+    offset += _WKB_HEADER.size
+
+    if wkb_type == _WKB_POINT:
+        return _map_points(view, mapped, offset, 1, map_point)
+    if wkb_type == _WKB_LINE_STRING:
+        nr_points = _UINT32.unpack_from(view, offset)[0]
+        return _map_points(view, mapped, offset + _UINT32.size, nr_points, map_point)
+    if wkb_type == _WKB_POLYGON:
+        nr_rings = _UINT32.unpack_from(view, offset)[0]
+        offset += _UINT32.size
+        for _ in range(nr_rings):
+            nr_points = _UINT32.unpack_from(view, offset)[0]
+            offset = _map_points(view, mapped, offset + _UINT32.size, nr_points, map_point)
+        return offset
+    nr_geometries = _UINT32.unpack_from(view, offset)[0]
+    offset += _UINT32.size
+    for _ in range(nr_geometries):
+        offset = _map_wkb_geometry(view, mapped, offset, map_point)
+    return offset
+
+
+def _map_points(view: memoryview, mapped: bytearray, offset: int, nr_points: int, map_point) -> int:
+    for _ in range(nr_points):
+        _POINT.pack_into(mapped, offset, *map_point(_POINT.unpack_from(view, offset)))
+        offset += _POINT.size
+    return offset
+
+
+def read_wkb(buffer) -> dict:
+    """
+     * Returns the GeoJSON geometry of a little endian WKB geometry (2D)
+    """
+    geometry_type, coordinates, _ = _read_wkb_geometry(memoryview(buffer), 0)
+    return {"type": geometry_type, "coordinates": coordinates}
+
+
+def _read_wkb_geometry(view: memoryview, offset: int) -> Tuple[str, list, int]:
+    byte_order, wkb_type = _WKB_HEADER.unpack_from(view, offset)
+    if byte_order != 1:
+        raise RuntimeError("Only little endian WKB is supported")
+    if wkb_type not in _WKB_TYPES:
+        raise RuntimeError("Unsupported WKB geometry type: {}".format(wkb_type))
+    offset += _WKB_HEADER.size
+
+    if wkb_type == _WKB_POINT:
+        coordinates = list(_POINT.unpack_from(view, offset))
+        offset += _POINT.size
+    elif wkb_type == _WKB_LINE_STRING:
+        coordinates, offset = _read_points(view, offset)
+    elif wkb_type == _WKB_POLYGON:
+        coordinates, offset = _read_rings(view, offset)
+    else:
+        nr_geometries = _UINT32.unpack_from(view, offset)[0]
+        offset += _UINT32.size
+        coordinates = []
+        for _ in range(nr_geometries):
+            _, part, offset = _read_wkb_geometry(view, offset)
+            coordinates.append(part)
+    return _WKB_TYPES[wkb_type], coordinates, offset
+
+
+def _read_points(view: memoryview, offset: int) -> Tuple[List[List[float]], int]:
+    nr_points = _UINT32.unpack_from(view, offset)[0]
+    offset += _UINT32.size
+    end = offset + nr_points * _POINT.size
+    return [list(p) for p in _POINT.iter_unpack(view[offset:end])], end
+
+
+def _read_rings(view: memoryview, offset: int) -> Tuple[List[List[List[float]]], int]:
+    nr_rings = _UINT32.unpack_from(view, offset)[0]
+    offset += _UINT32.size
+    rings = []
+    for _ in range(nr_rings):
+        ring, offset = _read_points(view, offset)
+        rings.append(ring)
+    return rings, offset
@@ -4,6 +4,7 @@ class _ConnectionTypes(object):
 
     TileJSON = "TileJSON"
     MBTiles = "MBTiles"
+    PMTiles = "PMTiles"
     Directory = "Directory"
     PostGIS = "PostGIS"
 
@@ -12,7 +13,16 @@ ConnectionTypes = _ConnectionTypes()
 
 MBTILES_CONNECTION_TEMPLATE = {"name": None, "path": None, "type": ConnectionTypes.MBTiles, "style": None}
 
-DIRECTORY_CONNECTION_TEMPLATE = {"name": None, "path": None, "type": ConnectionTypes.Directory, "style": None}
+PMTILES_CONNECTION_TEMPLATE = {"name": None, "path": None, "type": ConnectionTypes.PMTiles, "style": None}
+
+DIRECTORY_CONNECTION_TEMPLATE = {
+    "name": None,
+    "path": None,
+    "type": ConnectionTypes.Directory,
+    "style": None,
+    "max_concurrent_reads": None,
+    "mmap_min_size_kb": None,
+}
 
 TILEJSON_CONNECTION_TEMPLATE = {
     "name": "",
@@ -22,6 +32,8 @@ TILEJSON_CONNECTION_TEMPLATE = {
     "can_edit": None,
     "disabled": None,
     "style": "",
+    "max_requests_per_host": None,
+    "subdomains": None,
 }
 
 POSTGIS_CONNECTION_TEMPLATE = {
@@ -34,4 +46,6 @@ POSTGIS_CONNECTION_TEMPLATE = {
     "save_password": True,
     "type": ConnectionTypes.PostGIS,
     "style": None,
+    "min_zoom": None,
+    "max_zoom": None,
 }
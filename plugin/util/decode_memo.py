@@ -0,0 +1,127 @@
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from .binary_tile_reader import map_wkb
+from .tile_helper import VectorTile, get_tile_location
+
+TileLocation = Tuple[float, float, float, float]  # (x, y, span_x, span_y) as returned by get_tile_location
+
+
+def get_content_key(tile: VectorTile, data: bytes) -> Hashable:
+    """
+     * Returns the key by which the decoded data of the tile is memoized
+     * The tile_id of the deduplicated MBTiles schema is used if the source provides it.
+       Otherwise, the key is the hash of the (possibly gzipped) tile data.
+    :param tile:
+    :param data: The encoded tile data
+    :return:
+    """
+    if tile.content_key is not None:
+        return "tile_id", tile.content_key
+    return "sha1", hashlib.sha1(data).hexdigest()
+
+
+class DecodeMemo(object):
+    """
+     * A bounded LRU memo of decoded tile data, keyed by the content of the tiles
+     * Identical tiles (i.e. ocean or land tiles) are decoded once and the decoded data is shared by all tiles with
+       the same content.
+     * Data with tile-relative coordinates (python decoder) is shared as it is. Data with absolute coordinates
+       (native decoder) is stored together with the location of the tile it was decoded for and mapped to the
+       location of each tile it is requested for.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[TileLocation], dict]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def put(self, key: Hashable, decoded_data: dict, location: Optional[TileLocation] = None) -> None:
+        """
+        :param key: The content key of the tile
+        :param decoded_data:
+        :param location: The location of the tile, if the coordinates of decoded_data are absolute
+        """
+        self._entries[key] = (location, decoded_data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, tile: VectorTile) -> Optional[dict]:
+        """
+         * Returns the memoized data for the specified tile or None, if the key is unknown
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        location, decoded_data = entry
+        if location is None:
+            return decoded_data
+        return map_decoded_data(decoded_data, location, tile)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def map_decoded_data(decoded_data: dict, source_location: TileLocation, tile: VectorTile) -> dict:
+    """
+     * Maps the features created by the native decoder (GeoJSON or WKB geometries) from the tile they have been
+       decoded for to the specified tile
+    :param decoded_data: The decoded data as returned by the native decoder
+    :param source_location: The location of the tile the data has been decoded for
+    :param tile: The target tile
+    :return:
+    """
+    target_location = get_tile_location(tile)
+    if target_location == source_location:
+        return decoded_data
+
+    src_x, src_y, src_span_x, src_span_y = source_location
+    x, y, span_x, span_y = target_location
+    scale_x = span_x / src_span_x
+    scale_y = span_y / src_span_y
+
+    def map_point(point):
+        return [x + (point[0] - src_x) * scale_x, y + (point[1] - src_y) * scale_y]
+
+    mapped_data = {}
+    for layer_name, layer in decoded_data.items():
+        if not layer.get("isGeojson"):
+            mapped_data[layer_name] = layer
+            continue
+        mapped_layer = dict(layer)
+        for geo_type in ["Point", "LineString", "Polygon"]:
+            features = layer.get(geo_type)
+            if features:
+                mapped_layer[geo_type] = [_map_feature(f, tile, map_point) for f in features]
+        mapped_data[layer_name] = mapped_layer
+    return mapped_data
+
+
+def _map_feature(feature: dict, tile: VectorTile, map_point) -> dict:
+    properties = dict(feature["properties"])
+    properties["_col"] = tile.column
+    properties["_row"] = tile.row
+    properties["_zoom"] = tile.zoom_level
+    mapped_feature = dict(feature)
+    mapped_feature["properties"] = properties
+    if "wkb" in feature:
+        mapped_feature["wkb"] = map_wkb(feature["wkb"], map_point)
+    else:
+        geometry = dict(feature["geometry"])
+        geometry["coordinates"] = _map_coordinates(geometry["coordinates"], map_point)
+        mapped_feature["geometry"] = geometry
+    return mapped_feature
+
+
+def _map_coordinates(coordinates, map_point):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return map_point(coordinates)
+    return [_map_coordinates(c, map_point) for c in coordinates]
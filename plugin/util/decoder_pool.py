@@ -0,0 +1,216 @@
+import math
+import multiprocessing
+import sys
+import threading
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional
+
+from .log_helper import debug, info
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+default_max_tasks_per_worker = 100
+default_max_worker_memory_mb = 1024
+_chunks_per_worker = 4
+
+
+def _initialize_worker() -> None:
+    """
+     * Imports the decoders when the worker is started, i.e. the native library is loaded once per worker and not
+       with the first tile it decodes
+    """
+    try:
+        from . import mp_helper  # noqa: F401
+    except Exception as e:
+        # a failing initializer would make the pool restart the process endlessly, the error is reported by the
+        # decoding instead
+        debug("Importing the decoders failed: {}", e)
+
+
+def get_peak_memory_mb() -> Optional[float]:
+    """
+     * Returns the peak resident memory of the current process in MB or None, if it can't be retrieved
+    """
+    try:
+        if resource:
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # bytes on macOS, kilobytes on Linux
+            return max_rss / (1024.0 * 1024.0) if sys.platform == "darwin" else max_rss / 1024.0
+        if sys.platform.startswith("win32"):
+            return _get_peak_working_set_mb()
+    except Exception as e:
+        debug("Retrieving the memory usage failed: {}", e)
+    return None
+
+
+def _get_peak_working_set_mb() -> float:
+    from ctypes import Structure, byref, c_size_t, c_ulong, sizeof, windll
+
+    class ProcessMemoryCounters(Structure):
+        _fields_ = [
+            ("cb", c_ulong),
+            ("PageFaultCount", c_ulong),
+            ("PeakWorkingSetSize", c_size_t),
+            ("WorkingSetSize", c_size_t),
+            ("QuotaPeakPagedPoolUsage", c_size_t),
+            ("QuotaPagedPoolUsage", c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", c_size_t),
+            ("QuotaNonPagedPoolUsage", c_size_t),
+            ("PagefileUsage", c_size_t),
+            ("PeakPagefileUsage", c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = sizeof(counters)
+    process = windll.kernel32.GetCurrentProcess()
+    if not windll.psapi.GetProcessMemoryInfo(process, byref(counters), counters.cb):
+        raise RuntimeError("GetProcessMemoryInfo failed")
+    return counters.PeakWorkingSetSize / (1024.0 * 1024.0)
+
+
+def _run_measured(func: Callable, item):
+    """
+     * Runs the task in a decoder process and returns its result together with the peak memory of the process
+    """
+    return func(item), get_peak_memory_mb()
+
+
+class _MeasuredResults(object):
+    """
+     * The results of imap_unordered without the memory reported by the processes, which is passed to on_memory
+    """
+
+    def __init__(self, results, on_memory: Callable[[Optional[float]], None]):
+        self._results = results
+        self._on_memory = on_memory
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self, timeout: float = None):
+        result, memory_mb = self._results.next(timeout)
+        self._on_memory(memory_mb)
+        return result
+
+
+def get_default_pool_size() -> int:
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        info("CPU count cannot be retrieved. Falling back to default = 4")
+        return 4
+
+
+class DecoderPool(object):
+    """
+     * A long-lived pool of decoder processes, which is shared by all loading processes
+     * The processes are started with the first tiles to decode and kept running until shutdown is called, i.e.
+       small loads don't pay the startup of the processes and the import of the decoders
+     * Each process is replaced after max_tasks_per_worker tasks, where a task is a chunk of tiles
+       (see get_chunk_size)
+     * The memory of the processes is limited by max_worker_memory_mb: the processes report their peak memory
+       with each result and once a process has exceeded the limit, the processes are replaced before the next
+       tiles are decoded. A process can't leave the pool by itself without losing the task it has taken next.
+    """
+
+    def __init__(self, size: int = None, max_tasks_per_worker: int = None, max_worker_memory_mb: int = None):
+        self.size = None
+        self.max_tasks_per_worker = None
+        self.max_worker_memory_mb = None
+        self._pool: Optional[multiprocessing.Pool] = None
+        self._recycle_requested = False
+        self._lock = threading.Lock()
+        self.configure(size=size, max_tasks_per_worker=max_tasks_per_worker, max_worker_memory_mb=max_worker_memory_mb)
+
+    def configure(self, size: int = None, max_tasks_per_worker: int = None, max_worker_memory_mb: int = None) -> None:
+        """
+         * Changes the number of processes and the limits after which the processes are replaced. A running
+           pool is stopped, if the number of processes or tasks changes, and started again with the next tiles
+           to decode.
+        :param size: The number of processes, defaults to the number of CPUs
+        :param max_tasks_per_worker: Defaults to default_max_tasks_per_worker, 0 keeps the processes forever
+        :param max_worker_memory_mb: The peak memory of a process after which the processes are replaced.
+            Defaults to default_max_worker_memory_mb, 0 disables the limit.
+        """
+        if not size or size <= 0:
+            size = get_default_pool_size()
+        if max_tasks_per_worker is None or max_tasks_per_worker < 0:
+            max_tasks_per_worker = default_max_tasks_per_worker
+        if max_worker_memory_mb is None or max_worker_memory_mb < 0:
+            max_worker_memory_mb = default_max_worker_memory_mb
+        self.max_worker_memory_mb = max_worker_memory_mb
+        if (size, max_tasks_per_worker) == (self.size, self.max_tasks_per_worker):
+            return
+        self.size = size
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.terminate()
+
+    def is_running(self) -> bool:
+        return self._pool is not None
+
+    def _get_pool(self) -> multiprocessing.Pool:
+        with self._lock:
+            if self._pool is None:
+                info("Starting {} decoder processes...", self.size)
+                self._pool = multiprocessing.Pool(
+                    processes=self.size,
+                    initializer=_initialize_worker,
+                    maxtasksperchild=self.max_tasks_per_worker or None,
+                )
+            return self._pool
+
+    def get_chunk_size(self, nr_of_items: int) -> int:
+        """
+         * Each process gets several chunks, so the processes finish at about the same time, even if the tiles
+           take different times to decode
+        """
+        return max(1, int(math.ceil(nr_of_items / float(self.size * _chunks_per_worker))))
+
+    def imap_unordered(self, func: Callable, items: Iterable, nr_of_items: int = None) -> Iterator:
+        """
+         * Applies func to the items in the processes of the pool. The results are returned in the order they
+           are completed.
+         * The iterator's next accepts a timeout, i.e. the caller can stay responsive while waiting for results
+        :param func: A function, which can be pickled, i.e. a module level function
+        :param items:
+        :param nr_of_items: The number of items, if items is not a sized collection
+        """
+        if nr_of_items is None:
+            nr_of_items = len(items)
+        if self._recycle_requested:
+            info("Replacing the decoder processes, which exceeded {} MB", self.max_worker_memory_mb)
+            self.terminate()
+        chunk_size = self.get_chunk_size(nr_of_items)
+        debug("Decoding {} items in chunks of {}", nr_of_items, chunk_size)
+        results = self._get_pool().imap_unordered(partial(_run_measured, func), items, chunksize=chunk_size)
+        return _MeasuredResults(results, self._check_memory)
+
+    def _check_memory(self, memory_mb: Optional[float]) -> None:
+        if self.max_worker_memory_mb and memory_mb and memory_mb > self.max_worker_memory_mb:
+            if not self._recycle_requested:
+                debug("A decoder process has used {:.0f} MB", memory_mb)
+            self._recycle_requested = True
+
+    def terminate(self) -> None:
+        """
+         * Stops the processes immediately, i.e. when a loading process is cancelled. The pool is started again
+           with the next tiles to decode.
+        """
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+            self._recycle_requested = False
+        if pool:
+            debug("Terminating decoder processes")
+            pool.terminate()
+            pool.join()
+
+    def shutdown(self) -> None:
+        info("Shutting down decoder pool...")
+        self.terminate()
@@ -1,10 +1,23 @@
 import numbers
+import os
+import shutil
 import uuid
+from typing import List
 
 from PyQt5.QtCore import QVariant
-from qgis.core import QgsField, QgsGeometry, QgsRectangle, QgsSpatialIndex
-
-from .log_helper import info
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsVectorFileWriter,
+    QgsWkbTypes,
+)
+
+from .log_helper import info, warn
 from .tile_helper import tile_to_latlon
 
 
@@ -136,6 +149,77 @@ class FeatureMerger(object):
             )
 
 
+def write_wkb_features(file_path: str, features: List[dict], crs: str) -> bool:
+    """
+     * Writes the features with WKB geometries (see binary_tile_reader) as GeoJSON file, without serializing them
+       in python: the QGIS features are created from the WKB and written by OGR
+     * The features are written to a temporary file first, which is then copied to file_path. Due to this,
+       the file can be replaced while a layer has it opened, like when it's written with json.dumps.
+    :param crs: The crs of the coordinates, i.e. 'urn:ogc:def:crs:EPSG::3857'
+    :return: False if the features couldn't be written
+    """
+    fields = _get_fields([f["properties"] for f in features])
+    temp_path = "{}.tmp.geojson".format(file_path)
+    writer = QgsVectorFileWriter(
+        temp_path, "utf-8", fields, QgsWkbTypes.Unknown, QgsCoordinateReferenceSystem.fromOgcWmsCrs(crs), "GeoJSON"
+    )
+    try:
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            warn("Creating '{}' failed: {}", temp_path, writer.errorMessage())
+            return False
+        field_names = fields.names()
+        qgis_features = []
+        for f in features:
+            feature = QgsFeature(fields)
+            geometry = QgsGeometry()
+            geometry.fromWkb(f["wkb"])
+            feature.setGeometry(geometry)
+            properties = f["properties"]
+            feature.setAttributes([properties.get(name) for name in field_names])
+            qgis_features.append(feature)
+        if not writer.addFeatures(qgis_features):
+            warn("Writing the features to '{}' failed: {}", temp_path, writer.errorMessage())
+            return False
+    finally:
+        # the file is completed when the writer is deleted
+        del writer
+    shutil.copyfile(temp_path, file_path)
+    os.remove(temp_path)
+    return True
+
+
+def _get_fields(properties: List[dict]) -> QgsFields:
+    """
+     * Returns the fields of all specified properties. The type of a field with numbers of different types is
+       Double, with values of other different types it's String.
+    """
+    types_by_name = {}
+    for p in properties:
+        for name, value in p.items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value_type = QVariant.Bool
+            elif isinstance(value, int):
+                value_type = QVariant.LongLong
+            elif isinstance(value, float):
+                value_type = QVariant.Double
+            else:
+                value_type = QVariant.String
+            current_type = types_by_name.setdefault(name, value_type)
+            if current_type == value_type:
+                continue
+            numeric_types = (QVariant.LongLong, QVariant.Double)
+            if current_type in numeric_types and value_type in numeric_types:
+                types_by_name[name] = QVariant.Double
+            else:
+                types_by_name[name] = QVariant.String
+    fields = QgsFields()
+    for name, value_type in types_by_name.items():
+        fields.append(QgsField(name, value_type))
+    return fields
+
+
 class _GeoTypes(object):
     def __init__(self):
         pass
@@ -12,6 +12,11 @@ try:
 except ImportError:
     import pickle as pickle
 
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
 
 geojson_folder = "tmp"
 max_cache_age_minutes = 1440  # 24 hours
@@ -49,37 +54,139 @@ def _get_cache_entry_path(cache_name, zoom_level, x, y):
     return os.path.join(get_cache_directory(), cache_name, str(zoom_level), str(x), "{}.bin".format(y))
 
 
+def _get_cache_validators_path(cache_name, zoom_level, x, y):
+    return os.path.join(get_cache_directory(), cache_name, str(zoom_level), str(x), "{}.json".format(y))
+
+
+def _read_cache_validators(validators_path):
+    if not os.path.isfile(validators_path):
+        return None
+    try:
+        with open(validators_path, "r") as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_cache_validators(validators_path, cache_headers):
+    validators = {
+        "etag": cache_headers.get("etag"),
+        "last_modified": cache_headers.get("last_modified"),
+        "expires": _get_expiry(cache_headers),
+    }
+    with open(validators_path, "w") as f:
+        json.dump(validators, f)
+
+
+def _get_expiry(cache_headers):
+    """
+     * Responses without a lifetime expire after max_cache_age_minutes
+    """
+    expires = cache_headers.get("expires") if cache_headers else None
+    if expires is None:
+        expires = time.time() + max_cache_age_minutes * 60
+    return expires
+
+
+def _is_revalidatable(validators):
+    return bool(validators and (validators.get("etag") or validators.get("last_modified")))
+
+
+def _is_expired(file_path, validators):
+    if validators and validators.get("expires") is not None:
+        return time.time() > validators["expires"]
+    age_in_seconds = int(time.time()) - os.path.getmtime(file_path)
+    return age_in_seconds > max_cache_age_minutes * 60
+
+
 def get_cache_entry(cache_name, zoom_level, x, y):
+    """
+     * Returns the decoded data of the cached tile or None, if the tile is not cached or the entry has expired
+     * Expired entries with validators (ETag, Last-Modified) are kept, so that they can be revalidated
+       with a conditional request (see get_cache_validators). Other expired entries are removed.
+    """
     file_path = _get_cache_entry_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
+    validators_path = _get_cache_validators_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
     decoded_data = None
     try:
         if os.path.isfile(file_path):
-            age_in_seconds = int(time.time()) - os.path.getmtime(file_path)
-            is_deprecated = age_in_seconds > max_cache_age_minutes * 60
-            if is_deprecated:
-                os.remove(file_path)
-            else:
+            validators = _read_cache_validators(validators_path)
+            if not _is_expired(file_path, validators):
                 with open(file_path, "rb") as f:
                     decoded_data = pickle.load(f)
+            elif not _is_revalidatable(validators):
+                os.remove(file_path)
+                if validators is not None:
+                    os.remove(validators_path)
     except:
         critical("Error while reading cache entry {}: {}", file_path, sys.exc_info()[1])
     return decoded_data
 
 
-def cache_tile(cache_name, zoom_level, x, y, decoded_data):
+def get_cache_validators(cache_name, zoom_level, x, y):
+    """
+     * Returns the validators (etag, last_modified) of the expired cache entry of the tile or None,
+       if the tile has no entry which can be revalidated
+    """
     file_path = _get_cache_entry_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
     if not os.path.isfile(file_path):
-        if not decoded_data:
-            warn("Trying to cache a tile without data: {}: {},{},{}", cache_name, zoom_level, x, y)
-        else:
-            try:
-                directory = os.path.dirname(file_path)
-                if not os.path.isdir(directory):
-                    os.makedirs(directory)
-                with open(file_path, "wb") as f:
-                    pickle.dump(decoded_data, f, protocol=pickle.HIGHEST_PROTOCOL)
-            except:
-                critical("Error during caching of '{}': {}", file_path, sys.exc_info()[1])
+        return None
+    validators = _read_cache_validators(_get_cache_validators_path(cache_name, zoom_level, x, y))
+    if _is_revalidatable(validators) and _is_expired(file_path, validators):
+        return validators
+    return None
+
+
+def refresh_cache_entry(cache_name, zoom_level, x, y, cache_headers):
+    """
+     * Renews the lifetime of the cache entry after the server confirmed that the tile is unchanged (304 Not Modified)
+       and returns the decoded data of the entry
+    :param cache_headers: The validators and lifetime of the 304 response, see network_helper.parse_cache_headers
+    :return: The decoded data or None, if the entry can't be read
+    """
+    file_path = _get_cache_entry_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
+    validators_path = _get_cache_validators_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
+    decoded_data = None
+    try:
+        with open(file_path, "rb") as f:
+            decoded_data = pickle.load(f)
+        validators = _read_cache_validators(validators_path) or {}
+        # validators missing in the 304 response remain valid
+        validators.update({k: v for k, v in (cache_headers or {}).items() if v is not None and k != "expires"})
+        validators["expires"] = (cache_headers or {}).get("expires")
+        _write_cache_validators(validators_path, validators)
+    except:
+        critical("Error while refreshing cache entry {}: {}", file_path, sys.exc_info()[1])
+    return decoded_data
+
+
+def cache_tile(cache_name, zoom_level, x, y, decoded_data, cache_headers=None):
+    """
+     * Stores the decoded data of the tile
+    :param cache_headers: The validators and the lifetime of the response the tile has been downloaded with,
+        see network_helper.parse_cache_headers. An existing entry is only replaced if they are specified,
+        i.e. if the tile has been downloaded again.
+    """
+    file_path = _get_cache_entry_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
+    if os.path.isfile(file_path) and cache_headers is None:
+        return
+    if not decoded_data:
+        warn("Trying to cache a tile without data: {}: {},{},{}", cache_name, zoom_level, x, y)
+        return
+
+    try:
+        directory = os.path.dirname(file_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(file_path, "wb") as f:
+            pickle.dump(decoded_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        validators_path = _get_cache_validators_path(cache_name=cache_name, zoom_level=zoom_level, x=x, y=y)
+        if cache_headers:
+            _write_cache_validators(validators_path, cache_headers)
+        elif os.path.isfile(validators_path):
+            os.remove(validators_path)
+    except:
+        critical("Error during caching of '{}': {}", file_path, sys.exc_info()[1])
 
 
 def get_sample_data_directory():
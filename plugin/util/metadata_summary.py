@@ -0,0 +1,79 @@
+import os
+import sys
+from typing import Callable, Optional
+
+from .log_helper import debug, info, warn
+from .tile_index import get_file_signature, get_index_path
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+_VERSION = 1
+
+summary_fields = [
+    "name",
+    "attribution",
+    "min_zoom",
+    "max_zoom",
+    "mask_level",
+    "scheme",
+    "bounds",
+    "crs",
+    "vector_layers",
+]
+
+
+def load_metadata_summary(path: str) -> Optional[dict]:
+    """
+     * Returns the persisted metadata summary of the specified file or None, if there is none or the file
+       has been changed since the summary has been created
+    :param path: The path of the MBTiles file or of the metadata.json of a tile directory
+    :return:
+    """
+    summary_path = get_index_path(path, "summary.json")
+    if not os.path.isfile(summary_path):
+        return None
+    try:
+        with open(summary_path, "r") as f:
+            data = json.load(f)
+    except:
+        debug("Loading metadata summary failed: {}", sys.exc_info()[1])
+        return None
+    if data.get("signature") != get_file_signature(path, _VERSION):
+        return None
+    summary = data.get("summary")
+    if not isinstance(summary, dict) or any(field not in summary for field in summary_fields):
+        return None
+    return summary
+
+
+def save_metadata_summary(path: str, summary: dict) -> None:
+    summary_path = get_index_path(path, "summary.json")
+    tmp_path = "{}.tmp".format(summary_path)
+    try:
+        directory = os.path.dirname(summary_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(tmp_path, "w") as f:
+            json.dump({"signature": get_file_signature(path, _VERSION), "summary": summary}, f)
+        os.replace(tmp_path, summary_path)
+    except:
+        warn("Saving metadata summary failed: {}", sys.exc_info()[1])
+
+
+def get_metadata_summary(path: str, create_summary_func: Callable[[], dict]) -> dict:
+    """
+     * Returns the persisted metadata summary of the specified file. If it's missing or outdated,
+       it's created using create_summary_func and persisted for the next time.
+    :param path: The path of the MBTiles file or of the metadata.json of a tile directory
+    :param create_summary_func: Returns a dict with the values of all summary_fields
+    :return:
+    """
+    summary = load_metadata_summary(path)
+    if summary is None:
+        info("Creating metadata summary for '{}'", path)
+        summary = create_summary_func()
+        save_metadata_summary(path, summary)
+    return summary
@@ -2,12 +2,13 @@ import os
 import platform
 import shutil
 import sys
-from ctypes import c_bool, c_char_p, c_double, c_uint16, c_void_p, cast, cdll
-
-import mapbox_vector_tile
+from ctypes import POINTER, byref, c_bool, c_char, c_char_p, c_double, c_int, c_size_t, c_uint16, c_void_p, cast, cdll
 
+from . import mvt_parser
+from .binary_tile_reader import read_binary_tile
 from .file_helper import get_plugin_directory, get_temp_dir
 from .log_helper import critical, info, warn
+from .tile_helper import get_tile_location
 
 try:
     import simplejson as json
@@ -16,13 +17,16 @@ except ImportError:
 
 
 def decode_tile_python(tile_data_clip):
+    """
+     * Decodes the tile with the protobuf wire format reader (mvt_parser), if the native decoder is not available
+    """
     tile = tile_data_clip[0]
     encoded_data = tile_data_clip[1]
     # clip_tile = tile_data_clip[2]
 
     decoded_data = None
     if encoded_data and not tile.decoded_data:
-        decoded_data = mapbox_vector_tile.decode(encoded_data)
+        decoded_data = mvt_parser.decode(encoded_data)
     return tile, decoded_data
 
 
@@ -76,6 +80,8 @@ def load_lib():
             lib.decodeMvtToJson.restype = c_void_p
             lib.freeme.argtypes = [c_void_p]
             lib.freeme.restype = None
+            _set_buffer_abi(lib)
+            _set_binary_output(lib)
         except:
             warn("Loading lib failed for platform '{}': {}, {}", sys.platform, path, sys.exc_info()[1])
     else:
@@ -83,6 +89,71 @@ def load_lib():
     return lib
 
 
+def _set_buffer_abi(lib) -> None:
+    """
+     * Declares decodeMvtBufferToJson, which reads the tile data from a pointer and a length instead of a hex string
+     * Binaries built before this entry point existed don't export it, the hex string is used with them
+    """
+    try:
+        decode_buffer = lib.decodeMvtBufferToJson
+    except AttributeError:
+        info("The native decoder doesn't support buffers, falling back to hex strings")
+        return
+    decode_buffer.argtypes = [
+        c_bool,
+        c_int,
+        c_int,
+        c_int,
+        c_double,
+        c_double,
+        c_double,
+        c_double,
+        c_char_p,
+        c_size_t,
+    ]
+    decode_buffer.restype = c_void_p
+
+
+def _set_binary_output(lib) -> None:
+    """
+     * Declares decodeMvtBufferToWkb, which returns the features as WKB geometries and typed properties
+       instead of GeoJSON text (see binary_tile_reader)
+     * Binaries built before this entry point existed (i.e. the prebuilt Windows binaries) don't export it,
+       the features are then decoded from GeoJSON text, which is considerably slower
+    """
+    try:
+        decode_to_wkb = lib.decodeMvtBufferToWkb
+    except AttributeError:
+        warn(
+            "The native decoder for '{}' has no binary output, the tiles are decoded through GeoJSON."
+            " Rebuild it (see ext-libs/pbf2geojson/README.md) for faster decoding.",
+            sys.platform,
+        )
+        return
+    decode_to_wkb.argtypes = [
+        c_bool,
+        c_int,
+        c_int,
+        c_int,
+        c_double,
+        c_double,
+        c_double,
+        c_double,
+        c_char_p,
+        c_size_t,
+        POINTER(c_size_t),
+    ]
+    decode_to_wkb.restype = c_void_p
+
+
+def native_binary_output_supported() -> bool:
+    return _native_lib_handle is not None and hasattr(_native_lib_handle, "decodeMvtBufferToWkb")
+
+
+def native_buffer_abi_supported() -> bool:
+    return _native_lib_handle is not None and hasattr(_native_lib_handle, "decodeMvtBufferToJson")
+
+
 _native_lib_handle = load_lib()
 
 
@@ -109,27 +180,27 @@ def native_decoding_supported() -> bool:
     return _native_lib_handle is not None
 
 
-def decode_tile_native(tile_data_clip):
+def decode_tile_native(tile_data_clip, use_buffer_abi=None, use_binary_output=None):
+    """
+     * Decodes the tile with the native decoder. The tile data is passed as buffer, if the decoder supports it,
+       otherwise as hex string.
+     * If the decoder supports it, the features are returned as WKB and typed properties, which are read without
+       parsing GeoJSON text
+    :param use_buffer_abi: Forces the buffer (True) or the hex string (False), i.e. for benchmarks
+    :param use_binary_output: Forces the binary output (True) or GeoJSON (False), i.e. for benchmarks
+    """
     tile = tile_data_clip[0]
     data = tile_data_clip[1]
     clip_tile = tile_data_clip[2]
     decoded_data = None
     if not tile.decoded_data:
         try:
-            # with open(r"c:\temp\uster.pbf", 'wb') as f:
-            #     f.write(tile_data_tuple[1])
-            # encoded_data = bytearray(tile_data_tuple[1])
-            encoded_data = bytearray(data)
-
-            hex_string = "".join("%02x" % b for b in encoded_data)
-            hex_bytes = hex_string.encode(encoding="UTF-8")
-
-            tile_span_x = tile.extent[2] - tile.extent[0]
-            tile_span_y = tile.extent[1] - tile.extent[3]
-            tile_x = tile.extent[0]
-            tile_y = tile.extent[1] - tile_span_y  # subtract tile size because Y starts from top, not from bottom
-
-            ptr = _native_lib_handle.decodeMvtToJson(
+            if use_binary_output is None:
+                use_binary_output = native_binary_output_supported()
+            if use_buffer_abi is None:
+                use_buffer_abi = native_buffer_abi_supported()
+            tile_x, tile_y, tile_span_x, tile_span_y = get_tile_location(tile)
+            location_args = (
                 clip_tile,
                 int(tile.zoom_level),
                 int(tile.column),
@@ -138,8 +209,17 @@ def decode_tile_native(tile_data_clip):
                 tile_y,
                 tile_span_x,
                 tile_span_y,
-                hex_bytes,
             )
+            if use_binary_output:
+                encoded_data = data if isinstance(data, bytes) else bytes(data)
+                return tile, _decode_to_binary(tile, location_args, encoded_data)
+            if use_buffer_abi:
+                # bytes are passed to c_char_p as pointer to their buffer, without copying them
+                encoded_data = data if isinstance(data, bytes) else bytes(data)
+                ptr = _native_lib_handle.decodeMvtBufferToJson(*location_args, encoded_data, len(encoded_data))
+            else:
+                hex_bytes = bytes(data).hex().encode("ascii")
+                ptr = _native_lib_handle.decodeMvtToJson(*location_args, hex_bytes)
             decoded_data = cast(ptr, c_char_p).value
             _native_lib_handle.freeme(ptr)
 
@@ -152,3 +232,15 @@ def decode_tile_native(tile_data_clip):
             #     f.write(decoded_data)
 
     return tile, decoded_data
+
+
+def _decode_to_binary(tile, location_args, encoded_data: bytes) -> dict:
+    """
+     * The buffer allocated by the native decoder is read in place and freed afterwards
+    """
+    length = c_size_t(0)
+    ptr = _native_lib_handle.decodeMvtBufferToWkb(*location_args, encoded_data, len(encoded_data), byref(length))
+    try:
+        return read_binary_tile((c_char * length.value).from_address(ptr), tile)
+    finally:
+        _native_lib_handle.freeme(ptr)
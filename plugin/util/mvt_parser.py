@@ -0,0 +1,601 @@
+import gc
+import struct
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+ * A reader of the protobuf wire format of Mapbox Vector Tiles (https://github.com/mapbox/vector-tile-spec)
+ * The tile is read through a memoryview: fields which are not required are skipped and no intermediate message
+   objects are created. The layers and their features are created while they are iterated.
+ * decode returns the same structure as mapbox_vector_tile.decode, so it can be used in its place
+ * If numpy is available, the geometries of a layer are decoded at once (see decode_geometries), otherwise feature
+   by feature (see decode_geometry)
+"""
+
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+# field numbers of the vector tile schema (vector_tile.proto)
+_TILE_LAYERS = 3
+_LAYER_NAME = 1
+_LAYER_FEATURES = 2
+_LAYER_KEYS = 3
+_LAYER_VALUES = 4
+_LAYER_EXTENT = 5
+_LAYER_VERSION = 15
+_FEATURE_ID = 1
+_FEATURE_TAGS = 2
+_FEATURE_TYPE = 3
+_FEATURE_GEOMETRY = 4
+_VALUE_STRING = 1
+_VALUE_FLOAT = 2
+_VALUE_DOUBLE = 3
+_VALUE_INT = 4
+_VALUE_UINT = 5
+_VALUE_SINT = 6
+_VALUE_BOOL = 7
+
+_DEFAULT_EXTENT = 4096
+_DEFAULT_VERSION = 1
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_SEG_END = 7
+
+UNKNOWN = 0
+POINT = 1
+LINESTRING = 2
+POLYGON = 3
+
+_FLOAT = struct.Struct("<f")
+_DOUBLE = struct.Struct("<d")
+
+
+def numpy_supported() -> bool:
+    return np is not None
+
+
+def _read_varint(data: memoryview, offset: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def _read_packed_varints(data: memoryview, offset: int, end: int) -> List[int]:
+    values = []
+    append = values.append
+    while offset < end:
+        byte = data[offset]
+        if byte < 0x80:
+            append(byte)
+            offset += 1
+        else:
+            value, offset = _read_varint(data, offset)
+            append(value)
+    return values
+
+
+def _iter_fields(data: memoryview, offset: int, end: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+     * Yields the fields of a message as (field number, wire type, value, offset after the field)
+     * The value of a varint is the number itself, of a length delimited field the offset of its content and of
+       a fixed size field the offset of its bytes
+    """
+    while offset < end:
+        key, offset = _read_varint(data, offset)
+        field_number = key >> 3
+        wire_type = key & 0x7
+        if wire_type == _VARINT:
+            value, offset = _read_varint(data, offset)
+        elif wire_type == _LENGTH_DELIMITED:
+            length, value = _read_varint(data, offset)
+            offset = value + length
+        elif wire_type == _FIXED64:
+            value = offset
+            offset += 8
+        elif wire_type == _FIXED32:
+            value = offset
+            offset += 4
+        else:
+            raise RuntimeError("Unsupported wire type {} of field {}".format(wire_type, field_number))
+        if offset > end:
+            raise RuntimeError("Field {} exceeds the message".format(field_number))
+        yield field_number, wire_type, value, offset
+
+
+def _read_string(data: memoryview, start: int, end: int) -> str:
+    return str(data[start:end], "utf-8")
+
+
+def _read_value(data: memoryview, offset: int, end: int):
+    for field_number, wire_type, value, field_end in _iter_fields(data, offset, end):
+        if field_number == _VALUE_STRING:
+            return _read_string(data, value, field_end)
+        if field_number == _VALUE_FLOAT:
+            return _FLOAT.unpack_from(data, value)[0]
+        if field_number == _VALUE_DOUBLE:
+            return _DOUBLE.unpack_from(data, value)[0]
+        if field_number == _VALUE_INT:
+            # int64 is encoded as two's complement with 64 bits
+            return value - (1 << 64) if value >= (1 << 63) else value
+        if field_number == _VALUE_UINT:
+            return value
+        if field_number == _VALUE_SINT:
+            return (value >> 1) ^ -(value & 1)
+        if field_number == _VALUE_BOOL:
+            return bool(value)
+    raise RuntimeError("The value has no known type")
+
+
+class MvtLayer(object):
+    """
+     * A layer of a vector tile. The features are only located when the layer is read, they are decoded
+       while they are iterated.
+    """
+
+    def __init__(self, data: memoryview, offset: int, end: int):
+        self._data = data
+        self.name: str = None
+        self.version: int = _DEFAULT_VERSION
+        self.extent: int = _DEFAULT_EXTENT
+        self.keys: List[str] = []
+        self.values: List[object] = []
+        self._feature_ranges: List[Tuple[int, int]] = []
+        for field_number, wire_type, value, field_end in _iter_fields(data, offset, end):
+            if field_number == _LAYER_FEATURES:
+                self._feature_ranges.append((value, field_end))
+            elif field_number == _LAYER_KEYS:
+                self.keys.append(_read_string(data, value, field_end))
+            elif field_number == _LAYER_VALUES:
+                self.values.append(_read_value(data, value, field_end))
+            elif field_number == _LAYER_NAME:
+                self.name = _read_string(data, value, field_end)
+            elif field_number == _LAYER_EXTENT:
+                self.extent = value
+            elif field_number == _LAYER_VERSION:
+                self.version = value
+
+    def __len__(self):
+        return len(self._feature_ranges)
+
+    def features(self, y_coord_down: bool = False, vectorized: bool = None) -> Iterator[dict]:
+        """
+         * Yields the features of the layer
+        :param vectorized: Decodes the geometries of the layer at once with numpy (True) or feature by feature
+            (False), defaults to numpy if it's available
+        """
+        if vectorized is None:
+            vectorized = numpy_supported()
+        if vectorized:
+            yield from self._read_features_vectorized(y_coord_down)
+        else:
+            for offset, end in self._feature_ranges:
+                yield self._read_feature(offset, end, y_coord_down)
+
+    def _read_feature(self, offset: int, end: int, y_coord_down: bool) -> dict:
+        feature_id, geometry_type, tags, geometry_fields = self._read_feature_fields(offset, end)
+        geometry = []
+        for wire_type, value, field_end in geometry_fields:
+            if wire_type == _LENGTH_DELIMITED:
+                geometry.extend(_read_packed_varints(self._data, value, field_end))
+            else:
+                geometry.append(value)
+        return {
+            "geometry": decode_geometry(geometry, geometry_type, self.extent, y_coord_down),
+            "properties": self._get_properties(tags),
+            "id": feature_id,
+            "type": geometry_type,
+        }
+
+    def _read_features_vectorized(self, y_coord_down: bool) -> List[dict]:
+        """
+         * Decodes the geometries of all features at once, the packed geometry fields are passed on as bytes
+        """
+        data = self._data
+        features = []
+        geometry_buffers = []
+        for offset, end in self._feature_ranges:
+            feature_id, geometry_type, tags, geometry_fields = self._read_feature_fields(offset, end)
+            if any(wire_type != _LENGTH_DELIMITED for wire_type, _, _ in geometry_fields):
+                # not packed, which the spec doesn't allow, but the decoding feature by feature handles it
+                return [self._read_feature(offset, end, y_coord_down) for offset, end in self._feature_ranges]
+            geometry_buffers.append([data[value:field_end] for _, value, field_end in geometry_fields])
+            features.append(
+                {
+                    "geometry": None,
+                    "properties": self._get_properties(tags),
+                    "id": feature_id,
+                    "type": geometry_type,
+                }
+            )
+        geometry_types = [f["type"] for f in features]
+        geometries = decode_geometries(geometry_buffers, geometry_types, self.extent, y_coord_down)
+        for feature, geometry in zip(features, geometries):
+            feature["geometry"] = geometry
+        return features
+
+    def _read_feature_fields(self, offset: int, end: int) -> Tuple[int, int, List[int], List[Tuple[int, int, int]]]:
+        """
+         * Returns the id, the geometry type, the tags and the geometry fields (wire type, value, end) of a feature
+        """
+        data = self._data
+        feature_id = 0
+        geometry_type = UNKNOWN
+        tags = []
+        geometry_fields = []
+        for field_number, wire_type, value, field_end in _iter_fields(data, offset, end):
+            if field_number == _FEATURE_GEOMETRY:
+                geometry_fields.append((wire_type, value, field_end))
+            elif field_number == _FEATURE_TAGS:
+                if wire_type == _LENGTH_DELIMITED:
+                    tags.extend(_read_packed_varints(data, value, field_end))
+                else:
+                    tags.append(value)
+            elif field_number == _FEATURE_TYPE:
+                geometry_type = value
+            elif field_number == _FEATURE_ID:
+                feature_id = value
+        return feature_id, geometry_type, tags, geometry_fields
+
+    def _get_properties(self, tags: List[int]) -> dict:
+        if len(tags) % 2 != 0:
+            raise RuntimeError("Unexpected number of tags")
+        keys = self.keys
+        values = self.values
+        return {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+
+
+def iter_layers(data) -> Iterator[MvtLayer]:
+    """
+     * Yields the layers of the tile
+    :param data: The bytes-like, unzipped tile data
+    """
+    view = memoryview(data)
+    for field_number, wire_type, value, field_end in _iter_fields(view, 0, len(view)):
+        if field_number == _TILE_LAYERS:
+            yield MvtLayer(view, value, field_end)
+
+
+def decode(data, y_coord_down: bool = False, vectorized: bool = None) -> Dict[str, dict]:
+    """
+     * Decodes the tile into the structure returned by mapbox_vector_tile.decode
+    :param vectorized: See MvtLayer.features
+    """
+    try:
+        return {
+            layer.name: {
+                "extent": layer.extent,
+                "version": layer.version,
+                "features": list(layer.features(y_coord_down, vectorized)),
+            }
+            for layer in iter_layers(data)
+        }
+    except IndexError:
+        raise RuntimeError("The tile data is truncated")
+
+
+def decode_geometry(geometry: List[int], geometry_type: int, extent: int, y_coord_down: bool = False) -> list:
+    """
+     * Decodes the geometry commands of a feature into coordinates like mapbox_vector_tile does
+    """
+    i = 0
+    nr_of_integers = len(geometry)
+    x = 0
+    y = 0
+    coords = []
+    parts = []  # for multi linestrings and polygons
+
+    while i < nr_of_integers:
+        command_integer = geometry[i]
+        i += 1
+        command = command_integer & 0x7
+        count = command_integer >> 3
+
+        if command == CMD_SEG_END:
+            if geometry_type == POLYGON:
+                _ensure_polygon_closed(coords)
+            parts.append(coords)
+            coords = []
+        elif command == CMD_MOVE_TO or command == CMD_LINE_TO:
+            if coords and command == CMD_MOVE_TO and geometry_type in (LINESTRING, POLYGON):
+                if geometry_type == POLYGON:
+                    _ensure_polygon_closed(coords)
+                parts.append(coords)
+                coords = []
+            for _ in range(count):
+                dx = geometry[i]
+                dy = geometry[i + 1]
+                i += 2
+                x += (dx >> 1) ^ -(dx & 1)
+                y += (dy >> 1) ^ -(dy & 1)
+                coords.append([x, y if y_coord_down else extent - y])
+
+    if geometry_type == POINT:
+        return coords
+    if geometry_type == LINESTRING:
+        if parts:
+            if coords:
+                parts.append(coords)
+            return parts[0] if len(parts) == 1 else parts
+        return coords
+    if geometry_type == POLYGON:
+        if coords:
+            parts.append(coords)
+        return _group_rings(parts)
+    raise RuntimeError("Unknown geometry type: {}".format(geometry_type))
+
+
+def _ensure_polygon_closed(coords: list) -> None:
+    if coords and coords[0] != coords[-1]:
+        coords.append(coords[0])
+
+
+def _area_sign(ring: list) -> int:
+    area = sum(ring[i][0] * ring[i + 1][1] - ring[i + 1][0] * ring[i][1] for i in range(0, len(ring) - 1))
+    return -1 if area < 0 else 1 if area > 0 else 0
+
+
+def _group_rings(rings: list, area_signs: Optional[List[int]] = None) -> list:
+    """
+     * A ring with the winding of the first ring starts a new polygon, the others are the holes of the polygon
+    :param area_signs: The winding of each ring, if it's already known
+    """
+    polygon = []
+    polygons = []
+    winding = 0
+    for index, ring in enumerate(rings):
+        sign = area_signs[index] if area_signs is not None else _area_sign(ring)
+        if sign == 0:
+            continue
+        if winding == 0:
+            winding = sign
+        if winding == sign:
+            if polygon:
+                polygons.append(polygon)
+            polygon = [ring]
+        else:
+            polygon.append(ring)
+    if polygon:
+        polygons.append(polygon)
+    return polygons[0] if len(polygons) == 1 else polygons
+
+
+def decode_packed_varints(buffer) -> "np.ndarray":
+    """
+     * Decodes the packed varints (at most 9 bytes each) of a bytes-like object into an array of int64
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    is_last_byte = data < 0x80
+    if not is_last_byte[-1]:
+        raise RuntimeError("The varints are truncated")
+    starts = np.flatnonzero(np.concatenate(([True], is_last_byte[:-1])))
+    if len(starts) == len(data):
+        return data.astype(np.int64)
+    lengths = np.diff(np.append(starts, len(data)))
+    shifts = 7 * (np.arange(len(data), dtype=np.int64) - np.repeat(starts, lengths))
+    return np.bitwise_or.reduceat((data & 0x7F).astype(np.int64) << shifts, starts)
+
+
+class GeometryArrays(object):
+    """
+     * The coordinates of many features, as decoded by decode_geometry_arrays
+    """
+
+    def __init__(self, coordinates, part_offsets, feature_offsets, area_signs):
+        # the coordinates of all features, shape (number of points, 2)
+        self.coordinates = coordinates
+        # the index of the first point of each part (ring, linestring or the points) and the end of the last part
+        self.part_offsets = part_offsets
+        # the index of the first part of each feature and the end of the last feature. The last part of a feature
+        # contains the points after the last ClosePath and may be empty.
+        self.feature_offsets = feature_offsets
+        # the sign of the area of each part (-1, 0 or 1), i.e. the winding of the rings of polygons
+        self.area_signs = area_signs
+
+
+def decode_geometries(geometry_buffers: List[List], geometry_types: List[int], extent: int, y_coord_down=False) -> list:
+    """
+     * Decodes the geometries of many features at once with numpy, the result is the same as the one of
+       decode_geometry for each feature
+    :param geometry_buffers: The packed geometry fields (bytes-like) of each feature
+    """
+    arrays = decode_geometry_arrays(geometry_buffers, geometry_types, extent, y_coord_down)
+    return geometries_from_arrays(arrays, geometry_types)
+
+
+def decode_geometry_arrays(
+    geometry_buffers: List[List], geometry_types: List[int], extent: int, y_coord_down: bool = False
+) -> GeometryArrays:
+    """
+     * Decodes the geometry commands of many features at once with numpy
+     * The varints are decoded, the parameters zigzag decoded and the deltas summed up for all features at once.
+       Only the positions of the command integers are looked up one by one, since the position of a command depends
+       on the count of the previous one.
+     * The parts are split and the rings of polygons are closed like decode_geometry does it
+    """
+    buffer_lengths = [len(b) for g in geometry_buffers for b in g]
+    data = np.frombuffer(b"".join(chain.from_iterable(geometry_buffers)), dtype=np.uint8)
+    buffer_ends = np.cumsum([0] + buffer_lengths)
+    last_bytes = buffer_ends[1:][np.diff(buffer_ends) > 0] - 1
+    if np.any(data[last_bytes] >= 0x80):
+        raise RuntimeError("The varints are truncated")
+    integers = decode_packed_varints(data)
+    nr_of_integers = len(integers)
+    nr_of_features = len(geometry_types)
+
+    # the index of the first integer of each feature and the end of the last feature
+    integers_before_byte = np.concatenate(([0], np.cumsum(data < 0x80)))
+    feature_buffer_ends = np.cumsum([0] + [len(g) for g in geometry_buffers])
+    feature_integer_offsets = integers_before_byte[buffer_ends[feature_buffer_ends]]
+
+    commands = integers & 0x7
+    counts = integers >> 3
+    has_points = (commands == CMD_MOVE_TO) | (commands == CMD_LINE_TO)
+    # indexing a memoryview returns python ints without converting all integers
+    next_command = memoryview(np.arange(1, nr_of_integers + 1) + np.where(has_points, 2 * counts, 0))
+    command_positions = []
+    append = command_positions.append
+    i = 0
+    while i < nr_of_integers:
+        append(i)
+        i = next_command[i]
+    command_positions = np.array(command_positions, dtype=np.int64)
+    is_command = np.zeros(nr_of_integers + 1, dtype=bool)
+    is_command[command_positions] = True
+    is_command[nr_of_integers] = i == nr_of_integers
+    if not is_command[feature_integer_offsets].all():
+        raise RuntimeError("The geometry has not the expected number of parameters")
+
+    commands = commands[command_positions]
+    point_counts = np.where(has_points[command_positions], counts[command_positions], 0)
+    points_before = np.concatenate(([0], np.cumsum(point_counts)))
+    nr_of_points = int(points_before[-1])
+    command_features = np.searchsorted(feature_integer_offsets[:-1], command_positions, side="right") - 1
+    feature_types = np.array(geometry_types, dtype=np.int64)
+    command_types = feature_types[command_features]
+    first_commands = np.searchsorted(command_positions, feature_integer_offsets)
+    feature_point_offsets = points_before[first_commands]
+
+    # a ClosePath ends a part, a MoveTo of a linestring or polygon as well, if there are points since the last one
+    is_multi_part = (command_types == LINESTRING) | (command_types == POLYGON)
+    starts_part = (commands == CMD_SEG_END) | ((commands == CMD_MOVE_TO) & is_multi_part)
+    last_part_starts = np.maximum.accumulate(np.where(starts_part, points_before[:-1], 0))
+    part_start_before = np.maximum(
+        np.concatenate(([0], last_part_starts[:-1])), feature_point_offsets[command_features]
+    )
+    ends_part = (commands == CMD_SEG_END) | (
+        (commands == CMD_MOVE_TO) & is_multi_part & (points_before[:-1] > part_start_before)
+    )
+    # the points after the last ClosePath are the last part of each feature
+    last_commands = first_commands[1:] - 1
+    trailing_starts = np.where(
+        last_commands >= first_commands[:-1],
+        np.maximum(np.append(last_part_starts, 0)[last_commands], feature_point_offsets[:-1]),
+        feature_point_offsets[:-1],
+    )
+    part_order = np.argsort(
+        np.concatenate((2 * command_positions[ends_part], 2 * feature_integer_offsets[1:] - 1)), kind="stable"
+    )
+    part_starts = np.concatenate((part_start_before[ends_part], trailing_starts))[part_order]
+    part_ends = np.concatenate((points_before[:-1][ends_part], feature_point_offsets[1:]))[part_order]
+    closable = np.concatenate(
+        (command_types[ends_part] == POLYGON, np.zeros(nr_of_features, dtype=bool))
+    )[part_order]
+    parts_per_feature = np.bincount(command_features[ends_part], minlength=nr_of_features) + 1
+    feature_offsets = np.concatenate(([0], np.cumsum(parts_per_feature)))
+
+    is_parameter = np.ones(nr_of_integers, dtype=bool)
+    is_parameter[command_positions] = False
+    deltas = integers[is_parameter].reshape(-1, 2)
+    deltas = (deltas >> 1) ^ -(deltas & 1)
+    cursors = np.zeros((nr_of_points + 1, 2), dtype=np.int64)
+    np.cumsum(deltas, axis=0, out=cursors[1:])
+    # the cursor starts at (0, 0) for each feature
+    coordinates = cursors[1:] - np.repeat(cursors[feature_point_offsets[:-1]], np.diff(feature_point_offsets), axis=0)
+    if not y_coord_down:
+        coordinates[:, 1] = extent - coordinates[:, 1]
+
+    coordinates, part_starts, part_ends = _close_rings(coordinates, part_starts, part_ends, closable)
+    return GeometryArrays(
+        coordinates,
+        np.append(part_starts, len(coordinates)),
+        feature_offsets,
+        _area_signs(coordinates, part_starts, part_ends),
+    )
+
+
+def _close_rings(coordinates, part_starts, part_ends, closable):
+    """
+     * Appends the first point to each ring whose last point differs from it
+    """
+    non_empty = closable & (part_ends > part_starts)
+    starts = part_starts[non_empty]
+    ends = part_ends[non_empty]
+    is_open = np.any(coordinates[starts] != coordinates[ends - 1], axis=1)
+    insert_positions = ends[is_open]
+    if not len(insert_positions):
+        return coordinates, part_starts, part_ends
+
+    coordinates = np.insert(coordinates, insert_positions, coordinates[starts[is_open]], axis=0)
+    # a point inserted at the end of a part belongs to that part and shifts all following parts
+    part_starts = part_starts + np.searchsorted(insert_positions, part_starts, side="right")
+    part_ends = part_ends + np.searchsorted(insert_positions, part_ends, side="right")
+    return coordinates, part_starts, part_ends
+
+
+def _area_signs(coordinates, part_starts, part_ends):
+    """
+     * The shoelace sums of all parts at once
+    """
+    x = coordinates[:, 0]
+    y = coordinates[:, 1]
+    cross_products = x[:-1] * y[1:] - x[1:] * y[:-1]
+    sums = np.concatenate(([0], np.cumsum(cross_products)))
+    # empty parts at the end of the coordinates have the sum 0 as well
+    max_index = len(sums) - 1
+    first_indices = np.minimum(part_starts, max_index)
+    last_indices = np.minimum(np.maximum(part_ends - 1, part_starts), max_index)
+    return np.sign(sums[last_indices] - sums[first_indices])
+
+
+def geometries_from_arrays(arrays: GeometryArrays, geometry_types: List[int]) -> list:
+    """
+     * Returns the coordinates of each feature as nested lists, like decode_geometry returns them
+     * The garbage collector is paused meanwhile, the lists can't form cycles, but creating them would trigger
+       collections, which take longer than the conversion itself
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _geometries_from_arrays(arrays, geometry_types)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _geometries_from_arrays(arrays: GeometryArrays, geometry_types: List[int]) -> list:
+    coordinates = arrays.coordinates.tolist()
+    part_offsets = arrays.part_offsets.tolist()
+    feature_offsets = arrays.feature_offsets.tolist()
+    area_signs = arrays.area_signs.tolist()
+
+    geometries = []
+    for index, geometry_type in enumerate(geometry_types):
+        first_part = feature_offsets[index]
+        last_part = feature_offsets[index + 1] - 1
+        trailing = coordinates[part_offsets[last_part] : part_offsets[last_part + 1]]
+        if geometry_type == POINT:
+            geometries.append(trailing)
+            continue
+
+        part_indices = list(range(first_part, last_part))
+        if trailing and (geometry_type == POLYGON or part_indices):
+            part_indices.append(last_part)
+        if geometry_type == LINESTRING:
+            if not part_indices:
+                geometries.append(trailing)
+                continue
+            parts = [coordinates[part_offsets[p] : part_offsets[p + 1]] for p in part_indices]
+            geometries.append(parts[0] if len(parts) == 1 else parts)
+        elif geometry_type == POLYGON:
+            rings = [coordinates[part_offsets[p] : part_offsets[p + 1]] for p in part_indices]
+            signs = [area_signs[p] for p in part_indices]
+            geometries.append(_group_rings(rings, signs))
+        else:
+            raise RuntimeError("Unknown geometry type: {}".format(geometry_type))
+    return geometries
@@ -1,45 +1,92 @@
-from time import sleep
-from typing import Callable, List, Optional, Tuple
+import heapq
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import Callable, Deque, Dict, Hashable, Iterator, List, Optional, Tuple, Union
 
-from PyQt5.QtCore import QUrl
+from PyQt5.QtCore import QEventLoop, QObject, QTimer, QUrl, pyqtSignal
 from PyQt5.QtNetwork import QNetworkReply, QNetworkRequest
-from PyQt5.QtWidgets import QApplication
 from qgis.core import QgsNetworkAccessManager
 
-from .log_helper import info, remove_key, warn
+from .log_helper import debug, info, remove_key, warn
+from .tile_helper import Bounds, get_center_distance
 
+default_max_requests_per_host = 6
+default_timeout_ms = 30000
 
-def url_exists(url: str) -> Tuple[bool, Optional[str], str]:
+
+def url_exists(url: str, timeout_ms: int = None) -> Tuple[bool, Optional[str], str]:
     reply = http_get_async(url, head_only=True)
-    while not reply.isFinished():
-        QApplication.processEvents()
+    wait_for_reply(reply, timeout_ms=timeout_ms)
 
     status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
     if status == 301:
         location = reply.header(QNetworkRequest.LocationHeader).toString()
         if location != url:
             info("Moved permanently, new location is: {}", location)
-            return url_exists(location)
+            return url_exists(location, timeout_ms=timeout_ms)
 
     success: bool = status == 200
     error: Optional[str] = None
     info("URL check for '{}': status '{}'", url, status)
     if not success:
-        if status == 302:
-            error = "Loading error: Moved Temporarily.\n\nURL incorrect? Missing or incorrect API key?"
-        elif status == 404:
-            error = "Loading error: Resource not found.\n\nURL incorrect?"
-        elif reply.error():
-            error = "Loading error: {}\n\nURL incorrect? (HTTP Status {})".format(reply.errorString(), status)
-        else:
-            error = "Something went wrong with '{}'. HTTP Status is {}".format(remove_key(url), status)
+        error = get_loading_error(url, status, reply.errorString() if reply.error() else None)
 
     return success, error, url
 
 
-def http_get_async(url: str, head_only: bool = False) -> QNetworkReply:
+def get_loading_error(url: str, status: Optional[int], error: Optional[str]) -> str:
+    """
+     * Returns the message shown to the user, if the specified url cannot be loaded
+    :param status: The HTTP status of the response
+    :param error: The error of the request, if it failed
+    """
+    if status == 302:
+        return "Loading error: Moved Temporarily.\n\nURL incorrect? Missing or incorrect API key?"
+    elif status == 404:
+        return "Loading error: Resource not found.\n\nURL incorrect?"
+    elif error:
+        return "Loading error: {}\n\nURL incorrect? (HTTP Status {})".format(error, status)
+    return "Something went wrong with '{}'. HTTP Status is {}".format(remove_key(url), status)
+
+
+def wait_for_reply(reply: QNetworkReply, timeout_ms: int = None) -> bool:
+    """
+     * Waits in an event loop until the reply has finished, instead of polling it. Events are processed meanwhile,
+       so it can be used in the main thread as well as in worker threads.
+     * If the reply hasn't finished after timeout_ms (default_timeout_ms if not set), it's aborted
+    :return: False if the request has timed out
+    """
+    if reply.isFinished():
+        return True
+    if timeout_ms is None:
+        timeout_ms = default_timeout_ms
+    event_loop = QEventLoop()
+    reply.finished.connect(event_loop.quit)
+    timer = QTimer()
+    timer.setSingleShot(True)
+    timer.timeout.connect(event_loop.quit)
+    timer.start(timeout_ms)
+    event_loop.exec_()
+    timer.stop()
+    if reply.isFinished():
+        return True
+    warn("Request timed out after {}ms: {}", timeout_ms, remove_key(reply.url().toDisplayString()))
+    reply.abort()
+    return False
+
+
+def http_get_async(url: str, head_only: bool = False, headers: Dict[str, str] = None) -> QNetworkReply:
     m = QgsNetworkAccessManager.instance()
     req = QNetworkRequest(QUrl(url))
+    if headers:
+        for name, value in headers.items():
+            req.setRawHeader(name.encode("latin-1"), value.encode("latin-1"))
+        # the response of a conditional request must not be answered by the cache of the network access manager
+        req.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.AlwaysNetwork)
     if head_only:
         reply = m.head(req)
     else:
@@ -47,60 +94,856 @@ def http_get_async(url: str, head_only: bool = False) -> QNetworkReply:
     return reply
 
 
+class HostStats(object):
+    """
+     * The latency and error statistics of a host, which are used to distribute requests among equivalent hosts
+     * The stats act as circuit breaker for the host:
+        - After max_consecutive_errors failed requests in a row, the host is skipped for skip_seconds and
+          then probed with a single request
+        - If the server pushes back (429 Too Many Requests, 503 Service Unavailable), the number of concurrent
+          requests to the host is halved and the host is skipped for the time requested by Retry-After.
+          Each successful request increases the number of concurrent requests again (AIMD).
+     * The stats are shared by the loading threads, so they're only changed while holding the lock
+    """
+
+    max_consecutive_errors = 3
+    skip_seconds = 30
+    _latency_weight = 0.2
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.nr_of_requests = 0
+        self.nr_of_errors = 0
+        self.nr_of_throttled = 0
+        self.consecutive_errors = 0
+        self.skipped_until = 0.0
+        self.concurrency: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_response(
+        self,
+        latency: float,
+        failed: bool,
+        throttled: bool = False,
+        retry_after: Optional[float] = None,
+        max_requests: int = None,
+    ) -> None:
+        """
+        :param latency: The duration of the request in seconds
+        :param failed: True if the request failed because of the server or the connection to it
+        :param throttled: True if the server pushed back
+        :param retry_after: The number of seconds the server asked to wait
+        :param max_requests: The number of concurrent requests to the host, if there is no limit yet
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.nr_of_requests += 1
+            if throttled:
+                self.nr_of_throttled += 1
+                concurrency = self.concurrency
+                if concurrency is None:
+                    concurrency = float(max_requests or default_max_requests_per_host)
+                self.concurrency = max(1.0, concurrency / 2)
+                if retry_after is not None:
+                    self.skipped_until = max(self.skipped_until, now + retry_after)
+            if failed:
+                self.nr_of_errors += 1
+                self.consecutive_errors += 1
+                if self.is_failing():
+                    self.skipped_until = max(self.skipped_until, now + self.skip_seconds)
+                    self.concurrency = 1.0
+                return
+            self.consecutive_errors = 0
+            if self.concurrency is not None:
+                self.concurrency += 1.0 / self.concurrency
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self._latency_weight * (latency - self.latency)
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self.skipped_until
+
+    def is_failing(self) -> bool:
+        return self.consecutive_errors >= self.max_consecutive_errors
+
+    def get_request_limit(self, max_requests: int) -> int:
+        """
+         * Returns the number of requests which may be in flight to the host at the same time
+        """
+        with self._lock:
+            if self.concurrency is None:
+                return max_requests
+            return max(1, min(max_requests, int(self.concurrency)))
+
+    def __str__(self):
+        latency = "{:.0f}ms".format(self.latency * 1000) if self.latency is not None else "-"
+        return "{} requests, {} errors, {} throttled, latency {}".format(
+            self.nr_of_requests, self.nr_of_errors, self.nr_of_throttled, latency
+        )
+
+
+_host_stats: Dict[str, HostStats] = {}
+_host_stats_lock = threading.Lock()
+
+
+def get_host_stats(host: str) -> HostStats:
+    """
+     * Returns the statistics of the host, which are shared by all requests of the session
+    """
+    with _host_stats_lock:
+        stats = _host_stats.get(host)
+        if stats is None:
+            stats = _host_stats[host] = HostStats()
+        return stats
+
+
+class HttpResponse(object):
+    """
+     * The outcome of a finished request. Unlike the QNetworkReply, it can be shared with other threads.
+     * The url is the url of the last request, if redirects have been followed
+    :param content: The content of the response, None if the request failed or the server responded with 304
+    :param cache_headers: The validators and the expiry of the response, see parse_cache_headers
+    """
+
+    def __init__(
+        self,
+        url: str,
+        status: Optional[int],
+        error: Optional[str] = None,
+        content: Optional[bytes] = None,
+        cache_headers: Optional[dict] = None,
+    ):
+        self.url = url
+        self.status = status
+        self.error = error
+        self.content = content
+        self.cache_headers = cache_headers
+
+    @staticmethod
+    def from_reply(reply: QNetworkReply) -> "HttpResponse":
+        url = reply.url().toDisplayString()
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if reply.error():
+            return HttpResponse(url, status, error=reply.errorString())
+        content = None
+        if status != 304:
+            content = reply.readAll().data()
+        return HttpResponse(url, status, content=content, cache_headers=get_cache_headers(reply))
+
+
+class _SharedRequest(object):
+    def __init__(self, urls: List[str], headers: Optional[Dict[str, str]]):
+        self.urls = urls
+        self.headers = headers
+        self.listeners: List[Callable[[Optional[HttpResponse]], None]] = []
+
+
+class InFlightRegistry(object):
+    """
+     * The requests in flight of all schedulers by url, so that a tile which is requested again while its
+       request is still in flight (i.e. when the map is panned or zoomed quickly and a new loading process
+       is started) isn't requested twice: the new request is attached to the one in flight and gets its response.
+     * The successful responses of requests which finish after their loading process has been cancelled are kept
+       for max_age_seconds, so that the next loading process gets them instead of requesting the tiles again
+     * The listeners are called in the thread the request finishes in
+    """
+
+    max_kept_responses = 256
+    max_age_seconds = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, _SharedRequest] = {}
+        self._kept_responses: "OrderedDict[str, Tuple[float, HttpResponse]]" = OrderedDict()
+
+    def register(self, urls: List[str], headers: Optional[Dict[str, str]]) -> _SharedRequest:
+        """
+         * Registers a request, which is about to be sent. The response has to be published, once the request
+           has finished or has been dropped.
+        """
+        shared = _SharedRequest(urls, headers)
+        with self._lock:
+            for url in urls:
+                self._in_flight.setdefault(url, shared)
+        return shared
+
+    def attach(
+        self, urls: List[str], headers: Optional[Dict[str, str]], listener: Callable[[Optional[HttpResponse]], None]
+    ) -> Optional[_SharedRequest]:
+        """
+         * Attaches the listener to the request in flight for one of the urls with the same headers.
+           If a response for one of the urls has been kept, the listener is called with it right away.
+         * The listener is called with None, if the request is dropped without response.
+        :return: The request the listener has been attached to or None, if there is nothing to attach to
+        """
+        kept_response = None
+        with self._lock:
+            self._remove_expired_responses()
+            for url in urls:
+                if url in self._kept_responses:
+                    kept_response = self._kept_responses.pop(url)[1]
+                    break
+                shared = self._in_flight.get(url)
+                if shared and shared.headers == headers:
+                    shared.listeners.append(listener)
+                    return shared
+        if kept_response is None:
+            return None
+        debug("Using response received after cancelling: {}", remove_key(kept_response.url))
+        listener(kept_response)
+        return _SharedRequest(urls, headers)
+
+    def detach(self, shared: _SharedRequest, listener: Callable[[Optional[HttpResponse]], None]) -> None:
+        with self._lock:
+            if listener in shared.listeners:
+                shared.listeners.remove(listener)
+
+    def publish(self, shared: _SharedRequest, response: Optional[HttpResponse], keep: bool = False) -> None:
+        """
+         * Passes the response to the listeners of the request and removes it from the requests in flight
+        :param response: The response or None, if the request has been dropped
+        :param keep: True if the response should be kept for max_age_seconds, if there are no listeners
+        """
+        with self._lock:
+            for url in shared.urls:
+                if self._in_flight.get(url) is shared:
+                    del self._in_flight[url]
+            listeners = shared.listeners
+            shared.listeners = []
+            if keep and not listeners and response and not response.error and response.content is not None:
+                self._kept_responses[shared.urls[0]] = (time.monotonic(), response)
+                self._kept_responses.move_to_end(shared.urls[0])
+                while len(self._kept_responses) > self.max_kept_responses:
+                    self._kept_responses.popitem(last=False)
+        for listener in listeners:
+            listener(response)
+
+    def _remove_expired_responses(self) -> None:
+        min_time = time.monotonic() - self.max_age_seconds
+        while self._kept_responses and next(iter(self._kept_responses.values()))[0] < min_time:
+            self._kept_responses.popitem(last=False)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len({id(shared) for shared in self._in_flight.values()})
+
+    def kept_responses(self) -> int:
+        with self._lock:
+            return len(self._kept_responses)
+
+
+in_flight_requests = InFlightRegistry()
+# the schedulers whose replies finish in the background after their loading process has been cancelled
+_detached_schedulers = set()
+_detached_schedulers_lock = threading.Lock()
+
+
+class _Request(object):
+    def __init__(
+        self, urls_by_host: Dict[str, str], key: Hashable, headers: Optional[Dict[str, str]], priority: float, seq: int
+    ):
+        self.urls_by_host = urls_by_host
+        self.key = key
+        self.headers = headers
+        self.priority = priority
+        self.seq = seq
+        self.failed_hosts = set()
+        self.attempts = 0
+        self.shared: Optional[_SharedRequest] = None
+        self.listener: Optional[Callable[[Optional[HttpResponse]], None]] = None
+
+    def entry(self) -> Tuple[float, int, "_Request"]:
+        return self.priority, self.seq, self
+
+
+class TileRequestScheduler(QObject):
+    """
+     * Sends requests with at most max_requests_per_host requests in flight per host and hands out the replies
+       in the order they finish
+     * Pending requests are sent by priority (lowest first), requests with the same priority in the order
+       they have been added. The priorities can be changed while the requests are pending (see reprioritize).
+     * A request can have several equivalent urls on different hosts (i.e. the tile url templates of a TileJSON).
+       It is sent to the host with a free slot and the lowest latency, hosts failing repeatedly are skipped
+       and requests failing on one host are repeated on the others.
+     * Requests failing on all hosts are retried up to max_retries times after an exponential backoff with jitter
+       or after the time requested by the Retry-After header. Requests waiting for hosts with too many errors
+       are given up after max_retries waits (see HostStats).
+     * If an InFlightRegistry is specified, requests for urls which are already in flight (i.e. of another
+       loading process) are attached to these instead of being sent again. When the results are no longer
+       needed, the requests in flight aren't aborted but finish in the background and pass their responses on
+       to the registry and to on_late_response (i.e. to store the tiles in the cache).
+     * The scheduler is driven by the finished signal of the replies: while nothing has finished, it waits
+       in an event loop instead of polling. It has to be used in the thread it has been created in.
+    """
+
+    _shared_response_received = pyqtSignal(int, object)
+
+    cancel_check_interval_ms = 100
+    max_retries = 3
+    retry_base_delay_seconds = 0.5
+    max_retry_delay_seconds = 60
+
+    def __init__(
+        self,
+        max_requests_per_host: int = None,
+        in_flight_registry: InFlightRegistry = None,
+        on_late_response: Callable[[Hashable, HttpResponse], None] = None,
+    ):
+        QObject.__init__(self)
+        if not max_requests_per_host:
+            max_requests_per_host = default_max_requests_per_host
+        self.max_requests_per_host = max(1, max_requests_per_host)
+        self._pending_by_hosts: Dict[Tuple[str, ...], List[Tuple[float, int, _Request]]] = {}
+        self._delayed: List[Tuple[float, int, _Request]] = []
+        self._nr_of_requests = 0
+        self.nr_of_dropped = 0
+        self.nr_of_failed = 0
+        self._in_flight_by_host: Dict[str, int] = {}
+        self._replies: Dict[QNetworkReply, Tuple[_Request, str, float]] = {}
+        self._finished: Deque[Tuple[Hashable, HttpResponse]] = deque()
+        self._registry = in_flight_registry
+        self._attached: Dict[int, _Request] = {}
+        self._is_detached = False
+        self._on_late_response = on_late_response
+        self._event_loop = QEventLoop()
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.timeout.connect(self._on_retry_timer)
+        self._shared_response_received.connect(self._on_shared_response)
+
+    def add(
+        self, urls: Union[str, List[str]], key: Hashable, headers: Dict[str, str] = None, priority: float = 0
+    ) -> None:
+        """
+         * Queues the request. It is sent as soon as one of its hosts has a free slot.
+        :param urls: The url or the equivalent urls of the request
+        :param key: The key by which the reply is returned, i.e. the coordinates of the tile
+        :param headers: Additional request headers
+        :param priority: Requests with lower values are sent first
+        """
+        if isinstance(urls, str):
+            urls = [urls]
+        urls_by_host = OrderedDict((QUrl(url).host(), url) for url in urls)
+        request = _Request(urls_by_host, key, headers, priority, self._nr_of_requests)
+        self._nr_of_requests += 1
+        self._queue(request)
+
+    def _queue(self, request: _Request) -> None:
+        if self._registry and self._attach(request):
+            return
+        if self._registry:
+            request.shared = self._registry.register(list(request.urls_by_host.values()), request.headers)
+        hosts = tuple(request.urls_by_host)
+        heapq.heappush(self._pending_by_hosts.setdefault(hosts, []), request.entry())
+        self._start_requests(hosts)
+
+    def _attach(self, request: _Request) -> bool:
+        """
+         * Attaches the request to an equal request in flight, if there is one
+        """
+        request.listener = partial(self._shared_response_received.emit, request.seq)
+        self._attached[request.seq] = request
+        request.shared = self._registry.attach(list(request.urls_by_host.values()), request.headers, request.listener)
+        if request.shared is None:
+            self._attached.pop(request.seq, None)
+            request.listener = None
+            return False
+        return True
+
+    def _on_shared_response(self, seq: int, response: Optional[HttpResponse]) -> None:
+        request = self._attached.pop(seq, None)
+        if request is None or self._is_detached:
+            return
+        request.shared = None
+        request.listener = None
+        if response is None:
+            # the request has been dropped by the scheduler it was attached to
+            self._queue(request)
+        else:
+            self._finished.append((request.key, response))
+        self._event_loop.quit()
+
+    def _publish(self, request: _Request, response: Optional[HttpResponse]) -> None:
+        if self._registry and request.shared:
+            self._registry.publish(request.shared, response, keep=self._is_detached)
+            request.shared = None
+
+    def reprioritize(self, priority_func: Callable[[Hashable], Optional[float]]) -> int:
+        """
+         * Sets the priorities of the pending requests to the priorities returned by priority_func for their keys.
+           Requests for which priority_func returns None are dropped, the requests in flight are kept.
+        :return: The number of dropped requests
+        """
+        nr_dropped = 0
+        for pending in self._pending_by_hosts.values():
+            entries = []
+            for _, _, request in pending:
+                priority = priority_func(request.key)
+                if priority is None:
+                    nr_dropped += 1
+                    self._publish(request, None)
+                    continue
+                request.priority = priority
+                entries.append(request.entry())
+            heapq.heapify(entries)
+            pending[:] = entries
+        for request in list(self._attached.values()):
+            if priority_func(request.key) is None:
+                nr_dropped += 1
+                self._detach(request)
+        self.nr_of_dropped += nr_dropped
+        return nr_dropped
+
+    def in_flight(self, host: str = None) -> int:
+        if host is None:
+            return len(self._replies)
+        return self._in_flight_by_host.get(host, 0)
+
+    def attached(self) -> int:
+        """
+         * Returns the number of requests which wait for the response of an equal request in flight
+        """
+        return len(self._attached)
+
+    def _detach(self, request: _Request) -> None:
+        self._attached.pop(request.seq, None)
+        if request.shared:
+            self._registry.detach(request.shared, request.listener)
+        request.shared = None
+        request.listener = None
+
+    def _select_host(self, request: _Request) -> Optional[str]:
+        """
+         * Returns the available host with a free slot and the lowest expected latency or None,
+           if no host has a free slot
+        """
+        best_host = None
+        best_score = None
+        for host in self._get_available_hosts(request):
+            stats = get_host_stats(host)
+            limit = stats.get_request_limit(self.max_requests_per_host)
+            in_flight = self._in_flight_by_host.get(host, 0)
+            if in_flight >= limit:
+                continue
+            latency = stats.latency or 0.0
+            score = latency * (1.0 + in_flight / limit)
+            if best_score is None or score < best_score:
+                best_host = host
+                best_score = score
+        return best_host
+
+    @staticmethod
+    def _get_available_hosts(request: _Request) -> List[str]:
+        hosts = [h for h in request.urls_by_host if h not in request.failed_hosts]
+        return [h for h in hosts if get_host_stats(h).is_available()]
+
+    def _start_requests(self, hosts: Tuple[str, ...]) -> None:
+        pending = self._pending_by_hosts.get(hosts)
+        while pending:
+            request = pending[0][2]
+            host = self._select_host(request)
+            if host is None:
+                if self._get_available_hosts(request):
+                    break
+                heapq.heappop(pending)
+                self._wait_for_hosts(request)
+                continue
+            heapq.heappop(pending)
+            reply = http_get_async(request.urls_by_host[host], headers=request.headers)
+            self._in_flight_by_host[host] = self._in_flight_by_host.get(host, 0) + 1
+            self._replies[reply] = (request, host, time.monotonic())
+            reply.finished.connect(partial(self._on_finished, reply))
+
+    def _on_finished(self, reply: QNetworkReply) -> None:
+        entry = self._replies.pop(reply, None)
+        if entry is None:
+            return
+        request, host, start_time = entry
+        self._in_flight_by_host[host] -= 1
+        failed = _is_server_failure(reply)
+        throttled = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) in (429, 503)
+        retry_after = _get_retry_after(reply) if throttled else None
+        get_host_stats(host).add_response(
+            latency=time.monotonic() - start_time,
+            failed=failed,
+            throttled=throttled,
+            retry_after=retry_after,
+            max_requests=self.max_requests_per_host,
+        )
+        if self._is_detached:
+            response = HttpResponse.from_reply(reply)
+            self._publish(request, response)
+            self._pass_on_late_response(request.key, response)
+            reply.deleteLater()
+            if not self._replies:
+                with _detached_schedulers_lock:
+                    _detached_schedulers.discard(self)
+            return
+        retry_delay = None
+        if failed and request.attempts < self.max_retries:
+            retry_delay = self._get_retry_delay(request.attempts + 1, retry_after)
+        if failed and len(request.failed_hosts) + 1 < len(request.urls_by_host):
+            request.failed_hosts.add(host)
+            debug("Request failed on '{}', trying another host", host)
+            reply.deleteLater()
+            heapq.heappush(self._pending_by_hosts[tuple(request.urls_by_host)], request.entry())
+        elif retry_delay is not None:
+            request.attempts += 1
+            request.failed_hosts.clear()
+            debug("Request to '{}' failed, retry {} in {:.1f}s", host, request.attempts, retry_delay)
+            reply.deleteLater()
+            self._delay(request, retry_delay)
+        else:
+            response = HttpResponse.from_reply(reply)
+            reply.deleteLater()
+            self._finished.append((request.key, response))
+            self._publish(request, response)
+        for hosts in self._pending_by_hosts:
+            if host in hosts:
+                self._start_requests(hosts)
+        self._event_loop.quit()
+
+    def _get_retry_delay(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """
+         * Returns the number of seconds to wait before the specified attempt or None,
+           if the server asks to wait longer than max_retry_delay_seconds
+        """
+        if retry_after is not None:
+            if retry_after > self.max_retry_delay_seconds:
+                return None
+            return retry_after + random.uniform(0, self.retry_base_delay_seconds)
+        backoff = min(self.max_retry_delay_seconds, self.retry_base_delay_seconds * 2 ** (attempt - 1))
+        return random.uniform(0, backoff)
+
+    def _wait_for_hosts(self, request: _Request) -> None:
+        """
+         * Delays the request, whose hosts are all skipped at the moment, until the first of them is available again
+         * Waiting for hosts with too many errors counts as attempt, so that the requests to a server which is down
+           are given up eventually
+        """
+        hosts = [h for h in request.urls_by_host if h not in request.failed_hosts]
+        stats = [get_host_stats(h) for h in hosts]
+        if all(s.is_failing() for s in stats):
+            request.attempts += 1
+            if request.attempts > self.max_retries:
+                self.nr_of_failed += 1
+                self._publish(request, None)
+                return
+        delay = min(s.skipped_until for s in stats) - time.monotonic()
+        self._delay(request, max(0.0, delay))
+
+    def _delay(self, request: _Request, delay: float) -> None:
+        heapq.heappush(self._delayed, (time.monotonic() + delay, request.seq, request))
+        self._start_retry_timer()
+
+    def _start_retry_timer(self) -> None:
+        if self._delayed:
+            delay_ms = int((self._delayed[0][0] - time.monotonic()) * 1000) + 1
+            self._retry_timer.start(max(0, delay_ms))
+
+    def _on_retry_timer(self) -> None:
+        now = time.monotonic()
+        hosts_to_start = set()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, request = heapq.heappop(self._delayed)
+            hosts = tuple(request.urls_by_host)
+            heapq.heappush(self._pending_by_hosts[hosts], request.entry())
+            hosts_to_start.add(hosts)
+        for hosts in hosts_to_start:
+            self._start_requests(hosts)
+        self._start_retry_timer()
+        self._event_loop.quit()
+
+    def results(
+        self, cancelling_func: Callable[[], bool] = None, on_iteration: Callable[[], None] = None
+    ) -> Iterator[Tuple[Hashable, HttpResponse]]:
+        """
+         * Yields the key and the response of each request as soon as the request has finished
+         * If cancelling_func returns True or the iteration is stopped, the pending requests are dropped. The
+           requests in flight are aborted or, if there is an InFlightRegistry, finish in the background.
+         * on_iteration is called whenever the scheduler wakes up, at least every cancel_check_interval_ms,
+           i.e. to reprioritize the pending requests
+        """
+        timer = None
+        if cancelling_func or on_iteration:
+            timer = QTimer()
+            timer.setInterval(self.cancel_check_interval_ms)
+            timer.timeout.connect(self._event_loop.quit)
+            timer.start()
+        try:
+            while self._finished or self._replies or self._delayed or self._attached:
+                if cancelling_func and cancelling_func():
+                    break
+                if on_iteration:
+                    on_iteration()
+                if self._finished:
+                    yield self._finished.popleft()
+                else:
+                    self._event_loop.exec_()
+        finally:
+            if timer:
+                timer.stop()
+            if self._registry:
+                self._detach_all()
+            else:
+                self.abort()
+            for host in self._in_flight_by_host:
+                debug("Host '{}': {}", host, get_host_stats(host))
+
+    def _drop_unsent_requests(self) -> None:
+        for pending in self._pending_by_hosts.values():
+            for _, _, request in pending:
+                self._publish(request, None)
+            pending.clear()
+        for _, _, request in self._delayed:
+            self._publish(request, None)
+        self._delayed.clear()
+        self._retry_timer.stop()
+        for request in list(self._attached.values()):
+            self._detach(request)
+        self._finished.clear()
+
+    def _detach_all(self) -> None:
+        """
+         * Drops the pending requests and lets the ones in flight finish in the background, so that their
+           responses can be used by other loading processes
+         * The responses which have finished but haven't been returned yet are passed to on_late_response
+        """
+        finished = list(self._finished)
+        self._drop_unsent_requests()
+        self._is_detached = True
+        for key, response in finished:
+            self._pass_on_late_response(key, response)
+        if self._replies:
+            debug("{} requests in flight will finish in the background", len(self._replies))
+            # the scheduler has to stay alive until the replies have finished
+            with _detached_schedulers_lock:
+                _detached_schedulers.add(self)
+
+    def _pass_on_late_response(self, key: Hashable, response: HttpResponse) -> None:
+        if not self._on_late_response or response.error or response.content is None:
+            return
+        try:
+            self._on_late_response(key, response)
+        except Exception as e:
+            warn("Handling the response received after cancelling failed: {}", e)
+
+    def abort(self) -> None:
+        """
+         * Drops the pending requests and aborts the ones in flight
+        """
+        self._drop_unsent_requests()
+        replies = list(self._replies.items())
+        self._replies.clear()
+        for reply, (request, _, _) in replies:
+            self._publish(request, None)
+            reply.abort()
+            reply.deleteLater()
+
+
+def _is_server_failure(reply: QNetworkReply) -> bool:
+    """
+     * Returns True if the request failed because of the server or the connection to it, i.e. if the request
+       may succeed on another host. Client errors like 404 are the same on all hosts.
+    """
+    if not reply.error():
+        return False
+    status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+    return status is None or status >= 500 or status == 429
+
+
+def _get_retry_after(reply: QNetworkReply) -> Optional[float]:
+    value = bytes(reply.rawHeader(b"Retry-After")).decode("latin-1")
+    return parse_retry_after(value)
+
+
+def parse_retry_after(value: Optional[str], now: float = None) -> Optional[float]:
+    """
+     * Returns the number of seconds to wait according to a Retry-After header, which contains either
+       the number of seconds or a HTTP date
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    retry_at = _parse_http_date(value)
+    if retry_at is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, retry_at - now)
+
+
 def load_tiles_async(
-    urls_with_col_and_row, on_progress_changed: Callable = None, cancelling_func: Callable[[], bool] = None
-) -> List:
-    replies: List[Tuple[QNetworkReply, Tuple[int, int]]] = [
-        (http_get_async(url), (col, row)) for url, col, row in urls_with_col_and_row
-    ]
-    total_nr_of_requests = len(replies)
-    all_finished = False
-    nr_finished_before = 0
-    finished_tiles = set()
+    urls_with_col_and_row,
+    on_progress_changed: Callable = None,
+    cancelling_func: Callable[[], bool] = None,
+    max_requests_per_host: int = None,
+    validators_by_tile: Dict[Tuple[int, int], dict] = None,
+    on_cache_headers: Callable[[Tuple[int, int], dict], None] = None,
+    get_viewport: Callable[[], Optional[Bounds]] = None,
+    on_late_response: Callable[[Tuple[int, int], HttpResponse], None] = None,
+) -> Iterator[Tuple[Tuple[int, int], Optional[bytes]]]:
+    """
+     * Requests all the specified urls and yields the tile coordinates and the content of each reply
+       as soon as the reply has finished
+     * Instead of a single url, a list of equivalent urls on different hosts can be specified per tile,
+       among which the requests are distributed (see TileRequestScheduler)
+     * At most max_requests_per_host requests are in flight per host at the same time
+     * Tiles with validators (see get_cache_headers) are requested conditionally. If the server responds with
+       304 Not Modified, the content yielded for the tile is None.
+     * on_cache_headers is called with the tile coordinates and the cache headers of each successful response
+     * The requests are sent in the specified order. If get_viewport returns new bounds during the loading,
+       the pending requests are sent by their distance to the center of the bounds and the ones outside of
+       the bounds are dropped. The requests in flight are kept.
+     * Tiles whose urls are already requested by another loading process get the response of that request
+       (see InFlightRegistry)
+     * If cancelling_func returns True or the iteration is stopped, the pending requests are dropped and the
+       requests in flight finish in the background. on_late_response is called with the tile coordinates and
+       the response of each of them, which succeeds, and of the responses which haven't been yielded yet.
+    """
+    scheduler = TileRequestScheduler(
+        max_requests_per_host=max_requests_per_host,
+        in_flight_registry=in_flight_requests,
+        on_late_response=on_late_response,
+    )
+    for url, col, row in urls_with_col_and_row:
+        validators = validators_by_tile.get((col, row)) if validators_by_tile else None
+        scheduler.add(url, (col, row), headers=get_conditional_headers(validators))
+
     nr_finished = 0
-    all_results = []
-    cancelling = False
-    while not all_finished:
-        sleep(0.075)
-        cancelling: bool = cancelling_func and cancelling_func()
-        if cancelling:
-            break
-
-        results = []
-        new_finished = list(filter(lambda r: r[0].isFinished() and r[1] not in finished_tiles, replies))
-        nr_finished += len(new_finished)
-        for reply, tile_coord in new_finished:
-            finished_tiles.add(tile_coord)
-            if reply.error():
-                warn(
-                    "Error during network request: {}, {}",
-                    remove_key(reply.errorString()),
-                    remove_key(reply.url().toDisplayString()),
-                )
-            else:
-                content = reply.readAll().data()
-                results.append((tile_coord, content))
+    current_viewport = None
+
+    def update_viewport():
+        nonlocal current_viewport
+        viewport = get_viewport()
+        if not viewport or viewport == current_viewport:
+            return
+        current_viewport = viewport
+        nr_dropped = scheduler.reprioritize(lambda tile_coord: get_center_distance(tile_coord, viewport))
+        debug("Viewport changed, {} pending requests outside of it dropped", nr_dropped)
+        if nr_dropped and on_progress_changed:
+            on_progress_changed(nr_finished + scheduler.nr_of_dropped + scheduler.nr_of_failed)
+
+    results = scheduler.results(cancelling_func=cancelling_func, on_iteration=get_viewport and update_viewport)
+    for tile_coord, response in results:
+        nr_finished += 1
+        if response.error:
+            warn("Error during network request: {}, {}", remove_key(response.error), remove_key(response.url))
+        elif on_cache_headers:
+            on_cache_headers(tile_coord, response.cache_headers)
+        if on_progress_changed:
+            on_progress_changed(nr_finished + scheduler.nr_of_dropped + scheduler.nr_of_failed)
+        if not response.error:
+            yield tile_coord, response.content
+    if scheduler.nr_of_failed:
+        warn("{} tiles have not been loaded, because the server is not available", scheduler.nr_of_failed)
+
+
+def get_conditional_headers(validators: Optional[dict]) -> Optional[Dict[str, str]]:
+    """
+     * Returns the headers to revalidate a cached response with the specified validators or None,
+       if there is nothing to revalidate
+    """
+    if not validators:
+        return None
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers or None
+
+
+def get_cache_headers(reply: QNetworkReply) -> dict:
+    """
+     * Returns the validators and the expiry of the response, see parse_cache_headers
+    """
+    headers = {
+        bytes(name).decode("latin-1").lower(): bytes(value).decode("latin-1") for name, value in reply.rawHeaderPairs()
+    }
+    return parse_cache_headers(headers)
+
+
+def parse_cache_headers(headers: Dict[str, str], now: float = None) -> dict:
+    """
+     * Returns the validators and the expiry of a response in the form in which they are stored with cached tiles:
+       A dict with the keys etag, last_modified and expires (unix time or None, if the response has no lifetime)
+     * An empty dict is returned if the response has neither validators nor a lifetime or must not be stored
+    :param headers: The response headers with lower case names
+    :param now: The time the response has been received
+    """
+    if now is None:
+        now = time.time()
+    directives = {}
+    for directive in headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip().strip('"')
+    if "no-store" in directives:
+        return {}
+
+    expires = None
+    if "no-cache" in directives:
+        expires = now
+    elif "max-age" in directives:
+        try:
+            age = int(headers.get("age", 0))
+            expires = now + max(0, int(directives["max-age"]) - age)
+        except ValueError:
+            pass
+    if expires is None and "expires" in headers:
+        expires_at = _parse_http_date(headers["expires"])
+        if expires_at is None:
+            # invalid dates (i.e. "0") mean that the response has already expired
+            expires = now
+        else:
+            date = _parse_http_date(headers.get("date"))
+            expires = now + max(0.0, expires_at - (date or now))
+
+    cache_headers = {"etag": headers.get("etag"), "last_modified": headers.get("last-modified"), "expires": expires}
+    if all(v is None for v in cache_headers.values()):
+        return {}
+    return cache_headers
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def http_get_response(
+    url: str, headers: Dict[str, str] = None, max_redirects: int = 5, timeout_ms: int = None
+) -> HttpResponse:
+    """
+     * Requests the url and returns the response, permanent redirects (301) are followed
+    :param headers: Additional request headers, i.e. the headers of a conditional request
+    :param timeout_ms: See wait_for_reply
+    """
+    reply = http_get_async(url, headers=headers)
+    wait_for_reply(reply, timeout_ms=timeout_ms)
+
+    status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+    if status == 301 and max_redirects > 0:
+        location = reply.header(QNetworkRequest.LocationHeader).toString()
+        if location and location != url:
+            info("Moved permanently, new location is: {}", location)
             reply.deleteLater()
-        QApplication.processEvents()
-        all_results.extend(results)
-        all_finished = nr_finished == total_nr_of_requests
-        if nr_finished != nr_finished_before:
-            nr_finished_before = nr_finished
-            if on_progress_changed:
-                on_progress_changed(nr_finished)
-    if not all_finished and cancelling:
-        unfinished_requests = [reply for reply, tile_coord in replies if not reply.isFinished]
-        for r in unfinished_requests:
-            r.abort()
-    if cancelling:
-        all_results = []
-    return all_results
-
-
-def http_get(url: str) -> Tuple[int, str]:
+            return http_get_response(location, headers=headers, max_redirects=max_redirects - 1, timeout_ms=timeout_ms)
+    response = HttpResponse.from_reply(reply)
+    reply.deleteLater()
+    return response
+
+
+def http_get(url: str, timeout_ms: int = None) -> Tuple[int, str]:
     reply = http_get_async(url)
-    while not reply.isFinished():
-        QApplication.processEvents()
+    wait_for_reply(reply, timeout_ms=timeout_ms)
 
     http_status_code = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
     if http_status_code == 200:
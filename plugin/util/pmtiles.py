@@ -0,0 +1,300 @@
+import gzip
+import os
+import struct
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+HEADER_SIZE = 127
+_MAGIC = b"PMTiles"
+_HEADER_FORMAT = "<7sBQQQQQQQQQQQBBBBBBiiiiBii"
+
+
+class Compression(object):
+    UNKNOWN = 0
+    NONE = 1
+    GZIP = 2
+    BROTLI = 3
+    ZSTD = 4
+
+
+class TileType(object):
+    UNKNOWN = 0
+    MVT = 1
+
+
+class Header(NamedTuple):
+    root_offset: int
+    root_length: int
+    metadata_offset: int
+    metadata_length: int
+    leaf_directory_offset: int
+    leaf_directory_length: int
+    tile_data_offset: int
+    tile_data_length: int
+    addressed_tiles_count: int
+    tile_entries_count: int
+    tile_contents_count: int
+    clustered: bool
+    internal_compression: int
+    tile_compression: int
+    tile_type: int
+    min_zoom: int
+    max_zoom: int
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+    center_zoom: int
+    center_lon: float
+    center_lat: float
+
+
+class Directory(NamedTuple):
+    tile_ids: List[int]
+    run_lengths: List[int]
+    offsets: List[int]
+    lengths: List[int]
+
+
+def parse_header(data: bytes) -> Header:
+    """
+     * Parses the header of a PMTiles v3 archive
+     * https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md
+    """
+    if len(data) < HEADER_SIZE:
+        raise RuntimeError("The file is too small to be a PMTiles archive.")
+    values = struct.unpack(_HEADER_FORMAT, data[:HEADER_SIZE])
+    magic, version = values[0], values[1]
+    if magic != _MAGIC:
+        raise RuntimeError("The file is not a PMTiles archive.")
+    if version != 3:
+        raise RuntimeError("PMTiles version {} is not supported, only version 3 can be read.".format(version))
+    min_lon, min_lat, max_lon, max_lat, center_zoom, center_lon, center_lat = values[19:]
+    return Header(
+        *values[2:13],
+        bool(values[13]),
+        *values[14:19],
+        min_lon / 1e7,
+        min_lat / 1e7,
+        max_lon / 1e7,
+        max_lat / 1e7,
+        center_zoom,
+        center_lon / 1e7,
+        center_lat / 1e7,
+    )
+
+
+def zxy_to_tile_id(zoom: int, x: int, y: int) -> int:
+    """
+     * Returns the id of the tile, which is its position on the Hilbert curve of its zoom level
+       plus the number of tiles on all lower zoom levels
+    """
+    tile_id = ((1 << (2 * zoom)) - 1) // 3
+    n = 1 << zoom
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def decompress(data: bytes, compression: int) -> bytes:
+    if compression in (Compression.NONE, Compression.UNKNOWN):
+        return data
+    if compression == Compression.GZIP:
+        return gzip.decompress(data)
+    if compression == Compression.BROTLI and brotli:
+        return brotli.decompress(data)
+    if compression == Compression.ZSTD and zstandard:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise RuntimeError("The compression '{}' of the PMTiles archive is not supported.".format(compression))
+
+
+def is_compression_supported(compression: int) -> bool:
+    if compression == Compression.BROTLI:
+        return brotli is not None
+    if compression == Compression.ZSTD:
+        return zstandard is not None
+    return compression in (Compression.UNKNOWN, Compression.NONE, Compression.GZIP)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+def parse_directory(data: bytes) -> Directory:
+    """
+     * Parses a decompressed root or leaf directory. The columns are stored one after another:
+       the delta encoded tile ids, the run lengths, the lengths and the offsets, where 0 means that the
+       tile data directly follows the data of the previous entry
+    """
+    nr_of_entries, pos = _read_varint(data, 0)
+    tile_ids = [0] * nr_of_entries
+    run_lengths = [0] * nr_of_entries
+    lengths = [0] * nr_of_entries
+    offsets = [0] * nr_of_entries
+
+    last_id = 0
+    for i in range(nr_of_entries):
+        delta, pos = _read_varint(data, pos)
+        last_id += delta
+        tile_ids[i] = last_id
+    for i in range(nr_of_entries):
+        run_lengths[i], pos = _read_varint(data, pos)
+    for i in range(nr_of_entries):
+        lengths[i], pos = _read_varint(data, pos)
+    for i in range(nr_of_entries):
+        value, pos = _read_varint(data, pos)
+        if value == 0 and i > 0:
+            offsets[i] = offsets[i - 1] + lengths[i - 1]
+        else:
+            offsets[i] = value - 1
+    return Directory(tile_ids=tile_ids, run_lengths=run_lengths, offsets=offsets, lengths=lengths)
+
+
+def coalesce_ranges(
+    ranges: List[Tuple[int, int]], max_gap: int, max_size: int
+) -> List[Tuple[int, int, List[Tuple[int, int]]]]:
+    """
+     * Merges the byte ranges (offset, length) into as few reads as possible. Ranges are merged
+       if the gap between them is at most max_gap bytes and the merged read is at most max_size bytes.
+    :return: The reads in the form (offset, length, ranges within the read)
+    """
+    reads = []
+    for offset, length in sorted(set(ranges)):
+        if reads:
+            read_offset, read_length, read_ranges = reads[-1]
+            read_end = read_offset + read_length
+            end = max(read_end, offset + length)
+            if offset - read_end <= max_gap and end - read_offset <= max_size:
+                reads[-1] = (read_offset, end - read_offset, read_ranges + [(offset, length)])
+                continue
+        reads.append((offset, length, [(offset, length)]))
+    return reads
+
+
+class PMTilesReader(object):
+    """
+     * Reads the tiles of a local PMTiles v3 archive
+     * The header and the root directory are read once, leaf directories are cached in a bounded LRU cache,
+       so that looking up tiles requires no reads once the directories are known.
+    """
+
+    max_cached_leaf_directories = 64
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+        try:
+            self.header = parse_header(self.read(0, HEADER_SIZE))
+            for compression in (self.header.internal_compression, self.header.tile_compression):
+                if not is_compression_supported(compression):
+                    raise RuntimeError("The compression of the PMTiles archive '{}' is not supported.".format(path))
+            self._root_directory = self._read_directory(self.header.root_offset, self.header.root_length)
+        except:
+            self.close()
+            raise
+        self._leaf_directories: "OrderedDict[Tuple[int, int], Directory]" = OrderedDict()
+        self._metadata = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        if hasattr(os, "pread"):
+            return os.pread(self._file.fileno(), length, offset)
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def _read_directory(self, offset: int, length: int) -> Directory:
+        data = decompress(self.read(offset, length), self.header.internal_compression)
+        return parse_directory(data)
+
+    def _get_leaf_directory(self, offset: int, length: int) -> Directory:
+        key = (offset, length)
+        with self._lock:
+            directory = self._leaf_directories.get(key)
+            if directory:
+                self._leaf_directories.move_to_end(key)
+                return directory
+        directory = self._read_directory(self.header.leaf_directory_offset + offset, length)
+        with self._lock:
+            self._leaf_directories[key] = directory
+            while len(self._leaf_directories) > self.max_cached_leaf_directories:
+                self._leaf_directories.popitem(last=False)
+        return directory
+
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            data = self.read(self.header.metadata_offset, self.header.metadata_length)
+            data = decompress(data, self.header.internal_compression)
+            self._metadata = json.loads(data.decode("utf-8")) if data else {}
+        return self._metadata
+
+    def find_tile(self, tile_id: int) -> Optional[Tuple[int, int]]:
+        """
+         * Returns the absolute offset and the length of the data of the specified tile or None,
+           if the tile doesn't exist. Run-length encoded entries return the same range for all their tiles.
+        """
+        directory = self._root_directory
+        for _ in range(4):  # the spec limits the depth of the directories to 3 levels
+            index = bisect_right(directory.tile_ids, tile_id) - 1
+            if index < 0:
+                return None
+            run_length = directory.run_lengths[index]
+            if run_length == 0:
+                directory = self._get_leaf_directory(directory.offsets[index], directory.lengths[index])
+                continue
+            if tile_id - directory.tile_ids[index] >= run_length:
+                return None
+            return self.header.tile_data_offset + directory.offsets[index], directory.lengths[index]
+        return None
+
+    def find_tiles(self, zoom: int, tiles: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Tuple[int, int]]:
+        """
+         * Returns the byte ranges of the existing tiles among the specified (x, y) tiles
+        """
+        n = 1 << zoom
+        tile_ids = {t: zxy_to_tile_id(zoom, t[0], t[1]) for t in tiles if 0 <= t[0] < n and 0 <= t[1] < n}
+        ranges = {}
+        for t in sorted(tile_ids, key=tile_ids.get):
+            tile_range = self.find_tile(tile_ids[t])
+            if tile_range:
+                ranges[t] = tile_range
+        return ranges
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,197 @@
+import json
+from typing import List, Optional, Tuple
+
+from .log_helper import debug, info
+
+try:
+    import psycopg2
+    import psycopg2.pool
+    from psycopg2 import sql
+except ImportError:
+    psycopg2 = None
+    sql = None
+
+_EXCLUDED_SCHEMAS = ["information_schema", "pg_catalog", "tiger", "topology"]
+
+_FIELD_TYPES = {
+    "smallint": "Number",
+    "integer": "Number",
+    "bigint": "Number",
+    "numeric": "Number",
+    "real": "Number",
+    "double precision": "Number",
+    "boolean": "Boolean",
+    "text": "String",
+    "character varying": "String",
+    "character": "String",
+}
+
+
+def postgis_supported() -> bool:
+    return psycopg2 is not None
+
+
+def create_connection_pool(connection: dict, max_connections: int) -> "psycopg2.pool.ThreadedConnectionPool":
+    """
+     * Creates a pool of connections to the database of the specified PostGIS connection
+    :param connection: A connection created from the POSTGIS_CONNECTION_TEMPLATE
+    :param max_connections:
+    :return:
+    """
+    info(
+        "Connecting to PostGIS: {}@{}:{}/{}",
+        connection["username"],
+        connection["host"],
+        connection["port"],
+        connection["database"],
+    )
+    return psycopg2.pool.ThreadedConnectionPool(
+        minconn=1,
+        maxconn=max_connections,
+        host=connection["host"],
+        port=int(connection["port"] or 5432),
+        user=connection["username"],
+        password=connection["password"] or None,
+        dbname=connection["database"],
+    )
+
+
+def _get_zoom_range(comment: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+     * Returns the minzoom and maxzoom of the JSON object in the comment of a table, e.g. {"minzoom": 4, "maxzoom": 12}
+    """
+    try:
+        metadata = json.loads(comment) if comment else None
+    except ValueError:
+        metadata = None
+    if not isinstance(metadata, dict):
+        return None, None
+    min_zoom = metadata.get("minzoom")
+    max_zoom = metadata.get("maxzoom")
+    return (
+        int(min_zoom) if isinstance(min_zoom, (int, float)) else None,
+        int(max_zoom) if isinstance(max_zoom, (int, float)) else None,
+    )
+
+
+def get_layers(conn) -> List[dict]:
+    """
+     * Returns the tables with a geometry column, which are provided as layers of the vector tiles
+     * Only the columns of simple types are provided as properties of the features
+     * The zoom range of a layer is read from the comment of its table, if it contains a JSON object
+       with the keys minzoom and maxzoom
+    :param conn: A database connection
+    :return: Dicts with the keys id, schema, table, geometry_column, srid, fields, minzoom and maxzoom
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT f_table_schema, f_table_name, f_geometry_column, srid,
+                obj_description(format('%%I.%%I', f_table_schema, f_table_name)::regclass, 'pg_class')
+            FROM geometry_columns
+            WHERE f_table_schema <> ALL(%s) AND srid > 0 ORDER BY f_table_schema, f_table_name""",
+            (_EXCLUDED_SCHEMAS,),
+        )
+        tables = cur.fetchall()
+        table_names = [t[1] for t in tables]
+        layers = []
+        for schema, table, geometry_column, srid, comment in tables:
+            cur.execute(
+                """SELECT column_name, data_type FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position""",
+                (schema, table),
+            )
+            fields = {name: _FIELD_TYPES[data_type] for name, data_type in cur.fetchall() if data_type in _FIELD_TYPES}
+            layer_id = table if table_names.count(table) == 1 else "{}.{}".format(schema, table)
+            min_zoom, max_zoom = _get_zoom_range(comment)
+            layers.append(
+                {
+                    "id": layer_id,
+                    "schema": schema,
+                    "table": table,
+                    "geometry_column": geometry_column,
+                    "srid": srid,
+                    "fields": fields,
+                    "minzoom": min_zoom,
+                    "maxzoom": max_zoom,
+                }
+            )
+    debug("{} PostGIS layers found", len(layers))
+    return layers
+
+
+def get_bounds(conn, layers: List[dict]) -> Optional[Tuple[float, float, float, float]]:
+    """
+     * Returns the union of the estimated extents of the layers in EPSG:4326 or None, if there are no statistics
+    """
+    bounds = None
+    with conn.cursor() as cur:
+        for layer in layers:
+            try:
+                cur.execute(
+                    """SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e) FROM (
+                        SELECT ST_Transform(ST_SetSRID(ST_EstimatedExtent(%s, %s, %s)::geometry, %s), 4326) AS e
+                    ) extent""",
+                    (layer["schema"], layer["table"], layer["geometry_column"], layer["srid"]),
+                )
+                row = cur.fetchone()
+            except psycopg2.Error as e:
+                debug("Extent of layer '{}' not available: {}", layer["id"], e)
+                conn.rollback()
+                continue
+            if not row or row[0] is None:
+                continue
+            if bounds:
+                row = (min(bounds[0], row[0]), min(bounds[1], row[1]), max(bounds[2], row[2]), max(bounds[3], row[3]))
+            bounds = tuple(row)
+    return bounds
+
+
+def build_tiles_query(layers: List[dict], extent: int = 4096, buffer: int = 64) -> "sql.Composed":
+    """
+     * Returns a query which creates the vector tiles of many tiles at once using ST_AsMVT
+     * The tiles are passed as the parameters zoom, xs and ys (arrays of the columns and rows of the tiles).
+       The query returns a row (x, y, mvt) per tile, where mvt contains all layers.
+     * The features are selected with the envelope of the tile expanded by the buffer, so that features
+       in the buffer area of the tile aren't missing at the tile edges.
+     * Layers with a zoom range are only queried for the zoom levels within their range
+    """
+    layer_queries = []
+    for layer in layers:
+        columns = [sql.SQL("t.{}").format(sql.Identifier(c)) for c in layer["fields"]]
+        layer_query = sql.SQL(
+            """COALESCE((SELECT ST_AsMVT(q, {layer_name}, {extent}, 'mvt_geom') FROM (
+                SELECT ST_AsMVTGeom(ST_Transform(t.{geom}, 3857), tiles.envelope, {extent}, {buffer}, true)
+                    AS mvt_geom{columns}
+                FROM {schema}.{table} t
+                WHERE t.{geom} && ST_Transform(tiles.buffered_envelope, {srid})
+            ) q), ''::bytea)"""
+        ).format(
+            layer_name=sql.Literal(layer["id"]),
+            extent=sql.Literal(extent),
+            buffer=sql.Literal(buffer),
+            geom=sql.Identifier(layer["geometry_column"]),
+            columns=sql.SQL("").join(sql.SQL(", ") + c for c in columns),
+            schema=sql.Identifier(layer["schema"]),
+            table=sql.Identifier(layer["table"]),
+            srid=sql.Literal(layer["srid"]),
+        )
+        zoom_conditions = []
+        if layer.get("minzoom") is not None:
+            zoom_conditions.append(sql.SQL("%(zoom)s >= {}").format(sql.Literal(layer["minzoom"])))
+        if layer.get("maxzoom") is not None:
+            zoom_conditions.append(sql.SQL("%(zoom)s <= {}").format(sql.Literal(layer["maxzoom"])))
+        if zoom_conditions:
+            layer_query = sql.SQL("CASE WHEN {} THEN {} ELSE ''::bytea END").format(
+                sql.SQL(" AND ").join(zoom_conditions), layer_query
+            )
+        layer_queries.append(layer_query)
+    if not layer_queries:
+        layer_queries = [sql.SQL("''::bytea")]
+
+    return sql.SQL(
+        """SELECT tiles.x, tiles.y, {mvt} AS mvt FROM (
+            SELECT u.x, u.y, ST_TileEnvelope(%(zoom)s, u.x, u.y) AS envelope,
+                ST_TileEnvelope(%(zoom)s, u.x, u.y, margin => {margin}) AS buffered_envelope
+            FROM unnest(%(xs)s::int[], %(ys)s::int[]) AS u(x, y)
+        ) tiles"""
+    ).format(mvt=sql.SQL(" || ").join(layer_queries), margin=sql.Literal(buffer / float(extent)))
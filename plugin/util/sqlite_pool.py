@@ -0,0 +1,121 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+from urllib.request import pathname2url
+
+from .log_helper import debug, info
+
+default_nr_of_connections = 4
+default_mmap_size_mb = 256
+
+_pools: Dict[str, "SqliteConnectionPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class SqliteConnectionPool(object):
+    """
+     * A pool of read-only connections to a single SQLite file (i.e. an MBTiles file)
+     * Each connection is created and owned by a worker thread of the pool, which is required by SQLite.
+       Queries are passed to the workers as jobs and the result is returned as a Future.
+       As a result of this, the pool can be used from any thread and several queries can be run in parallel.
+    """
+
+    def __init__(self, path: str, nr_of_connections: int = None, mmap_size_mb: int = None):
+        if nr_of_connections is None:
+            nr_of_connections = default_nr_of_connections
+        if mmap_size_mb is None:
+            mmap_size_mb = default_mmap_size_mb
+        self.path = os.path.abspath(path)
+        self.nr_of_connections = max(1, nr_of_connections)
+        self._mmap_size = mmap_size_mb * 1024 * 1024
+        self._ref_count = 0
+        self._jobs = queue.Queue()
+        self._workers = []
+        for i in range(self.nr_of_connections):
+            worker = threading.Thread(target=self._work, name="sqlite-pool-{}".format(i), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = "file:{}?mode=ro&immutable=1".format(pathname2url(self.path))
+        conn = sqlite3.connect(uri, uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA mmap_size = {}".format(int(self._mmap_size)))
+        return conn
+
+    def _work(self) -> None:
+        conn = None
+        conn_error = None
+        try:
+            conn = self._connect()
+            debug("Read-only connection opened: {}", self.path)
+        except Exception as e:
+            debug("Opening read-only connection failed: {}", e)
+            conn_error = e
+
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            func, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if conn is None:
+                future.set_exception(conn_error)
+                continue
+            try:
+                future.set_result(func(conn))
+            except BaseException as e:
+                future.set_exception(e)
+
+        if conn:
+            conn.close()
+
+    def submit(self, func: Callable[[sqlite3.Connection], object]) -> Future:
+        """
+         * Runs func with the connection of the next free worker
+        :param func: A function which takes the connection as argument
+        :return: The future of the result of func
+        """
+        future = Future()
+        self._jobs.put((func, future))
+        return future
+
+    def run(self, func: Callable[[sqlite3.Connection], object]):
+        return self.submit(func).result()
+
+    def fetch_all(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def close(self) -> None:
+        for _ in self._workers:
+            self._jobs.put(None)
+        self._workers = []
+
+
+def acquire_connection_pool(path: str) -> SqliteConnectionPool:
+    """
+     * Returns the connection pool of the specified file. The pool is shared by all users of the same file
+       and has to be released using release_connection_pool.
+    """
+    key = os.path.abspath(path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if not pool:
+            info("Creating connection pool for: {}", key)
+            pool = SqliteConnectionPool(key)
+            _pools[key] = pool
+        pool._ref_count += 1
+    return pool
+
+
+def release_connection_pool(pool: SqliteConnectionPool) -> None:
+    with _pools_lock:
+        pool._ref_count -= 1
+        if pool._ref_count <= 0:
+            debug("Closing connection pool for: {}", pool.path)
+            _pools.pop(pool.path, None)
+            pool.close()
@@ -0,0 +1,80 @@
+import mmap
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+default_max_concurrent_reads = 8
+default_mmap_min_size_kb = None  # mmap is disabled by default
+
+T = TypeVar("T")
+
+
+def read_tile_file(path: str, mmap_min_size: Optional[int] = None) -> Optional[bytes]:
+    """
+     * Returns the content of the file or None if it doesn't exist
+     * The file is opened right away instead of checking its existence first, which saves a stat call per tile
+    :param path:
+    :param mmap_min_size: Files of at least this size (in bytes) are read using mmap. None disables mmap.
+    :return:
+    """
+    try:
+        with open(path, "rb") as f:
+            if mmap_min_size is not None:
+                size = os.fstat(f.fileno()).st_size
+                if size and size >= mmap_min_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                        return m.read()
+            return f.read()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def read_files_parallel(
+    items: Iterable[T],
+    read_func: Callable[[T], Optional[bytes]],
+    max_concurrent_reads: int = None,
+    should_cancel_func: Callable[[], bool] = None,
+) -> Iterator[Tuple[T, Optional[bytes]]]:
+    """
+     * Reads the files of the specified items using a pool of threads and yields the results as soon as they're
+       available. Reading files releases the GIL, so the reads run in parallel, which is much faster on network
+       shares and spinning disks.
+     * The items are submitted in the specified order and only a limited number of reads is pending at once,
+       i.e. the order of the items (center-first) is roughly kept and cancelling stops reading immediately.
+    :param items: The items to read, i.e. tiles
+    :param read_func: Reads the file of an item
+    :param max_concurrent_reads: The maximum number of threads reading at once
+    :param should_cancel_func:
+    :return: Tuples of the item and the content of its file
+    """
+    if max_concurrent_reads is None:
+        max_concurrent_reads = default_max_concurrent_reads
+    max_concurrent_reads = max(1, max_concurrent_reads)
+    max_pending = 2 * max_concurrent_reads
+
+    items = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=max_concurrent_reads, thread_name_prefix="tile-reader")
+    try:
+        while True:
+            cancelled = should_cancel_func and should_cancel_func()
+            while not cancelled and len(pending) < max_pending:
+                item = next(items, None)
+                if item is None:
+                    break
+                pending.append((item, executor.submit(read_func, item)))
+            if cancelled or not pending:
+                break
+            wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+            remaining = deque()
+            for item, future in pending:
+                if future.done():
+                    yield item, future.result()
+                else:
+                    remaining.append((item, future))
+            pending = remaining
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -60,6 +60,8 @@ class Bounds(dict):
 class VectorTile:
 
     decoded_data = None
+    content_key = None
+    cache_headers = None
 
     def __init__(self, scheme, zoom_level, x, y):
         self.scheme = scheme
@@ -78,6 +80,21 @@ class VectorTile:
         return self.column, self.row
 
 
+def get_tile_location(tile: VectorTile) -> Tuple[float, float, float, float]:
+    """
+     * Returns the origin and the span of the tile in the form (x, y, span_x, span_y) as required by the native decoder
+     * The origin is the top left corner of the tile, because the Y coordinates of a tile start from the top.
+       Due to this, span_y is negative.
+    :param tile:
+    :return:
+    """
+    tile_span_x = tile.extent[2] - tile.extent[0]
+    tile_span_y = tile.extent[1] - tile.extent[3]
+    tile_x = tile.extent[0]
+    tile_y = tile.extent[1] - tile_span_y
+    return tile_x, tile_y, tile_span_x, tile_span_y
+
+
 def clamp(value: Optional[int], low: Optional[int] = None, high: Optional[int] = None) -> Optional[int]:
     if low is not None and value < low:
         value = low
@@ -301,6 +318,33 @@ def get_tiles_from_center(
     return list(selected_tiles)
 
 
+def sort_tiles_from_center(tiles: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+     * Returns the tiles ordered by their distance to the center of the tiles, i.e. the center tile comes first
+    """
+    if not tiles:
+        return []
+    min_x = min(t[0] for t in tiles)
+    min_y = min(t[1] for t in tiles)
+    max_x = max(t[0] for t in tiles)
+    max_y = max(t[1] for t in tiles)
+    center_x = (min_x + max_x) / 2.0
+    center_y = (min_y + max_y) / 2.0
+    return sorted(tiles, key=lambda t: (t[0] - center_x) ** 2 + (t[1] - center_y) ** 2)
+
+
+def get_center_distance(tile: Tuple[int, int], bounds: Bounds) -> Optional[float]:
+    """
+     * Returns the squared distance of the tile to the center of the bounds or None, if the tile is outside of them
+    """
+    x, y = tile
+    if not (bounds.x_min() <= x <= bounds.x_max() and bounds.y_min() <= y <= bounds.y_max()):
+        return None
+    center_x = (bounds.x_min() + bounds.x_max()) / 2.0
+    center_y = (bounds.y_min() + bounds.y_max()) / 2.0
+    return (x - center_x) ** 2 + (y - center_y) ** 2
+
+
 def _sum_tiles(first_tile: Tuple[int, int], second_tile: Tuple[int, int]) -> Tuple[int, int]:
     return first_tile[0] + second_tile[0], first_tile[1] + second_tile[1]
 
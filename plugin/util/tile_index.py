@@ -0,0 +1,367 @@
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+from .file_helper import get_temp_dir
+from .log_helper import critical, debug, info
+
+TileRange = Tuple[int, int, int]  # (tile_column, first tile_row, last tile_row)
+
+
+def get_tile_ranges(tiles: Iterable[Tuple[int, int]]) -> List[TileRange]:
+    """
+     * Groups the specified tile coordinates into column-wise row ranges, i.e. the tiles (1, 1), (1, 2), (1, 3)
+       and (2, 5) result in the ranges [(1, 1, 3), (2, 5, 5)]
+     * The ranges can be used to query the tiles with bound parameters, which allows SQLite to seek on the
+       (zoom_level, tile_column, tile_row) index
+    :param tiles: The tile coordinates as (column, row) tuples
+    :return:
+    """
+    ranges = []
+    sorted_tiles = sorted(set((int(t[0]), int(t[1])) for t in tiles))
+    for col, col_tiles in groupby(sorted_tiles, key=lambda t: t[0]):
+        rows = [t[1] for t in col_tiles]
+        start = rows[0]
+        previous = start
+        for row in rows[1:]:
+            if row != previous + 1:
+                ranges.append((col, start, previous))
+                start = row
+            previous = row
+        ranges.append((col, start, previous))
+    return ranges
+
+
+def get_file_signature(path: str, version: int) -> str:
+    """
+     * Returns a signature of the file, which changes as soon as the file is modified
+    """
+    stat = os.stat(path)
+    return "{};{};{}".format(version, stat.st_mtime_ns, stat.st_size)
+
+
+def get_index_path(source_path: str, extension: str) -> str:
+    path_hash = hashlib.md5(os.path.abspath(source_path).encode("utf-8")).hexdigest()
+    return os.path.join(get_temp_dir("index"), "{}.{}".format(path_hash, extension))
+
+
+def has_tile_index(conn: sqlite3.Connection, table_name: str) -> bool:
+    """
+     * Returns True if the specified table has an index (or primary key) starting with the
+       columns zoom_level, tile_column and tile_row
+    """
+    expected_columns = ["zoom_level", "tile_column", "tile_row"]
+    cur = conn.cursor()
+    for index in cur.execute("PRAGMA index_list('{}')".format(table_name)).fetchall():
+        index_name = index[1]
+        index_columns = [c[2] for c in cur.execute("PRAGMA index_info('{}')".format(index_name)).fetchall()]
+        if index_columns[: len(expected_columns)] == expected_columns:
+            return True
+    return False
+
+
+class ShadowTileIndex(object):
+    """
+     * An index of the tiles table of an MBTiles file, which is stored in the temp directory of the plugin.
+     * It's used for files whose tiles table has no usable index, as the MBTiles file itself must not be changed.
+     * The index maps (zoom_level, tile_column, tile_row) to the rowid of the tile in the MBTiles file and is
+       rebuilt as soon as the modification time or the size of the MBTiles file changes.
+    """
+
+    _VERSION = 1
+
+    def __init__(self, mbtiles_path: str):
+        self._mbtiles_path = os.path.abspath(mbtiles_path)
+        self.path = get_index_path(self._mbtiles_path, "sqlite")
+        self._conn = None
+
+    def _source_signature(self) -> str:
+        return get_file_signature(self._mbtiles_path, self._VERSION)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._conn:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            # the index is built within a worker thread of the connection pool but read by the loading thread
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS info (name TEXT PRIMARY KEY, value TEXT)")
+        return self._conn
+
+    def is_valid(self) -> bool:
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM info WHERE name = 'signature'").fetchone()
+        return row is not None and row[0] == self._source_signature()
+
+    def build(self, source_conn: sqlite3.Connection) -> None:
+        """
+         * Creates the index with a single scan over the tiles table of the MBTiles file
+        :param source_conn: A connection to the MBTiles file
+        """
+        info("Building shadow tile index for '{}'", self._mbtiles_path)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DROP TABLE IF EXISTS tile_index")
+                conn.execute(
+                    """CREATE TABLE tile_index (
+                        zoom_level INTEGER,
+                        tile_column INTEGER,
+                        tile_row INTEGER,
+                        tile_rowid INTEGER,
+                        PRIMARY KEY (zoom_level, tile_column, tile_row)
+                    ) WITHOUT ROWID"""
+                )
+                cur = source_conn.cursor()
+                cur.execute("SELECT zoom_level, tile_column, tile_row, rowid FROM tiles")
+                conn.executemany("INSERT OR REPLACE INTO tile_index VALUES (?, ?, ?, ?)", map(tuple, cur))
+                conn.execute(
+                    "INSERT OR REPLACE INTO info (name, value) VALUES ('signature', ?)", (self._source_signature(),)
+                )
+            debug("Shadow tile index created: {}", self.path)
+        except:
+            critical("Building shadow tile index failed: {}", sys.exc_info())
+            raise
+
+    def get_rowids(self, zoom_level: int, tile_ranges: List[TileRange]) -> List[int]:
+        conn = self._connect()
+        sql = "SELECT tile_rowid FROM tile_index WHERE zoom_level = ? AND tile_column = ? AND tile_row BETWEEN ? AND ?"
+        rowids = []
+        for col, row_min, row_max in tile_ranges:
+            rowids.extend(r[0] for r in conn.execute(sql, (zoom_level, col, row_min, row_max)))
+        return rowids
+
+    def close(self) -> None:
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+
+class ZoomPresence(object):
+    """
+     * The tiles of a single zoom level of an MBTiles file
+     * The existence of the tiles is stored as bitmap over the bounding box of the zoom level, one bit per tile.
+       If the bounding box is too large, no bitmap is created and the existence of a tile is unknown.
+    """
+
+    max_bitmap_bits = 2 ** 26
+
+    def __init__(self, zoom_level: int, col_min: int, col_max: int, row_min: int, row_max: int, count: int):
+        self.zoom_level = zoom_level
+        self.col_min = col_min
+        self.col_max = col_max
+        self.row_min = row_min
+        self.row_max = row_max
+        self.count = count
+        self.bitmap: Optional[bytearray] = None
+
+    @property
+    def _height(self) -> int:
+        return self.row_max - self.row_min + 1
+
+    def _bit(self, col: int, row: int) -> int:
+        return (col - self.col_min) * self._height + (row - self.row_min)
+
+    def create_bitmap(self) -> bool:
+        nr_of_bits = (self.col_max - self.col_min + 1) * self._height
+        if nr_of_bits > self.max_bitmap_bits:
+            return False
+        self.bitmap = bytearray((nr_of_bits + 7) // 8)
+        return True
+
+    def add(self, col: int, row: int) -> None:
+        bit = self._bit(col, row)
+        self.bitmap[bit >> 3] |= 1 << (bit & 7)
+
+    def contains(self, col: int, row: int) -> Optional[bool]:
+        """
+         * Returns True or False if the tile exists or not and None, if this is unknown
+        """
+        if not (self.col_min <= col <= self.col_max and self.row_min <= row <= self.row_max):
+            return False
+        if self.bitmap is None:
+            return None
+        bit = self._bit(col, row)
+        return bool(self.bitmap[bit >> 3] & (1 << (bit & 7)))
+
+
+class TilePresenceIndex(object):
+    """
+     * Knows the number, the bounds and the existence of the tiles per zoom level of an MBTiles file.
+     * It's created with a single pass over the tiles table and persisted in the temp directory of the plugin,
+       where it's used until the modification time or the size of the MBTiles file changes.
+    """
+
+    _VERSION = 1
+
+    def __init__(self, mbtiles_path: str):
+        self._mbtiles_path = os.path.abspath(mbtiles_path)
+        self.path = get_index_path(self._mbtiles_path, "presence")
+        self.zoom_levels: Dict[int, ZoomPresence] = {}
+
+    def load(self) -> bool:
+        """
+         * Loads the persisted index, if it's still valid
+        :return: True if the index has been loaded
+        """
+        if not os.path.isfile(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                signature, zoom_levels = pickle.load(f)
+        except:
+            debug("Loading tile presence index failed: {}", sys.exc_info()[1])
+            return False
+        if signature != get_file_signature(self._mbtiles_path, self._VERSION):
+            return False
+        self.zoom_levels = {}
+        for zoom_level, values in zoom_levels.items():
+            presence = ZoomPresence(zoom_level, *values[:5])
+            presence.bitmap = values[5]
+            self.zoom_levels[zoom_level] = presence
+        return True
+
+    def build(self, source_conn: sqlite3.Connection) -> None:
+        """
+         * Creates the index from the tiles table and persists it
+        :param source_conn: A connection to the MBTiles file
+        """
+        info("Building tile presence index for '{}'", self._mbtiles_path)
+        signature = get_file_signature(self._mbtiles_path, self._VERSION)
+        zoom_levels = {}
+        cur = source_conn.cursor()
+        cur.execute(
+            """SELECT zoom_level, min(tile_column), max(tile_column), min(tile_row), max(tile_row), count(*)
+            FROM tiles GROUP BY zoom_level"""
+        )
+        for zoom_level, col_min, col_max, row_min, row_max, count in cur.fetchall():
+            zoom_levels[zoom_level] = ZoomPresence(zoom_level, col_min, col_max, row_min, row_max, count)
+
+        # only the zoom levels with a bitmap are scanned, which lets SQLite seek on the tile index
+        # instead of walking the tiles of the (usually much larger) zoom levels without one
+        with_bitmap = [z.zoom_level for z in zoom_levels.values() if z.create_bitmap()]
+        if with_bitmap:
+            cur.execute(
+                "SELECT zoom_level, tile_column, tile_row FROM tiles WHERE zoom_level IN ({})".format(
+                    ", ".join("?" * len(with_bitmap))
+                ),
+                with_bitmap,
+            )
+            for zoom_level, col, row in cur:
+                zoom_levels[zoom_level].add(col, row)
+        self.zoom_levels = zoom_levels
+
+        # only builtin types are persisted, as the module path of the plugin depends on the installation
+        persisted_zoom_levels = {
+            z.zoom_level: (z.col_min, z.col_max, z.row_min, z.row_max, z.count, z.bitmap) for z in zoom_levels.values()
+        }
+        tmp_path = "{}.tmp".format(self.path)
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp_path, "wb") as f:
+                pickle.dump((signature, persisted_zoom_levels), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            debug("Tile presence index created: {}", self.path)
+        except:
+            critical("Persisting tile presence index failed: {}", sys.exc_info())
+
+    def count(self, zoom_level: int) -> int:
+        presence = self.zoom_levels.get(zoom_level)
+        return presence.count if presence else 0
+
+    def min_zoom(self) -> Optional[int]:
+        return min(self.zoom_levels) if self.zoom_levels else None
+
+    def max_zoom(self) -> Optional[int]:
+        return max(self.zoom_levels) if self.zoom_levels else None
+
+    def get(self, zoom_level: int) -> Optional[ZoomPresence]:
+        return self.zoom_levels.get(zoom_level)
+
+    def filter_existing(self, zoom_level: int, tiles: Iterable[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+        """
+         * Returns the tiles that exist or whose existence is unknown
+        """
+        presence = self.zoom_levels.get(zoom_level)
+        if not presence:
+            return set()
+        return {t for t in tiles if presence.contains(t[0], t[1]) is not False}
+
+
+class DirectoryTileIndex(object):
+    """
+     * An in-memory index of the tile files of a directory with the layout {z}/{x}/{y}.<extension>
+     * Each column directory is listed once using os.scandir and listed again only if its modification time
+       changes. Due to this, missing tiles are known without a filesystem round trip per tile.
+     * Besides '.pbf', the extensions '.mvt' and pre-gzipped tiles ('.pbf.gz', '.mvt.gz') are recognized.
+    """
+
+    extensions = ["pbf", "mvt", "pbf.gz", "mvt.gz"]
+    _template_pattern = re.compile(r"^(?P<base>.*)[/\\]\{z\}[/\\]\{x\}[/\\]\{y\}\.[\w.]+$")
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self._columns: Dict[Tuple[int, int], Tuple[int, Dict[int, str]]] = {}
+
+    @staticmethod
+    def from_template(tile_path_template: str) -> Optional["DirectoryTileIndex"]:
+        """
+         * Returns an index for the specified path template or None, if the template doesn't follow
+           the layout {z}/{x}/{y}.<extension>
+        """
+        match = DirectoryTileIndex._template_pattern.match(tile_path_template)
+        if not match:
+            return None
+        return DirectoryTileIndex(match.group("base"))
+
+    def get_tile_files(self, zoom_level: int, tiles: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], str]:
+        """
+         * Returns the paths of the files of the specified tiles. Tiles without a file are omitted.
+        """
+        tile_files = {}
+        for col, col_tiles in groupby(sorted(tiles), key=lambda t: t[0]):
+            files = self._get_column(zoom_level, col)
+            if not files:
+                continue
+            for t in col_tiles:
+                path = files.get(t[1])
+                if path:
+                    tile_files[t] = path
+        return tile_files
+
+    def _get_column(self, zoom_level: int, col: int) -> Dict[int, str]:
+        col_dir = os.path.join(self.base_path, str(int(zoom_level)), str(int(col)))
+        try:
+            mtime = os.stat(col_dir).st_mtime_ns
+        except OSError:
+            self._columns.pop((zoom_level, col), None)
+            return {}
+
+        cached = self._columns.get((zoom_level, col))
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        files = {}
+        priorities = {}
+        with os.scandir(col_dir) as entries:
+            for entry in entries:
+                row, _, extension = entry.name.partition(".")
+                if extension not in self.extensions or not row.lstrip("-").isdigit():
+                    continue
+                row = int(row)
+                priority = self.extensions.index(extension)
+                if row not in files or priority < priorities[row]:
+                    files[row] = entry.path
+                    priorities[row] = priority
+        self._columns[(zoom_level, col)] = (mtime, files)
+        return files
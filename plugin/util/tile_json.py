@@ -1,10 +1,12 @@
 import ast
 import os
 import sys
-from typing import List, Optional, Tuple
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from .log_helper import critical, debug, info
-from .network_helper import http_get
+from .network_helper import HttpResponse, get_conditional_headers, get_loading_error, http_get_response
 from .tile_helper import WORLD_BOUNDS, get_tile_bounds
 
 try:
@@ -13,25 +15,87 @@ except ImportError:
     import json
 
 
+class _CachedTileJSON(object):
+    def __init__(self, response: HttpResponse, fresh_until: float):
+        self.response = response
+        self.fresh_until = fresh_until
+
+
+class TileJSONCache(object):
+    """
+     * Caches the TileJSON documents by url, so that all sources of a connection share a single request
+     * A cached document is used without request for ttl_seconds. Afterwards, it's revalidated with a conditional
+       request, if the server provided validators (ETag, Last-Modified), or requested again.
+     * The request serves as existence check of the url at the same time. Failed requests aren't cached.
+    """
+
+    ttl_seconds = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _CachedTileJSON] = {}
+
+    def get(self, url: str) -> HttpResponse:
+        """
+         * Returns the successful response for the url or the response of the failed request
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry and time.monotonic() < entry.fresh_until:
+            debug("TileJSON from cache: {}", url)
+            return entry.response
+
+        headers = get_conditional_headers(entry.response.cache_headers) if entry else None
+        response = http_get_response(url, headers=headers)
+        if response.status == 304 and entry:
+            debug("Cached TileJSON revalidated: {}", url)
+            response = entry.response
+        elif response.error or response.status != 200:
+            return response
+
+        with self._lock:
+            self._entries[url] = _CachedTileJSON(response, time.monotonic() + self.ttl_seconds)
+        return response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+tile_json_cache = TileJSONCache()
+
+
 class TileJSON(object):
     """
      * Wrapper for TileJSON v2.2.0
      * https://github.com/mapbox/tilejson-spec/tree/master/2.2.0
+     * TileJSON from urls is loaded through the tile_json_cache
     """
 
     def __init__(self, url: str):
         self.url = url
         self.json: Optional[dict] = None
+        self.error: Optional[str] = None
 
     def load(self) -> bool:
+        """
+         * Loads the TileJSON
+         * If the url cannot be loaded, the message for the user is available as error
+        :return: True if valid TileJSON has been loaded
+        """
         debug("Loading TileJSON")
         success = False
+        self.error = None
         try:
             if os.path.isfile(self.url):
                 with open(self.url, "r") as f:
                     data = f.read()
             else:
-                status, data = http_get(self.url)
+                response = tile_json_cache.get(self.url)
+                if response.error or response.status != 200:
+                    self.error = get_loading_error(self.url, response.status, response.error)
+                    raise RuntimeError(self.error)
+                data = response.content.decode("utf-8")
             self.json = json.loads(data)
             if self.json:
                 debug("TileJSON loaded")
@@ -107,6 +171,16 @@ class TileJSON(object):
         tiles = self._get_value("tiles", is_array=True, is_required=True)
         return tiles
 
+    def subdomains(self) -> Optional[List[str]]:
+        """
+         * Returns the subdomains for the placeholder {s} of the tile urls, if the TileJSON provides them.
+           Like in Leaflet, a string is treated as list of single character subdomains.
+        """
+        subdomains = self._get_value("subdomains")
+        if not subdomains:
+            return None
+        return [str(s) for s in subdomains]
+
     def name(self) -> str:
         return self._get_value("name")
 
@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import sys
+from typing import Dict, List, Set, Tuple
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from .log_helper import critical, debug, info
+from .tile_helper import change_scheme, get_all_tiles, get_tile_bounds
+from .tile_source import ServerSource
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+Extent = Tuple[float, float, float, float]  # (west, south, east, north) in EPSG:4326
+
+
+class TileSeeder(QObject):
+    """
+     * Downloads all tiles of an extent and a range of zoom levels from a ServerSource into an MBTiles file,
+       which can be opened with MBTilesSource, i.e. to use the tiles without network connection
+     * Tiles which exist in the MBTiles file already are skipped. Due to this, an interrupted seeding
+       is resumed by seeding the same extent and zoom levels again.
+     * The tiles are requested in chunks of chunk_size tiles with the concurrency of the source
+       (see max_requests_per_host) and written with one transaction per batch_size tiles
+     * seed blocks until all tiles have been downloaded, so it should be run in a worker thread
+    """
+
+    progress_changed = pyqtSignal(int, name="progressChanged")
+    max_progress_changed = pyqtSignal(int, name="maxProgressChanged")
+    message_changed = pyqtSignal("QString", name="messageChanged")
+
+    chunk_size = 1024
+    batch_size = 256
+
+    def __init__(self, source: ServerSource, path: str):
+        QObject.__init__(self)
+        if not path:
+            raise RuntimeError("The path of the MBTiles file is required")
+        self._source = source
+        self.path = path
+        self._cancelling = False
+
+    def cancel(self) -> None:
+        self._cancelling = True
+        self._source.cancel()
+
+    def seed(self, extent: Extent, min_zoom: int, max_zoom: int) -> int:
+        """
+         * Downloads the missing tiles of the extent on the zoom levels min_zoom to max_zoom
+        :param extent: The extent in EPSG:4326 as (west, south, east, north)
+        :param min_zoom:
+        :param max_zoom:
+        :return: The number of tiles written to the MBTiles file
+        """
+        self._cancelling = False
+        source_min_zoom = self._source.min_zoom()
+        source_max_zoom = self._source.max_zoom()
+        if source_min_zoom is not None:
+            min_zoom = max(min_zoom, source_min_zoom)
+        if source_max_zoom is not None:
+            max_zoom = min(max_zoom, source_max_zoom)
+        if min_zoom > max_zoom:
+            raise RuntimeError("The source has no tiles on the zoom levels {} to {}".format(min_zoom, max_zoom))
+
+        # the cache validators and the viewport of a previous loading process must not restrict the seeding
+        self._source.set_cache_validators({})
+        self._source.set_viewport(None)
+
+        conn = self._connect()
+        try:
+            self._write_metadata(conn, extent, min_zoom, max_zoom)
+            tiles_by_zoom = self._get_missing_tiles(conn, extent, min_zoom, max_zoom)
+            nr_of_tiles = sum(len(tiles) for tiles in tiles_by_zoom.values())
+            info("Seeding {} tiles of zoom levels {} to {} into '{}'", nr_of_tiles, min_zoom, max_zoom, self.path)
+            self.max_progress_changed.emit(nr_of_tiles)
+            self.message_changed.emit("Downloading {} tiles...".format(nr_of_tiles))
+
+            nr_done = 0
+            nr_written = 0
+            for zoom_level, tiles in tiles_by_zoom.items():
+                for i in range(0, len(tiles), self.chunk_size):
+                    if self._cancelling:
+                        break
+                    chunk = tiles[i : i + self.chunk_size]
+                    nr_written += self._seed_chunk(conn, zoom_level, chunk, nr_done)
+                    nr_done += len(chunk)
+                    self.progress_changed.emit(nr_done)
+        except:
+            critical("Seeding '{}' failed: {}", self.path, sys.exc_info())
+            raise
+        finally:
+            conn.close()
+        if self._cancelling:
+            info("Seeding cancelled, {} tiles written. Seed again to resume.", nr_written)
+        else:
+            info("Seeding complete, {} tiles written", nr_written)
+        return nr_written
+
+    def _seed_chunk(
+        self, conn: sqlite3.Connection, zoom_level: int, tiles: List[Tuple[int, int]], progress: int
+    ) -> int:
+        is_tms = self._source.scheme() == "tms"
+        batch = []
+        nr_written = 0
+        for index, (tile, data) in enumerate(self._source.iter_tiles(zoom_level=zoom_level, tiles_to_load=tiles)):
+            if data:
+                row = tile.row if is_tms else change_scheme(zoom_level, tile.row)
+                batch.append((zoom_level, tile.column, row, sqlite3.Binary(data)))
+            if len(batch) >= self.batch_size:
+                nr_written += self._write_tiles(conn, batch)
+                batch = []
+            self.progress_changed.emit(progress + index + 1)
+        if batch:
+            nr_written += self._write_tiles(conn, batch)
+        return nr_written
+
+    @staticmethod
+    def _write_tiles(conn: sqlite3.Connection, batch: List[Tuple[int, int, int, bytes]]) -> int:
+        with conn:
+            sql = "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)"
+            conn.executemany(sql, batch)
+        debug("{} tiles written", len(batch))
+        return len(batch)
+
+    def _get_missing_tiles(
+        self, conn: sqlite3.Connection, extent: Extent, min_zoom: int, max_zoom: int
+    ) -> Dict[int, List[Tuple[int, int]]]:
+        """
+         * Returns the tiles of the extent per zoom level in the scheme of the source, which are not in the
+           MBTiles file yet
+        """
+        scheme = self._source.scheme()
+        tiles_by_zoom = {}
+        for zoom_level in range(min_zoom, max_zoom + 1):
+            bounds = get_tile_bounds(zoom=zoom_level, extent=extent, source_crs="4326", scheme=scheme)
+            tiles = get_all_tiles(bounds, is_cancel_requested_handler=lambda: self._cancelling)
+            existing_tiles = self._get_existing_tiles(conn, zoom_level)
+            if scheme != "tms":
+                existing_tiles = {(col, change_scheme(zoom_level, row)) for col, row in existing_tiles}
+            missing_tiles = [t for t in tiles if t not in existing_tiles]
+            if len(missing_tiles) < len(tiles):
+                debug(
+                    "Zoom level {}: {} of {} tiles exist already",
+                    zoom_level,
+                    len(tiles) - len(missing_tiles),
+                    len(tiles),
+                )
+            tiles_by_zoom[zoom_level] = missing_tiles
+        return tiles_by_zoom
+
+    @staticmethod
+    def _get_existing_tiles(conn: sqlite3.Connection, zoom_level: int) -> Set[Tuple[int, int]]:
+        cur = conn.execute("SELECT tile_column, tile_row FROM tiles WHERE zoom_level = ?", (zoom_level,))
+        return {(col, row) for col, row in cur}
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS metadata_name ON metadata (name)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB
+                )"""
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        return conn
+
+    def _write_metadata(self, conn: sqlite3.Connection, extent: Extent, min_zoom: int, max_zoom: int) -> None:
+        """
+        * Writes the metadata of the source. The bounds and zoom levels are extended by the ones of previous
+          seedings into the same file.
+        """
+        existing = dict(conn.execute("SELECT name, value FROM metadata").fetchall())
+        bounds = list(extent)
+        if existing.get("bounds"):
+            previous_bounds = [float(v) for v in existing["bounds"].split(",")]
+            bounds = [
+                min(bounds[0], previous_bounds[0]),
+                min(bounds[1], previous_bounds[1]),
+                max(bounds[2], previous_bounds[2]),
+                max(bounds[3], previous_bounds[3]),
+            ]
+        if existing.get("minzoom") is not None:
+            min_zoom = min(min_zoom, int(existing["minzoom"]))
+        if existing.get("maxzoom") is not None:
+            max_zoom = max(max_zoom, int(existing["maxzoom"]))
+
+        metadata = {
+            "name": self._source.name(),
+            "format": "pbf",
+            "scheme": "tms",
+            "bounds": ",".join(str(v) for v in bounds),
+            "minzoom": str(min_zoom),
+            "maxzoom": str(max_zoom),
+            "attribution": self._source.attribution() or "",
+            "json": json.dumps({"vector_layers": self._source.vector_layers() or []}),
+        }
+        crs = self._source.crs()
+        if crs:
+            metadata["crs"] = crs
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)", metadata.items())
@@ -3,14 +3,36 @@ import sqlite3
 import sys
 import traceback
 import urllib.parse
-from typing import List, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from math import ceil
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from PyQt5.QtCore import QObject, pyqtSignal
 
 from .file_helper import is_sqlite_db
 from .log_helper import critical, debug, info, warn
-from .network_helper import load_tiles_async, url_exists
-from .tile_helper import WORLD_BOUNDS, Bounds, VectorTile, get_tile_bounds, get_tiles_from_center
+from .metadata_summary import get_metadata_summary
+from .network_helper import HttpResponse, load_tiles_async
+from .postgis_helper import build_tiles_query, create_connection_pool, get_bounds, get_layers, postgis_supported
+from .pmtiles import Compression, PMTilesReader, TileType, coalesce_ranges, decompress
+from .sqlite_pool import SqliteConnectionPool, acquire_connection_pool, release_connection_pool
+from .tile_file_reader import (
+    default_max_concurrent_reads,
+    default_mmap_min_size_kb,
+    read_files_parallel,
+    read_tile_file,
+)
+from .tile_helper import (
+    WORLD_BOUNDS,
+    Bounds,
+    VectorTile,
+    clamp,
+    get_tile_bounds,
+    get_tiles_from_center,
+    sort_tiles_from_center,
+)
+from .tile_index import DirectoryTileIndex, ShadowTileIndex, TilePresenceIndex, get_tile_ranges, has_tile_index
 from .tile_json import TileJSON
 
 try:
@@ -27,6 +49,8 @@ class AbstractSource(QObject):
     max_progress_changed = pyqtSignal(int, name="tileSourceMaxProgressChanged")
     message_changed = pyqtSignal("QString", name="tileSourceMessageChanged")
     tile_limit_reached = pyqtSignal(name="tile_limit_reached")
+    # a tile, whose data has arrived after its loading process has been cancelled, with its cache_headers set
+    late_tile_received = pyqtSignal(object, object, name="tileSourceLateTileReceived")
 
     def __init__(self):
         QObject.__init__(self)
@@ -81,7 +105,46 @@ class AbstractSource(QObject):
     def crs(self):
         raise NotImplementedError
 
-    def load_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
+    def mask_level(self):
+        return None
+
+    def set_viewport(self, bounds: Optional[Bounds]) -> bool:
+        """
+         * Sets the tile bounds the map currently shows. Sources supporting this load the tiles nearest to the center
+           of the bounds first and skip the tiles outside of them, which haven't been requested yet.
+         * This method may be called from another thread during the loading
+        :param bounds: The tile bounds or None to reset them
+        :return: True if the source supports this, otherwise the loading has to be cancelled
+        """
+        return False
+
+    def set_cache_validators(self, validators_by_tile: Dict[Tuple[int, int], dict]) -> None:
+        """
+         * Sets the validators of the expired cache entries of tiles, which are revalidated during the next load
+         * Sources which can revalidate tiles (i.e. ServerSource) yield the tiles confirmed to be unchanged
+           with data None
+        :param validators_by_tile: The validators by the (column, row) of the tiles
+        """
+        pass
+
+    def metadata_summary(self) -> dict:
+        """
+         * Returns the metadata which is required to open a connection, i.e. the zoom levels and vector layers
+        :return:
+        """
+        return {
+            "name": self.name(),
+            "attribution": self.attribution(),
+            "min_zoom": self.min_zoom(),
+            "max_zoom": self.max_zoom(),
+            "mask_level": self.mask_level(),
+            "scheme": self.scheme(),
+            "bounds": self.bounds(),
+            "crs": self.crs(),
+            "vector_layers": self.vector_layers(),
+        }
+
+    def load_tiles(self, zoom_level, tiles_to_load, max_tiles=None) -> List[Tuple[VectorTile, bytes]]:
         """
          * Loads the tiles for the specified zoom_level and bounds from the web service,
           this source has been created with
@@ -90,26 +153,45 @@ class AbstractSource(QObject):
         :param max_tiles: The maximum number of tiles to be loaded
         :return:
         """
+        return list(self.iter_tiles(zoom_level=zoom_level, tiles_to_load=tiles_to_load, max_tiles=max_tiles))
+
+    def iter_tiles(self, zoom_level, tiles_to_load, max_tiles=None) -> Iterator[Tuple[VectorTile, bytes]]:
+        """
+         * Same as load_tiles, but the tiles are yielded as soon as they have been read from the source,
+          i.e. the tiles can be processed while the remaining tiles are still being loaded
+        :param tiles_to_load: All tile coordinates which shall be loaded
+        :param zoom_level: The zoom level which will be loaded
+        :param max_tiles: The maximum number of tiles to be loaded
+        :return:
+        """
         raise NotImplementedError
 
 
 class ServerSource(AbstractSource):
-    def __init__(self, url: str):
+    _default_subdomains = ["a", "b", "c", "d"]
+
+    def __init__(self, url: str, max_requests_per_host: int = None, subdomains: List[str] = None):
+        """
+        :param url: The url of the TileJSON
+        :param max_requests_per_host: The number of requests in flight per host
+        :param subdomains: The subdomains for the placeholder {s}. If not set, the subdomains of the TileJSON
+                           or a to d (i.e. Nextzen) are used.
+        """
         AbstractSource.__init__(self)
         if not url:
             raise RuntimeError("URL is required")
 
-        if os.path.isfile(url):
-            valid = True
-        else:
-            valid, error, url = url_exists(url)
-        if not valid:
+        # the TileJSON is shared by all sources of the url, its request serves as existence check of the url
+        self.json = TileJSON(url)
+        if not self.json.load() and self.json.error:
             critical("The URL seems to be invalid: {}", url)
-            raise RuntimeError(error)
+            raise RuntimeError(self.json.error)
 
         self.url = url
-        self.json = TileJSON(url)
-        self.json.load()
+        self.max_requests_per_host = max_requests_per_host
+        self.subdomains = subdomains
+        self._cache_validators: Dict[Tuple[int, int], dict] = {}
+        self._viewport: Optional[Bounds] = None
 
     def source(self):
         return self.url
@@ -150,11 +232,42 @@ class ServerSource(AbstractSource):
     def crs(self):
         return self.json.crs()
 
-    def load_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
+    def set_cache_validators(self, validators_by_tile: Dict[Tuple[int, int], dict]) -> None:
+        self._cache_validators = validators_by_tile
+
+    def set_viewport(self, bounds: Optional[Bounds]) -> bool:
+        self._viewport = bounds
+        return True
+
+    def _get_viewport(self, zoom_level: int) -> Optional[Bounds]:
+        viewport = self._viewport
+        if viewport and viewport.zoom() == zoom_level:
+            return viewport
+        return None
+
+    def _get_url_templates(self) -> List[str]:
+        """
+         * Returns all tile url templates of the TileJSON, among which the requests are distributed
+         * Templates with the placeholder {s} are expanded to one template per subdomain
+        """
+        subdomains = self.subdomains or self.json.subdomains() or self._default_subdomains
+        templates = []
+        for template in self.json.tiles():
+            if "{s}" in template:
+                templates.extend(template.replace("{s}", subdomain) for subdomain in subdomains)
+            else:
+                templates.append(template)
+        return list(OrderedDict.fromkeys(templates))
+
+    def _on_late_response(self, zoom_level: int, coord: Tuple[int, int], response: HttpResponse) -> None:
+        tile = VectorTile(self.scheme(), zoom_level=zoom_level, x=coord[0], y=coord[1])
+        tile.cache_headers = response.cache_headers or {}
+        self.late_tile_received.emit(tile, response.content)
+
+    def iter_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
         self._cancelling = False
-        base_url = self.json.tiles()[0]
-        if "{s}" in base_url:
-            info("Special treatment for Nextzen url...")
+        templates = self._get_url_templates()
+        info("Loading tiles from {} url templates", len(templates))
 
         urls = []
         if max_tiles and len(tiles_to_load) > max_tiles:
@@ -165,39 +278,47 @@ class ServerSource(AbstractSource):
         api_key = ""
         if "api_key" in list(parameters.keys()):
             api_key = parameters["api_key"][0]
-        nextzen_servers = ["a", "b", "c", "d"]
-        for i, t in enumerate(tiles_to_load):
+        for t in sort_tiles_from_center(list(tiles_to_load)):
             col = t[0]
             row = t[1]
-            load_url = (
-                base_url.replace("{z}", str(int(zoom_level)))
-                .replace("{x}", str(int(col)))
-                .replace("{y}", str(int(row)))
-                .replace("{api_key}", str(api_key))
-                .replace("{s}", nextzen_servers[divmod(i, len(nextzen_servers))[1]])
-            )  # nextzen server placeholder
-            if api_key:
-                load_url += "?api_key={}".format(api_key)
-            urls.append((load_url, col, row))
+            load_urls = []
+            for template in templates:
+                load_url = (
+                    template.replace("{z}", str(int(zoom_level)))
+                    .replace("{x}", str(int(col)))
+                    .replace("{y}", str(int(row)))
+                    .replace("{api_key}", str(api_key))
+                )
+                if api_key:
+                    load_url += "?api_key={}".format(api_key)
+                load_urls.append(load_url)
+            urls.append((load_urls, col, row))
 
         self.max_progress_changed.emit(len(urls))
         self.message_changed.emit("Getting {} tiles from source...".format(len(urls)))
+        cache_headers_by_tile = {}
         tile_coords_with_content = load_tiles_async(
             urls_with_col_and_row=urls,
             on_progress_changed=lambda p: self.progress_changed.emit(p),
             cancelling_func=lambda: self._cancelling,
+            max_requests_per_host=self.max_requests_per_host,
+            validators_by_tile=self._cache_validators,
+            on_cache_headers=cache_headers_by_tile.__setitem__,
+            get_viewport=lambda: self._get_viewport(zoom_level),
+            on_late_response=lambda coord, response: self._on_late_response(zoom_level, coord, response),
         )
-        tiles_with_data = []
+        scheme = self.scheme()
         for coord, data in tile_coords_with_content:
-            tile = VectorTile(self.scheme(), zoom_level=zoom_level, x=coord[0], y=coord[1])
-            tiles_with_data.append((tile, data))
-
-        return tiles_with_data
+            tile = VectorTile(scheme, zoom_level=zoom_level, x=coord[0], y=coord[1])
+            tile.cache_headers = cache_headers_by_tile.pop(coord, {})
+            yield tile, data
 
 
 class MBTilesSource(AbstractSource):
+    _max_queries_per_job = 64
+
     def attribution(self):
-        return self._get_metadata_value("attribution", "")
+        return self.metadata_summary()["attribution"]
 
     def __init__(self, path):
         AbstractSource.__init__(self)
@@ -210,16 +331,43 @@ class MBTilesSource(AbstractSource):
             )
 
         self.path = path
-        self.conn = None
+        self._pool: Optional[SqliteConnectionPool] = None
         self._metadata_cache = {}
+        self._shadow_index = None
+        self._presence_index = None
+        self._summary = None
 
     def source(self):
         return self.path
 
     def crs(self):
-        return self._get_metadata_value("crs", _DEFAULT_CRS)
+        return self.metadata_summary()["crs"]
+
+    def metadata_summary(self) -> dict:
+        """
+         * The summary is persisted, so that reopening a known file requires no queries
+        """
+        if self._summary is None:
+            self._summary = get_metadata_summary(self.path, self._create_metadata_summary)
+        return self._summary
+
+    def _create_metadata_summary(self) -> dict:
+        return {
+            "name": self.name(),
+            "attribution": self._get_metadata_value("attribution", ""),
+            "min_zoom": self._get_zoom(max_zoom=False),
+            "max_zoom": self._get_zoom(max_zoom=True),
+            "mask_level": self._get_metadata_value("maskLevel"),
+            "scheme": self._get_metadata_value("scheme", default="tms"),
+            "bounds": self._read_bounds(),
+            "crs": self._get_metadata_value("crs", _DEFAULT_CRS),
+            "vector_layers": self._read_vector_layers(),
+        }
 
     def vector_layers(self):
+        return self.metadata_summary()["vector_layers"]
+
+    def _read_vector_layers(self):
         data = self._get_metadata_value("json")
         layers = []
         if data:
@@ -231,6 +379,12 @@ class MBTilesSource(AbstractSource):
         return layers
 
     def bounds(self) -> Tuple:
+        bounds = self.metadata_summary()["bounds"]
+        if bounds:
+            bounds = tuple(bounds)
+        return bounds
+
+    def _read_bounds(self) -> Tuple:
         bounds = self._get_metadata_value("bounds")
         if bounds and isinstance(bounds, str):
             bounds = bounds.replace(" ", "").replace("[", "").replace("]", "").split(",")
@@ -255,20 +409,20 @@ class MBTilesSource(AbstractSource):
         return base_name
 
     def scheme(self):
-        return self._get_metadata_value("scheme", default="tms")
+        return self.metadata_summary()["scheme"]
 
     def min_zoom(self):
-        return self._get_zoom(max_zoom=False)
+        return self.metadata_summary()["min_zoom"]
 
     def max_zoom(self):
-        return self._get_zoom(max_zoom=True)
+        return self.metadata_summary()["max_zoom"]
 
     def mask_level(self):
-        return self._get_metadata_value("maskLevel")
+        return self.metadata_summary()["mask_level"]
 
-    def load_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
+    def iter_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
         """
-         * Loads the tiles listed in tiles_to_load for the specified zoom_level.
+         * Yields the tiles listed in tiles_to_load for the specified zoom_level.
         :param zoom_level:
         :param tiles_to_load:
         :param max_tiles:
@@ -283,45 +437,175 @@ class MBTilesSource(AbstractSource):
         if tiles_to_load is None:
             raise RuntimeError("tiles_to_load is required")
 
+        presence_index = self._get_presence_index()
+        if presence_index:
+            # tiles that don't exist in the file are skipped without querying them
+            tiles_to_load = presence_index.filter_existing(zoom_level, tiles_to_load)
+
         if max_tiles is not None:
             center_tiles = get_tiles_from_center(
                 nr_of_tiles=max_tiles, available_tiles=tiles_to_load, should_cancel_func=lambda: self._cancelling
             )
         else:
             center_tiles = tiles_to_load
-        where_clause = self._get_where_clause(tiles_to_load=center_tiles, zoom_level=zoom_level)
 
-        sql_command = "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles {};"
-        sql = sql_command.format(where_clause)
-
-        tile_data_tuples = []
-        rows = self._get_from_db(sql=sql)
-        count_sql = "select count(*) 'nr_of_tiles' from tiles WHERE zoom_level = {}".format(zoom_level)
-        total_nr_of_tiles = self._get_single_value(count_sql, "nr_of_tiles")
-        if max_tiles is not None and max_tiles < total_nr_of_tiles:
+        if presence_index:
+            total_nr_of_tiles = presence_index.count(zoom_level)
+        else:
+            count_sql = "select count(*) 'nr_of_tiles' from tiles WHERE zoom_level = ?"
+            total_nr_of_tiles = self._get_single_value(count_sql, "nr_of_tiles", params=(zoom_level,))
+        if max_tiles is not None and total_nr_of_tiles and max_tiles < total_nr_of_tiles:
             self.tile_limit_reached.emit()
 
-        if rows:
-            self.max_progress_changed.emit(len(rows))
-            for index, row in enumerate(rows):
-                if self._cancelling or (max_tiles and len(tile_data_tuples) >= max_tiles):
+        self.max_progress_changed.emit(len(center_tiles))
+        nr_of_tiles = 0
+        for row in self._iter_tile_rows(zoom_level=zoom_level, tiles_to_load=center_tiles):
+            if self._cancelling or (max_tiles and nr_of_tiles >= max_tiles):
+                break
+            yield self._create_tile(row)
+            nr_of_tiles += 1
+            self.progress_changed.emit(nr_of_tiles)
+
+    def _iter_tile_rows(self, zoom_level, tiles_to_load) -> Iterator[sqlite3.Row]:
+        """
+         * Yields the rows of the specified tiles. The tiles are grouped into column-wise row ranges which are
+           queried with bound parameters, so that SQLite can seek on the (zoom_level, tile_column, tile_row) index.
+         * If the tiles table has no such index, a shadow index in the temp directory of the plugin is used.
+        :param zoom_level:
+        :param tiles_to_load:
+        :return:
+        """
+        tile_ranges = get_tile_ranges(tiles_to_load)
+        if not tile_ranges:
+            return
+
+        queries = []
+        shadow_index = self._get_shadow_index()
+        if shadow_index:
+            rowids = shadow_index.get_rowids(zoom_level=zoom_level, tile_ranges=tile_ranges)
+            sql_command = "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles WHERE rowid IN ({})"
+            chunk_size = 500
+            for i in range(0, len(rowids), chunk_size):
+                chunk = rowids[i : i + chunk_size]
+                queries.append((sql_command.format(",".join("?" * len(chunk))), chunk))
+        elif self._is_deduplicated_schema():
+            # the tile_id is selected as well, so that identical tiles have to be decoded only once
+            sql = """SELECT map.zoom_level, map.tile_column, map.tile_row, map.tile_id, images.tile_data
+                FROM map JOIN images ON images.tile_id = map.tile_id
+                WHERE map.zoom_level = ? AND map.tile_column = ? AND map.tile_row BETWEEN ? AND ?"""
+            for col, row_min, row_max in tile_ranges:
+                queries.append((sql, (zoom_level, col, row_min, row_max)))
+        else:
+            sql = """SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles
+                WHERE zoom_level = ? AND tile_column = ? AND tile_row BETWEEN ? AND ?"""
+            for col, row_min, row_max in tile_ranges:
+                queries.append((sql, (zoom_level, col, row_min, row_max)))
+
+        # the queries are split across the connections of the pool and read in parallel
+        pool = self._get_pool()
+        batch_size = clamp(int(ceil(len(queries) / pool.nr_of_connections)), low=1, high=self._max_queries_per_job)
+        futures = []
+        for i in range(0, len(queries), batch_size):
+            batch = queries[i : i + batch_size]
+            futures.append(pool.submit(lambda conn, b=batch: [r for q in b for r in conn.execute(*q).fetchall()]))
+        try:
+            for future in as_completed(futures):
+                if self._cancelling:
                     break
-                tile, data = self._create_tile(row)
-                tile_data_tuples.append((tile, data))
-                self.progress_changed.emit(index + 1)
-        return tile_data_tuples
+                try:
+                    yield from future.result()
+                except:
+                    tb = ""
+                    if traceback:
+                        tb = traceback.format_exc()
+                    critical("Getting tiles from db failed: {}, {}", sys.exc_info(), tb)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _get_shadow_index(self) -> Optional[ShadowTileIndex]:
+        """
+         * Returns the shadow index for the tiles table, if the table is missing an index on
+           (zoom_level, tile_column, tile_row). Returns None if the index of the MBTiles file can be used.
+        """
+        if self._shadow_index is None:
+            if self._get_tiles_type() == "view" or self._get_pool().run(lambda conn: has_tile_index(conn, "tiles")):
+                # a view is used by the deduplicated schema, which joins the indexed tables 'map' and 'images'
+                self._shadow_index = False
+            else:
+                shadow_index = ShadowTileIndex(self.path)
+                try:
+                    if not shadow_index.is_valid():
+                        self._get_pool().run(shadow_index.build)
+                    self._shadow_index = shadow_index
+                except:
+                    warn("Shadow index not available, falling back to the tiles table: {}", sys.exc_info()[1])
+                    shadow_index.close()
+                    self._shadow_index = False
+        return self._shadow_index or None
+
+    def _get_tiles_type(self) -> Optional[str]:
+        """
+         * Returns the type of 'tiles', which is either 'table' or 'view'
+        """
+        if "tiles_type" not in self._metadata_cache:
+            sql = "SELECT type FROM sqlite_master WHERE name = 'tiles'"
+            self._metadata_cache["tiles_type"] = self._get_single_value(sql, "type")
+        return self._metadata_cache["tiles_type"]
+
+    def _is_deduplicated_schema(self) -> bool:
+        """
+         * Returns True if the file uses the deduplicated schema, where 'tiles' is a view joining the
+           tables 'map' (zoom_level, tile_column, tile_row, tile_id) and 'images' (tile_id, tile_data)
+        """
+        if "is_deduplicated" not in self._metadata_cache:
+            is_deduplicated = False
+            if self._get_tiles_type() == "view":
+                rows = self._get_from_db("PRAGMA table_info('map')") or []
+                is_deduplicated = "tile_id" in [r["name"] for r in rows]
+            self._metadata_cache["is_deduplicated"] = is_deduplicated
+        return self._metadata_cache["is_deduplicated"]
+
+    def _get_presence_index(self) -> Optional[TilePresenceIndex]:
+        """
+         * Returns the index which knows the number, the bounds and the existence of the tiles per zoom level
+         * The index is built on first use, which requires a single scan over the tiles table,
+           and reused as long as the file doesn't change
+        """
+        if self._presence_index is None:
+            presence_index = TilePresenceIndex(self.path)
+            try:
+                if not presence_index.load():
+                    self._get_pool().run(presence_index.build)
+                self._presence_index = presence_index
+            except:
+                warn("Tile presence index not available, falling back to the tiles table: {}", sys.exc_info()[1])
+                self._presence_index = False
+        return self._presence_index or None
 
     def _get_bounds_from_data(self, zoom_level):
+        presence_index = self._get_presence_index()
+        if presence_index:
+            presence = presence_index.get(zoom_level)
+            if not presence:
+                return None
+            return Bounds.create(
+                zoom=zoom_level,
+                x_min=presence.col_min,
+                x_max=presence.col_max,
+                y_min=presence.row_min,
+                y_max=presence.row_max,
+                scheme=self.scheme(),
+            )
+
         sql = """select 
                 min(tile_column) 'x_min', 
                 max(tile_column) 'x_max', 
                 min(tile_row) 'y_min', 
                 max(tile_row) 'y_max'
                 from tiles
-                WHERE zoom_level = {}""".format(
-            zoom_level
-        )
-        rows = self._get_from_db(sql)
+                WHERE zoom_level = ?"""
+        rows = self._get_from_db(sql, params=(zoom_level,))
         bounds = None
         if rows:
             row = rows[0]
@@ -335,40 +619,32 @@ class MBTilesSource(AbstractSource):
             )
         return bounds
 
-    @staticmethod
-    def _get_where_clause(tiles_to_load, zoom_level):
-        where_clause = ""
-        if zoom_level is not None or tiles_to_load is not None:
-            where_clause = "WHERE"
-            if zoom_level is not None:
-                where_clause += " zoom_level = {}".format(zoom_level)
-                if tiles_to_load is not None:
-                    where_clause += " AND"
-            if tiles_to_load is not None:
-                tile_coords = str(["{};{}".format(x[0], x[1]) for x in tiles_to_load]).replace("[", "").replace("]", "")
-                where_clause += ' tile_column || ";" || tile_row IN ({})'.format(tile_coords)
-        return where_clause
-
     def _create_tile(self, row):
         zoom_level = row["zoom_level"]
         tile_col = row["tile_column"]
         tile_row = row["tile_row"]
         binary_data = row["tile_data"]
         tile = VectorTile(self.scheme(), zoom_level, tile_col, tile_row)
+        if "tile_id" in row.keys():
+            tile.content_key = row["tile_id"]
         return tile, binary_data
 
     def close_connection(self):
         """
-         * Closes the current db connection
+         * Releases the connection pool of the db. The pool is closed as soon as no other source is using it.
         :return: 
         """
-        if self.conn:
+        if self._pool:
             try:
-                self.conn.close()
+                release_connection_pool(self._pool)
                 debug("Connection closed")
             except:
                 warn("Closing connection failed: {}".format(sys.exc_info()))
-        self.conn = None
+        self._pool = None
+        if self._shadow_index:
+            self._shadow_index.close()
+        self._shadow_index = None
+        self._presence_index = None
 
     def _get_zoom(self, max_zoom=True):
         if max_zoom:
@@ -386,6 +662,12 @@ class MBTilesSource(AbstractSource):
         return self._metadata_cache[field_name]
 
     def _get_zoom_from_tiles_table(self, max_zoom=True):
+        # the index is only used if it's already available, as building it scans the tiles table
+        # while the query below can seek on the index of the tiles table
+        if self._presence_index:
+            presence_index = self._presence_index
+            return presence_index.max_zoom() if max_zoom else presence_index.min_zoom()
+
         if max_zoom:
             order = "desc"
         else:
@@ -411,17 +693,18 @@ class MBTilesSource(AbstractSource):
             self._metadata_cache[field_name] = value
         return self._metadata_cache[field_name]
 
-    def _get_single_value(self, sql_query, field_name):
+    def _get_single_value(self, sql_query, field_name, params=()):
         """
          * Helper function that can be used to safely load a single value from the db
          * Returns the value or None if result is empty or execution of query failed
         :param sql_query: 
         :param field_name: 
+        :param params: The values for the parameters of the query
         :return: 
         """
         value = None
         try:
-            rows = self._get_from_db(sql=sql_query)
+            rows = self._get_from_db(sql=sql_query, params=params)
             if rows:
                 value = rows[0][field_name]
                 debug("Value is: {}".format(value))
@@ -429,15 +712,10 @@ class MBTilesSource(AbstractSource):
             critical("Loading metadata value '{}' failed: {}", field_name, sys.exc_info())
         return value
 
-    def _get_from_db(self, sql):
-        if not self.conn:
-            debug("Not connected yet.")
-            self._connect_to_db()
+    def _get_from_db(self, sql, params=()):
         try:
             debug("Execute SQL: {}", sql)
-            cur = self.conn.cursor()
-            cur.execute(sql)
-            return cur.fetchall()
+            return self._get_pool().fetch_all(sql, params)
         except sqlite3.OperationalError:
             critical("Getting data from db failed: {}", sql)
         except:
@@ -446,38 +724,361 @@ class MBTilesSource(AbstractSource):
                 tb = traceback.format_exc()
             critical("Getting data from db failed: {}, {}", sys.exc_info(), tb)
 
-    def _connect_to_db(self):
+    def _get_pool(self) -> SqliteConnectionPool:
         """
-         * Since an mbtile file is a sqlite database, we can connect to it
+         * Since an mbtile file is a sqlite database, we can connect to it.
+         * The read-only connections are owned by the worker threads of a pool, which is shared with all other
+           sources of the same file. Therefore, the source can be used from any thread.
         """
-        debug("Connecting to: {}", self.path)
+        if not self._pool:
+            debug("Connecting to: {}", self.path)
+            self._pool = acquire_connection_pool(self.path)
+        return self._pool
+
+
+class PMTilesSource(AbstractSource):
+    """
+     * Reads the tiles of a local PMTiles v3 archive
+     * The tiles are read in the order of their data in the archive (which follows the Hilbert curve in
+       clustered archives). Adjacent tile data is read with a single read and tiles sharing the same data
+       (i.e. run-length encoded ocean tiles) are read only once.
+    """
+
+    max_read_gap = 64 * 1024
+    max_read_size = 4 * 1024 * 1024
+
+    def __init__(self, path):
+        AbstractSource.__init__(self)
+        if not os.path.isfile(path):
+            raise RuntimeError("The file does not exist: {}".format(path))
+        self.path = path
+        self._reader: Optional[PMTilesReader] = None
+        header = self._get_reader().header
+        if header.tile_type != TileType.MVT:
+            self.close_connection()
+            raise RuntimeError("The file '{}' doesn't contain Mapbox vector tiles and cannot be loaded.".format(path))
+
+    def _get_reader(self) -> PMTilesReader:
+        if not self._reader:
+            debug("Opening PMTiles archive: {}", self.path)
+            self._reader = PMTilesReader(self.path)
+        return self._reader
+
+    def _metadata(self) -> dict:
         try:
-            self.conn = sqlite3.connect(self.path)
-            self.conn.row_factory = sqlite3.Row
-            debug("Successfully connected")
+            return self._get_reader().metadata()
         except:
-            critical("Db connection failed:", sys.exc_info())
+            warn("Reading the metadata of the PMTiles archive failed: {}", sys.exc_info()[1])
+            return {}
+
+    def source(self):
+        return self.path
+
+    def name(self):
+        name = self._metadata().get("name")
+        if not name:
+            name = os.path.splitext(os.path.basename(self.path))[0]
+        return name
+
+    def attribution(self):
+        return self._metadata().get("attribution", "")
+
+    def vector_layers(self):
+        metadata = self._metadata()
+        layers = metadata.get("vector_layers")
+        if not layers and "json" in metadata:
+            layers = json.loads(metadata["json"]).get("vector_layers")
+        if not layers:
+            warn("No vector_layers found in metadata of PMTiles archive")
+            layers = []
+        return layers
+
+    def min_zoom(self):
+        return self._get_reader().header.min_zoom
+
+    def max_zoom(self):
+        return self._get_reader().header.max_zoom
+
+    def scheme(self):
+        return "xyz"
+
+    def crs(self):
+        return _DEFAULT_CRS
+
+    def bounds(self):
+        header = self._get_reader().header
+        return header.min_lon, header.min_lat, header.max_lon, header.max_lat
+
+    def bounds_tile(self, zoom):
+        return get_tile_bounds(zoom=zoom, extent=self.bounds(), scheme=self.scheme(), source_crs="4326")
+
+    def close_connection(self):
+        if self._reader:
+            self._reader.close()
+        self._reader = None
+
+    def iter_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
+        self._cancelling = False
+        reader = self._get_reader()
+        tile_ranges = reader.find_tiles(zoom_level, tiles_to_load)
+        tiles_to_load = set(tile_ranges)
+        if max_tiles and len(tiles_to_load) > max_tiles:
+            tiles_to_load = get_tiles_from_center(max_tiles, tiles_to_load, should_cancel_func=lambda: self._cancelling)
+            self.tile_limit_reached.emit()
+
+        tiles_by_range = {}
+        for t in tiles_to_load:
+            tiles_by_range.setdefault(tile_ranges[t], []).append(t)
+
+        reads = coalesce_ranges(list(tiles_by_range), max_gap=self.max_read_gap, max_size=self.max_read_size)
+        debug("Reading {} tiles with {} reads", len(tiles_to_load), len(reads))
+        self.max_progress_changed.emit(len(tiles_to_load))
+        tile_compression = reader.header.tile_compression
+        nr_of_tiles = 0
+        for read_offset, read_length, ranges in reads:
+            if self._cancelling:
+                break
+            data = memoryview(reader.read(read_offset, read_length))
+            for offset, length in ranges:
+                tile_data = bytes(data[offset - read_offset : offset - read_offset + length])
+                if tile_compression not in (Compression.NONE, Compression.GZIP):
+                    tile_data = decompress(tile_data, tile_compression)
+                for col, row in tiles_by_range[(offset, length)]:
+                    tile = VectorTile(self.scheme(), zoom_level, col, row)
+                    # tiles with the same data offset have the same content
+                    tile.content_key = offset
+                    yield tile, tile_data
+                    nr_of_tiles += 1
+                    self.progress_changed.emit(nr_of_tiles)
+
+
+class PostGISSource(AbstractSource):
+    """
+     * Creates the vector tiles from the tables of a PostGIS database using ST_AsMVT (requires PostGIS 3)
+     * Each table with a geometry column is provided as layer. Many tiles are created with a single query
+       and the queries are run in parallel using a pool of connections.
+    """
+
+    _tiles_per_query = 64
+    _max_connections = 4
+    _default_max_zoom = 14
+
+    def __init__(self, connection: dict):
+        AbstractSource.__init__(self)
+        if not postgis_supported():
+            raise RuntimeError("The python module 'psycopg2' is required for PostGIS connections.")
+        self._connection = connection
+        self._pool = None
+        self._layers = None
+        self._bounds = None
+        self._tiles_query = None
+        self._get_layers()
+
+    def _get_pool(self):
+        if not self._pool:
+            try:
+                # one additional connection for the metadata queries, which may run while tiles are being loaded
+                self._pool = create_connection_pool(self._connection, max_connections=self._max_connections + 1)
+            except Exception as e:
+                critical("Connecting to PostGIS failed: {}", e)
+                raise RuntimeError("Connecting to PostGIS failed: {}".format(e))
+        return self._pool
+
+    def _run(self, func):
+        """
+         * Runs func with a connection of the pool
+        """
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            return func(conn)
+        finally:
+            conn.rollback()
+            pool.putconn(conn)
+
+    def _get_layers(self) -> List[dict]:
+        if self._layers is None:
+            self._layers = self._run(get_layers)
+            if not self._layers:
+                warn("No tables with geometries found in PostGIS database '{}'", self._connection["database"])
+        return self._layers
+
+    def source(self):
+        return "postgresql://{}:{}/{}".format(
+            self._connection["host"], self._connection["port"], self._connection["database"]
+        )
+
+    def name(self):
+        return self._connection["name"] or self._connection["database"]
+
+    def attribution(self):
+        return ""
+
+    def vector_layers(self):
+        return [
+            {
+                "id": layer["id"],
+                "fields": layer["fields"],
+                "minzoom": layer["minzoom"] if layer["minzoom"] is not None else self.min_zoom(),
+                "maxzoom": layer["maxzoom"] if layer["maxzoom"] is not None else self.max_zoom(),
+            }
+            for layer in self._get_layers()
+        ]
+
+    def _get_zoom(self, key: str, layer_key: str, aggregate, default: int) -> int:
+        """
+         * Returns the zoom of the connection settings or the zoom of the layers, if all layers have one
+        """
+        zoom = self._connection.get(key)
+        if zoom is not None:
+            return int(zoom)
+        layer_zooms = [layer[layer_key] for layer in self._get_layers()]
+        if layer_zooms and None not in layer_zooms:
+            return aggregate(layer_zooms)
+        return default
+
+    def min_zoom(self):
+        return self._get_zoom("min_zoom", "minzoom", min, 0)
+
+    def max_zoom(self):
+        return self._get_zoom("max_zoom", "maxzoom", max, self._default_max_zoom)
+
+    def scheme(self):
+        return "xyz"
+
+    def crs(self):
+        return _DEFAULT_CRS
+
+    def bounds(self):
+        if self._bounds is None:
+            self._bounds = self._run(lambda conn: get_bounds(conn, self._get_layers())) or WORLD_BOUNDS
+        return self._bounds
+
+    def bounds_tile(self, zoom):
+        return get_tile_bounds(zoom=zoom, extent=self.bounds(), scheme=self.scheme(), source_crs="4326")
+
+    def close_connection(self):
+        if self._pool:
+            try:
+                self._pool.closeall()
+                debug("PostGIS connections closed")
+            except:
+                warn("Closing PostGIS connections failed: {}", sys.exc_info()[1])
+        self._pool = None
+
+    def iter_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
+        self._cancelling = False
+        if max_tiles and len(tiles_to_load) > max_tiles:
+            tiles_to_load = get_tiles_from_center(max_tiles, tiles_to_load, should_cancel_func=lambda: self._cancelling)
+            self.tile_limit_reached.emit()
+
+        if self._tiles_query is None:
+            self._tiles_query = build_tiles_query(self._get_layers())
+        query = self._tiles_query
+
+        def create_tiles(batch):
+            params = {"zoom": int(zoom_level), "xs": [int(t[0]) for t in batch], "ys": [int(t[1]) for t in batch]}
+
+            def execute(conn):
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    return cur.fetchall()
+
+            return self._run(execute)
+
+        tiles = sort_tiles_from_center(list(tiles_to_load))
+        batches = [tiles[i : i + self._tiles_per_query] for i in range(0, len(tiles), self._tiles_per_query)]
+        self.max_progress_changed.emit(len(tiles))
+        self.message_changed.emit("Creating {} tiles in PostGIS...".format(len(tiles)))
+        nr_of_tiles = 0
+        executor = ThreadPoolExecutor(max_workers=self._max_connections, thread_name_prefix="postgis")
+        futures = [executor.submit(create_tiles, b) for b in batches]
+        scheme = self.scheme()
+        try:
+            for future in as_completed(futures):
+                if self._cancelling:
+                    break
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    critical("Creating tiles in PostGIS failed: {}", e)
+                    continue
+                for col, row, data in rows:
+                    nr_of_tiles += 1
+                    self.progress_changed.emit(nr_of_tiles)
+                    if data:
+                        yield VectorTile(scheme, zoom_level, col, row), bytes(data)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
 
 
 class DirectorySource(AbstractSource):
-    def __init__(self, path):
+    def __init__(self, path, max_concurrent_reads: int = None, mmap_min_size_kb: int = None):
+        """
+        :param path: The directory containing the metadata.json and the tiles
+        :param max_concurrent_reads: The number of tile files read in parallel
+        :param mmap_min_size_kb: Tile files of at least this size are read using mmap. None (the default) disables mmap.
+        """
         AbstractSource.__init__(self)
         if not os.path.isdir(path):
             raise RuntimeError("The folder does not exist: {}".format(path))
         self.path = path
-        metadata_path = os.path.join(path, "metadata.json")
-        if not os.path.isfile(metadata_path):
+        self.max_concurrent_reads = max_concurrent_reads
+        if self.max_concurrent_reads is None:
+            self.max_concurrent_reads = default_max_concurrent_reads
+        self.mmap_min_size_kb = mmap_min_size_kb
+        if self.mmap_min_size_kb is None:
+            self.mmap_min_size_kb = default_mmap_min_size_kb
+        self._metadata_path = os.path.join(path, "metadata.json")
+        if not os.path.isfile(self._metadata_path):
             raise RuntimeError("There is no metadata.json in the directory.")
-        self.json = TileJSON(metadata_path)
-        self.json.load()
+        self._json = None
+        self._summary = None
+        self._tile_index = None
+
+    @property
+    def json(self) -> TileJSON:
+        """
+         * The metadata.json is only loaded if the metadata summary is outdated or the tiles are loaded
+        """
+        if self._json is None:
+            self._json = TileJSON(self._metadata_path)
+            self._json.load()
+        return self._json
 
     def source(self):
         return self.path
 
+    def metadata_summary(self) -> dict:
+        """
+         * The summary is persisted, so that reopening a known directory requires no parsing of the metadata.json
+        """
+        if self._summary is None:
+            self._summary = get_metadata_summary(self._metadata_path, self._create_metadata_summary)
+        return self._summary
+
+    def _create_metadata_summary(self) -> dict:
+        return {
+            "name": self._read_name(),
+            "attribution": self.json.attribution(),
+            "min_zoom": self.json.min_zoom(),
+            "max_zoom": self.json.max_zoom(),
+            "mask_level": self.json.get_value("maskLevel"),
+            "scheme": self.json.scheme(),
+            "bounds": self.json.bounds_longlat(),
+            "crs": self.json.crs(),
+            "vector_layers": self._read_vector_layers(),
+        }
+
     def attribution(self):
-        return self.json.attribution()
+        return self.metadata_summary()["attribution"]
 
     def vector_layers(self):
+        return self.metadata_summary()["vector_layers"]
+
+    def _read_vector_layers(self):
         layers = self.json.get_value("vector_layers", is_array=True, is_required=False)
         if not layers:
             layers = json.loads(self.json.get_value("json"))["vector_layers"]
@@ -486,6 +1087,9 @@ class DirectorySource(AbstractSource):
         return layers
 
     def name(self):
+        return self.metadata_summary()["name"]
+
+    def _read_name(self):
         name = self.json.name()
         if not name:
             name = self.json.id()
@@ -494,51 +1098,86 @@ class DirectorySource(AbstractSource):
         return name
 
     def min_zoom(self):
-        return self.json.min_zoom()
+        return self.metadata_summary()["min_zoom"]
 
     def max_zoom(self):
-        return self.json.max_zoom()
+        return self.metadata_summary()["max_zoom"]
 
     def mask_level(self):
-        return self.json.mask_level()
+        return self.metadata_summary()["mask_level"]
 
     def scheme(self):
-        return self.json.scheme()
+        return self.metadata_summary()["scheme"]
 
     def bounds(self):
-        return self.json.bounds_longlat()
+        return self.metadata_summary()["bounds"]
 
     def bounds_tile(self, zoom):
-        return self.json.bounds_tile(zoom)
+        return get_tile_bounds(zoom=zoom, extent=self.bounds(), scheme=self.scheme(), source_crs="EPSG:4326")
 
     def crs(self):
-        return self.json.crs()
-
-    def load_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
-        self._cancelling = False
-        tile_data_tuples = []
-
-        if len(tiles_to_load) > max_tiles:
-            tiles_to_load = get_tiles_from_center(max_tiles, tiles_to_load, should_cancel_func=lambda: self._cancelling)
-            self.tile_limit_reached.emit()
+        return self.metadata_summary()["crs"]
 
+    def _get_tile_path_template(self) -> str:
         tile_path = self.json.get_value(key="tiles", is_array=True)
         if tile_path:
             tile_path = tile_path[0]
         else:
             tile_path = os.path.join(self.path, "{z}/{x}/{y}.pbf")
+        return tile_path
 
-        self.max_progress_changed.emit(tiles_to_load)
-        for index, t in enumerate(tiles_to_load):
-            self.progress_changed.emit(index)
-            full_path = tile_path.format(z=int(zoom_level), x=t[0], y=t[1])
-            col = t[0]
-            row = t[1]
-            tile = VectorTile(self.scheme(), zoom_level, col, row)
-            if os.path.isfile(full_path):
-                with open(full_path, "rb") as f:
-                    encoded_data = f.read()
-                    tile_data_tuples.append((tile, encoded_data))
+    def _get_tile_index(self) -> Optional[DirectoryTileIndex]:
+        """
+         * Returns the index of the tile files or None, if the tiles don't use the layout {z}/{x}/{y}.<extension>
+        """
+        if self._tile_index is None:
+            self._tile_index = DirectoryTileIndex.from_template(self._get_tile_path_template()) or False
+            if not self._tile_index:
+                info("The tiles of '{}' are not indexed, as they don't use the layout {{z}}/{{x}}/{{y}}", self.path)
+        return self._tile_index or None
+
+    def iter_tiles(self, zoom_level, tiles_to_load, max_tiles=None):
+        self._cancelling = False
+
+        tile_path = self._get_tile_path_template()
+        tile_index = self._get_tile_index()
+        if tile_index:
+            tile_files = tile_index.get_tile_files(zoom_level, tiles_to_load)
+            nr_of_missing_tiles = len(tiles_to_load) - len(tile_files)
+            if nr_of_missing_tiles:
+                debug("{} of {} tiles don't exist and are skipped", nr_of_missing_tiles, len(tiles_to_load))
+            tiles_to_load = set(tile_files)
+        else:
+            tile_files = None
+
+        if max_tiles and len(tiles_to_load) > max_tiles:
+            tiles_to_load = get_tiles_from_center(max_tiles, tiles_to_load, should_cancel_func=lambda: self._cancelling)
+            self.tile_limit_reached.emit()
+
+        mmap_min_size = None
+        if self.mmap_min_size_kb is not None:
+            mmap_min_size = self.mmap_min_size_kb * 1024
+
+        def read_tile(t):
+            if tile_files is not None:
+                full_path = tile_files[t]
             else:
-                info("File not found: {}", full_path)
-        return tile_data_tuples
+                full_path = tile_path.format(z=int(zoom_level), x=t[0], y=t[1])
+            return read_tile_file(full_path, mmap_min_size=mmap_min_size)
+
+        self.max_progress_changed.emit(len(tiles_to_load))
+        scheme = self.scheme()
+        tile_contents = read_files_parallel(
+            items=sort_tiles_from_center(list(tiles_to_load)),
+            read_func=read_tile,
+            max_concurrent_reads=self.max_concurrent_reads,
+            should_cancel_func=lambda: self._cancelling,
+        )
+        for index, (t, encoded_data) in enumerate(tile_contents):
+            if self._cancelling:
+                break
+            self.progress_changed.emit(index + 1)
+            if encoded_data is not None:
+                yield VectorTile(scheme, zoom_level, t[0], t[1]), encoded_data
+            elif tile_files is None:
+                debug("File not found: {}", tile_path.format(z=int(zoom_level), x=t[0], y=t[1]))
@@ -11,30 +11,50 @@ import traceback
 import uuid
 from gzip import GzipFile
 from io import BytesIO
-from itertools import groupby
-from typing import Dict, List, Optional, Tuple
+from itertools import groupby, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from PyQt5.QtCore import QObject, QThread, pyqtSignal
 from PyQt5.QtWidgets import QApplication
 from qgis.core import QgsProject, QgsVectorLayer
 
 from .util.connection import ConnectionTypes
-from .util.feature_helper import FeatureMerger, GeoTypes, clip_features, geo_types, is_multi, map_coordinates_recursive
+from .util.decode_memo import DecodeMemo, get_content_key
+from .util.decoder_pool import DecoderPool
+from .util.binary_tile_reader import to_geojson_feature
+from .util.feature_helper import (
+    FeatureMerger,
+    GeoTypes,
+    clip_features,
+    geo_types,
+    is_multi,
+    map_coordinates_recursive,
+    write_wkb_features,
+)
 from .util.file_helper import (
     assure_temp_dirs_exist,
     cache_tile,
     get_cache_entry,
+    get_cache_validators,
     get_geojson_file_name,
     get_style_folder,
     get_styles,
     get_valid_filename,
     is_gzipped,
+    refresh_cache_entry,
 )
 from .util.log_helper import critical, debug, info, remove_key
 from .util.mp_helper import decode_tile_native, decode_tile_python, native_decoding_supported, unload_lib
 from .util.qgis_helper import get_loaded_layers_of_connection
-from .util.tile_helper import Bounds, VectorTile, clamp, get_all_tiles, get_code_from_epsg
-from .util.tile_source import AbstractSource, DirectorySource, MBTilesSource, ServerSource
+from .util.tile_helper import Bounds, VectorTile, clamp, get_all_tiles, get_code_from_epsg, get_tile_location
+from .util.tile_source import (
+    AbstractSource,
+    DirectorySource,
+    MBTilesSource,
+    PMTilesSource,
+    PostGISSource,
+    ServerSource,
+)
 
 is_windows = sys.platform.startswith("win32")
 if is_windows:
@@ -65,9 +85,14 @@ class VtReader(QObject):
         "apply_styles": None,
         "max_tiles": None,
         "bounds": None,
+        "progressive_update_interval_ms": None,
     }
 
     _nr_tiles_to_process_serial = 30
+    _tile_window_size = 256
+    _decode_memo_size = 512
+    # the interval between two progressive updates is at least this multiple of the duration of the last update
+    _progressive_update_backoff_factor = 4
     _layers_to_dissolve = []
     _zoom_level_delimiter = "*"
     _DEFAULT_EXTENT = 4096
@@ -75,11 +100,13 @@ class VtReader(QObject):
 
     _all_tiles = []
 
-    def __init__(self, iface, connection: dict):
+    def __init__(self, iface, connection: dict, decoder_pool: DecoderPool = None):
         """
         The mbtiles_path can also be an URL in zxy format: z=zoom, x=tile column, y=tile row
         :param iface: 
         :param connection:
+        :param decoder_pool: The pool which decodes the tiles in parallel. If it's not set, the reader creates
+            its own pool, which is shut down with the reader.
         """
         QObject.__init__(self)
         if not connection:
@@ -97,8 +124,13 @@ class VtReader(QObject):
         self._clip_tiles_at_tile_bounds: False = None
         self._flush = False
         self._feature_count: int = 0
+        self._last_layer_update = 0.0
+        self._last_layer_update_duration = 0.0
         self._allowed_sources: List[str] = None
         self._ready_for_next_loading_step.connect(self._continue_loading)
+        self._decode_memo = DecodeMemo(max_entries=self._decode_memo_size)
+        self._owns_decoder_pool = decoder_pool is None
+        self._decoder_pool: DecoderPool = decoder_pool if decoder_pool else DecoderPool()
         self.native_decoding_supported = native_decoding_supported()
         bits = "32"
         if sys.maxsize > 2 ** 32:
@@ -134,17 +166,30 @@ class VtReader(QObject):
     def _create_source(self, connection: dict) -> AbstractSource:
         conn_type = connection["type"]
         if conn_type == ConnectionTypes.TileJSON:
-            source = ServerSource(url=connection["url"])
+            source = ServerSource(
+                url=connection["url"],
+                max_requests_per_host=connection.get("max_requests_per_host"),
+                subdomains=connection.get("subdomains"),
+            )
         elif conn_type == ConnectionTypes.MBTiles:
             source = MBTilesSource(path=connection["path"])
+        elif conn_type == ConnectionTypes.PMTiles:
+            source = PMTilesSource(path=connection["path"])
+        elif conn_type == ConnectionTypes.PostGIS:
+            source = PostGISSource(connection=connection)
         elif conn_type == ConnectionTypes.Directory:
-            source = DirectorySource(path=connection["path"])
+            source = DirectorySource(
+                path=connection["path"],
+                max_concurrent_reads=connection.get("max_concurrent_reads"),
+                mmap_min_size_kb=connection.get("mmap_min_size_kb"),
+            )
         else:
             raise RuntimeError("Type not set on connection")
         source.progress_changed.connect(self._source_progress_changed)
         source.max_progress_changed.connect(self._source_max_progress_changed)
         source.message_changed.connect(self._source_message_changed)
         source.tile_limit_reached.connect(self._source_tile_limit_reached)
+        source.late_tile_received.connect(self._source_late_tile_received)
         return source
 
     def shutdown(self):
@@ -152,8 +197,11 @@ class VtReader(QObject):
         self._source.progress_changed.disconnect()
         self._source.max_progress_changed.disconnect()
         self._source.message_changed.disconnect()
+        self._source.late_tile_received.disconnect()
         self._ready_for_next_loading_step.disconnect()
         self._source.close_connection()
+        if self._owns_decoder_pool:
+            self._decoder_pool.shutdown()
         unload_lib()
         info("Reader shutdown")
 
@@ -164,6 +212,24 @@ class VtReader(QObject):
         if self._loading_options["max_tiles"]:
             self.tile_limit_reached.emit(self._loading_options["max_tiles"])
 
+    def _source_late_tile_received(self, tile: VectorTile, data: bytes):
+        """
+         * Decodes and caches a tile, whose data has arrived after its loading process has been cancelled,
+           so that the next loading process gets it from the cache
+        """
+        clip_tiles = not self._loading_options.get("inspection_mode")
+        decoder_func = decode_tile_native if self.native_decoding_supported else decode_tile_python
+        tile, decoded_data = decoder_func((tile, self._unzip(data), clip_tiles))
+        if decoded_data:
+            cache_tile(
+                cache_name=self._source.name(),
+                zoom_level=tile.zoom_level,
+                x=tile.column,
+                y=tile.row,
+                decoded_data=decoded_data,
+                cache_headers=tile.cache_headers,
+            )
+
     def _source_progress_changed(self, progress: int):
         self._update_progress(progress=progress)
 
@@ -210,6 +276,14 @@ class VtReader(QObject):
             "features": [],
         }
 
+    def set_viewport(self, bounds: Bounds) -> bool:
+        """
+        Restricts the running loading process to the tiles within the specified bounds of the same zoom level,
+         i.e. after the map has been panned.
+        :return: False if the source doesn't support this, in which case the loading has to be cancelled
+        """
+        return self._source.set_viewport(bounds)
+
     def cancel(self):
         """
         Cancels the loading process.
@@ -226,13 +300,14 @@ class VtReader(QObject):
         return zoom_level
 
     def _load_tiles(self):
-        if not self._source or self.connection()["type"] == ConnectionTypes.MBTiles:
-            # recreate source to assure the source belongs to the new thread, SQLite3 isn't happy about it otherwise
+        if not self._source:
             self._source = self._create_source(self.connection())
 
         try:
             self._feature_count = 0
             self._all_tiles = []
+            self._last_layer_update = time.monotonic()
+            self._last_layer_update_duration = 0.0
 
             bounds: Bounds = self._loading_options["bounds"]
             clip_tiles = self._loading_options["clip_tiles"]
@@ -250,6 +325,7 @@ class VtReader(QObject):
             tiles_to_load = set()
             cached_tiles = []
             tiles_to_ignore = set()
+            validators_by_tile = {}
             source_name = self._source.name()
             scheme = self._source.scheme()
             for t in all_tiles:
@@ -264,6 +340,9 @@ class VtReader(QObject):
                     tiles_to_ignore.add((tile.column, tile.row))
                 else:
                     tiles_to_load.add(t)
+                    validators = get_cache_validators(cache_name=source_name, zoom_level=zoom_level, x=t[0], y=t[1])
+                    if validators:
+                        validators_by_tile[t] = validators
 
             remaining_nr_of_tiles = len(tiles_to_load)
             if max_tiles:
@@ -274,16 +353,27 @@ class VtReader(QObject):
                 if not self.cancel_requested:
                     self._process_tiles(cached_tiles, layer_filter)
                     self._all_tiles.extend(cached_tiles)
+                    self._update_layers_progressively(force=True)
 
             debug("Loading data for zoom level '{}' source '{}'", zoom_level, self._source.name())
 
             if remaining_nr_of_tiles:
-                tile_data_tuples = self._source.load_tiles(
+                self._source.set_cache_validators(validators_by_tile)
+                tile_data_tuples = self._source.iter_tiles(
                     zoom_level=zoom_level, tiles_to_load=tiles_to_load, max_tiles=remaining_nr_of_tiles
                 )
-                if len(tile_data_tuples) > 0 and not self.cancel_requested:
-                    tiles = self._decode_tiles(tile_data_tuples)
-                    self._process_tiles(tiles, layer_filter)
+                progressive_update_interval = self._loading_options["progressive_update_interval_ms"]
+                windows = self._get_windows(
+                    tile_data_tuples, self._tile_window_size, max_window_duration_ms=progressive_update_interval
+                )
+                for window in windows:
+                    if self.cancel_requested:
+                        break
+                    # the source yields tiles without data, if they are unchanged since they have been cached
+                    unchanged_tiles = [t for t, data in window if data is None]
+                    tiles = self._decode_tiles([(t, data) for t, data in window if data is not None])
+                    revalidated_tiles = self._get_revalidated_tiles(source_name, unchanged_tiles)
+                    self._process_tiles(tiles + revalidated_tiles, layer_filter)
                     for t in tiles:
                         cache_tile(
                             cache_name=source_name,
@@ -291,8 +381,10 @@ class VtReader(QObject):
                             x=t.column,
                             y=t.row,
                             decoded_data=t.decoded_data,
+                            cache_headers=t.cache_headers,
                         )
-                    self._all_tiles.extend(tiles)
+                    self._all_tiles.extend(tiles + revalidated_tiles)
+                    self._update_layers_progressively()
             self._ready_for_next_loading_step.emit()
 
         except Exception as e:
@@ -302,6 +394,77 @@ class VtReader(QObject):
             critical("An exception occured: {}, {}", e, tb)
             self.cancelled.emit()
 
+    @staticmethod
+    def _get_revalidated_tiles(source_name: str, tiles: List[VectorTile]) -> List[VectorTile]:
+        """
+         * Returns the specified tiles, which the source confirmed to be unchanged, with the data from the cache
+        """
+        revalidated_tiles = []
+        for tile in tiles:
+            tile.decoded_data = refresh_cache_entry(
+                cache_name=source_name,
+                zoom_level=tile.zoom_level,
+                x=tile.column,
+                y=tile.row,
+                cache_headers=tile.cache_headers,
+            )
+            if tile.decoded_data:
+                revalidated_tiles.append(tile)
+        if revalidated_tiles:
+            debug("{} tiles revalidated", len(revalidated_tiles))
+        return revalidated_tiles
+
+    @staticmethod
+    def _get_windows(iterable: Iterable, window_size: int, max_window_duration_ms: int = None) -> Iterator[List]:
+        """
+         * Splits the specified iterable into lists of at most window_size elements without consuming it at once
+         * If max_window_duration_ms is set, a window is also completed by the first element arriving after
+           this duration, so that slowly arriving elements (i.e. tiles from a server) are processed in small batches
+        """
+        iterator = iter(iterable)
+        if not max_window_duration_ms:
+            window = list(islice(iterator, window_size))
+            while window:
+                yield window
+                window = list(islice(iterator, window_size))
+            return
+
+        window = []
+        window_start = time.monotonic()
+        for element in iterator:
+            window.append(element)
+            window_duration_ms = (time.monotonic() - window_start) * 1000
+            if len(window) >= window_size or window_duration_ms >= max_window_duration_ms:
+                yield window
+                window = []
+                window_start = time.monotonic()
+        if window:
+            yield window
+
+    def _update_layers_progressively(self, force: bool = False) -> None:
+        """
+         * Updates the layers with the features of the tiles loaded so far, if progressive updates are enabled
+           and the last update is at least progressive_update_interval_ms ago
+         * Each update rewrites the features loaded so far, so it gets slower the more features are loaded.
+           Due to this, the interval is extended to a multiple of the duration of the last update, which keeps
+           the share of the loading time spent on updates bounded.
+        """
+        interval = self._loading_options["progressive_update_interval_ms"]
+        if not interval or self.cancel_requested:
+            return
+        min_interval = max(interval, self._last_layer_update_duration * 1000 * self._progressive_update_backoff_factor)
+        if not force and (time.monotonic() - self._last_layer_update) * 1000 < min_interval:
+            return
+        update_start = time.monotonic()
+        self._create_qgis_layers(
+            merge_features=False,
+            apply_styles=self._loading_options["apply_styles"],
+            clip_tiles=False,
+            is_partial_update=True,
+        )
+        self._last_layer_update = time.monotonic()
+        self._last_layer_update_duration = self._last_layer_update - update_start
+
     def _continue_loading(self):
         """
         Creates / updates the layers
@@ -352,6 +515,7 @@ class VtReader(QObject):
         max_tiles=None,
         layer_filter=None,
         is_inspection_mode=False,
+        progressive_update_interval_ms=None,
     ):
         """
         Specify the reader options
@@ -363,6 +527,9 @@ class VtReader(QObject):
         :param max_tiles: The maximum number of tiles to load
         :param layer_filter: A list of layers. If any layers are set, only these will be loaded. If the list is empty,
             all available layers will be loaded
+        :param progressive_update_interval_ms: If set, the layers are updated with the tiles loaded so far at most
+            every progressive_update_interval_ms while the tiles are being loaded. The interval is extended if the
+            updates take long. Merging and clipping of the features is only done after all tiles have been loaded.
         :return:
         """
         if layer_filter:
@@ -375,6 +542,7 @@ class VtReader(QObject):
             "max_tiles": max_tiles,
             "layer_filter": layer_filter,
             "inspection_mode": is_inspection_mode,
+            "progressive_update_interval_ms": progressive_update_interval_ms,
         }
 
     def load_tiles_async(self, bounds: Bounds):
@@ -387,22 +555,13 @@ class VtReader(QObject):
         info("Loading zoom level '{}', bounds: {}", zoom_level, bounds)
         self._loading_options["zoom_level"] = zoom_level
         self._loading_options["bounds"] = bounds
+        self._source.set_viewport(None)
         # todo: better use QGIS 3 tasks for this
         _worker_thread = QThread(self.iface.mainWindow())
         self.moveToThread(_worker_thread)
         _worker_thread.started.connect(self._load_tiles)
         _worker_thread.start()
 
-    @staticmethod
-    def _get_pool() -> multiprocessing.Pool:
-        nr_processors = 4
-        try:
-            nr_processors = multiprocessing.cpu_count()
-        except NotImplementedError:
-            info("CPU count cannot be retrieved. Falling back to default = 4")
-        pool = multiprocessing.Pool(nr_processors)
-        return pool
-
     def _decode_tiles(self, tiles_with_encoded_data):
         """
         Decodes the PBF data from all the specified tiles and reports the progress
@@ -418,44 +577,68 @@ class VtReader(QObject):
             decoder_func = decode_tile_python
 
         tiles = []
-
-        tiles_with_encoded_data: List[Tuple] = [(t[0], self._unzip(t[1]), clip_tiles) for t in tiles_with_encoded_data]
         tile_data_tuples: List[Tuple] = []
 
+        # tiles with identical content are decoded only once, the others get the memoized data
+        tiles_by_content_key: Dict = {}
+        content_keys_by_tile_id: Dict[str, object] = {}
+        tiles_to_decode: List[Tuple] = []
+        for tile, data in tiles_with_encoded_data:
+            content_key = (get_content_key(tile, data), clip_tiles, decoder_func.__name__)
+            memoized_data = self._decode_memo.get(content_key, tile)
+            if memoized_data:
+                tile_data_tuples.append((tile, memoized_data))
+            elif content_key in tiles_by_content_key:
+                tiles_by_content_key[content_key].append(tile)
+            else:
+                tiles_by_content_key[content_key] = [tile]
+                content_keys_by_tile_id[tile.id()] = content_key
+                tiles_to_decode.append((tile, self._unzip(data), clip_tiles))
+        if len(tiles_to_decode) < len(tiles_with_encoded_data):
+            debug("{} of {} tiles have to be decoded", len(tiles_to_decode), len(tiles_with_encoded_data))
+        tiles_with_encoded_data = tiles_to_decode
+        decoded_tile_data_tuples: List[Tuple] = []
+
         if len(tiles_with_encoded_data) <= self._nr_tiles_to_process_serial:
             for t in tiles_with_encoded_data:
                 tile, decoded_data = decoder_func(t)
                 if decoded_data:
-                    tile_data_tuples.append((tile, decoded_data))
+                    decoded_tile_data_tuples.append((tile, decoded_data))
         else:
-
-            def raise_error(e):
-                raise e
-
             info("Processing tiles in parallel...")
-            pool = self._get_pool()
-            rs = pool.map_async(
-                func=decoder_func,
-                iterable=tiles_with_encoded_data,
-                callback=tile_data_tuples.extend,
-                error_callback=raise_error,
-            )
-            pool.close()
-            current_progress = 0
             nr_of_tiles = len(tiles_with_encoded_data)
             self._update_progress(max_progress=nr_of_tiles, msg="Decoding {} tiles...".format(nr_of_tiles))
-            while not rs.ready() and not self.cancel_requested:
-                time.sleep(0.02)
-                QApplication.processEvents()
-                remaining = rs._number_left
-                index = nr_of_tiles - remaining
-                progress = int(100.0 / nr_of_tiles * (index + 1)) if remaining else 100
+            results = self._decoder_pool.imap_unordered(decoder_func, tiles_with_encoded_data)
+            current_progress = 0
+            nr_decoded = 0
+            while nr_decoded < nr_of_tiles and not self.cancel_requested:
+                try:
+                    tile, decoded_data = results.next(timeout=0.02)
+                except multiprocessing.TimeoutError:
+                    QApplication.processEvents()
+                    continue
+                nr_decoded += 1
+                if decoded_data:
+                    decoded_tile_data_tuples.append((tile, decoded_data))
+                progress = int(100.0 / nr_of_tiles * nr_decoded)
                 if progress != current_progress:
                     current_progress = progress
                     self._update_progress(progress=progress)
             if self.cancel_requested:
-                pool.terminate()
-            pool.join()
+                # the remaining tiles of the cancelled load must not delay the next one
+                self._decoder_pool.terminate()
+
+        is_native = decoder_func is decode_tile_native
+        for tile, decoded_data in decoded_tile_data_tuples:
+            tile_data_tuples.append((tile, decoded_data))
+            content_key = content_keys_by_tile_id.get(tile.id())
+            if not decoded_data or content_key is None:
+                continue
+            # the native decoder returns absolute coordinates, which have to be mapped to the other tiles
+            location = get_tile_location(tile) if is_native else None
+            self._decode_memo.put(content_key, decoded_data, location=location)
+            for other_tile in tiles_by_content_key[content_key][1:]:
+                tile_data_tuples.append((other_tile, self._decode_memo.get(content_key, other_tile)))
 
         # todo: clarify this code
         tile_data_tuples = sorted(tile_data_tuples, key=lambda t: t[0].id())
@@ -511,12 +694,19 @@ class VtReader(QObject):
         file_name = "{}.{}.{}".format(self._source.name().replace(" ", "_"), layer_name, geo_type)
         return get_valid_filename(file_name)
 
-    def _create_qgis_layers(self, merge_features, apply_styles, clip_tiles):
+    def _create_qgis_layers(self, merge_features, apply_styles, clip_tiles, is_partial_update=False):
         """
         Creates a hierarchy of groups and layers in qgis
+        :param is_partial_update: True if the layers are updated while the tiles are still being loaded. Layers
+            without features so far are then not cleared and the progress isn't reported.
         """
+
+        def update_progress(**kwargs):
+            if not is_partial_update:
+                self._update_progress(**kwargs)
+
         own_layers: List[QgsVectorLayer] = get_loaded_layers_of_connection(self._connection["name"])
-        for l in own_layers:
+        for l in own_layers if not is_partial_update else []:
             name: str = l.name()
             geo_type = l.customProperty("VectorTilesReader/geo_type")
             if (name, geo_type) not in self.feature_collections_by_layer_name_and_geotype:
@@ -528,7 +718,7 @@ class VtReader(QObject):
                 l.setCustomProperty("VectorTilesReader/is_empty", False)
 
         nr_layers = len(self.feature_collections_by_layer_name_and_geotype)
-        self._update_progress(progress=0, max_progress=nr_layers, msg="Creating {} layers...".format(nr_layers))
+        update_progress(progress=0, max_progress=nr_layers, msg="Creating {} layers...".format(nr_layers))
         layer_filter = self._loading_options["layer_filter"]
 
         clipping_bounds = None
@@ -561,6 +751,8 @@ class VtReader(QObject):
                 if layer:
                     self._update_layer_source(file_path, feature_collection)
                     layer.reload()
+                    if is_partial_update:
+                        layer.triggerRepaint()
                     if merge_features and geo_type in [GeoTypes.LINE_STRING, GeoTypes.POLYGON]:
                         merger = FeatureMerger(should_cancel_func=lambda: self.cancel_requested)
                         merger.merge_features(layer)
@@ -591,12 +783,12 @@ class VtReader(QObject):
                         should_cancel_func=lambda: self.cancel_requested,
                     )
                 new_layers.append((layer_name, geo_type, layer))
-            self._update_progress(progress=count + 1)
+            update_progress(progress=count + 1)
 
-        self._update_progress(msg="Refreshing layers...")
+        update_progress(msg="Refreshing layers...")
 
         if len(new_layers) > 0 and not self.cancel_requested:
-            self._update_progress(msg="Adding new layers...")
+            update_progress(msg="Adding new layers...")
             only_layers = list([layer_name_tuple[2] for layer_name_tuple in new_layers])
             info("Adding {} layers to QGIS...", len(only_layers))
             QgsProject.instance().addMapLayers(only_layers, False)
@@ -612,7 +804,7 @@ class VtReader(QObject):
             styles_folder = get_style_folder(conn_name)
             styles = get_styles(conn_name)
             info("Applying styles to {} layers...", len(new_layers))
-            self._update_progress(progress=0, max_progress=len(new_layers), msg="Styling layers...")
+            update_progress(progress=0, max_progress=len(new_layers), msg="Styling layers...")
             for name, geo_type, layer in new_layers:
                 count += 1
                 if self.cancel_requested:
@@ -620,17 +812,29 @@ class VtReader(QObject):
                 VtReader._apply_named_style(
                     existing_styles=styles, style_dir=styles_folder, layer=layer, geo_type=geo_type
                 )
-                self._update_progress(progress=count)
+                update_progress(progress=count)
         info("Layer creation complete")
 
     @staticmethod
     def _update_layer_source(layer_source: str, feature_collection: dict) -> None:
         """
         Updates the layers GeoJSON source file
+         * Features with WKB geometries (binary output of the native decoder) are written by OGR, without
+           serializing them to GeoJSON in python. If the collection contains GeoJSON features as well
+           (i.e. tiles cached by an older version), all features are written with json.dumps.
         :param layer_source: The path to the geoJSON file that is the source of the layer
         :param feature_collection: The feature collection to dump
         :return: 
         """
+        features = feature_collection["features"]
+        nr_wkb_features = sum(1 for f in features if "wkb" in f)
+        if nr_wkb_features:
+            if nr_wkb_features == len(features):
+                crs = feature_collection["crs"]["properties"]["name"]
+                if write_wkb_features(layer_source, features, crs):
+                    return
+            feature_collection = dict(feature_collection)
+            feature_collection["features"] = [to_geojson_feature(f) for f in features]
         with open(layer_source, "w") as f:
             f.write(json.dumps(feature_collection))
 
@@ -803,7 +1007,7 @@ class VtReader(QObject):
             feature_json = {
                 "type": "Feature",
                 "geometry": {"type": type_string, "coordinates": c},
-                "properties": properties,
+                "properties": dict(properties),
             }
             all_features.append(feature_json)
 
@@ -30,9 +30,10 @@ from qgis.gui import QgsMessageBarItem
 
 from .style_converter import core
 from .ui.dialogs import AboutDialog, ConnectionsDialog, OptionsGroup
+from .util.decoder_pool import DecoderPool
 from .util.file_helper import clear_cache, get_icons_directory, get_plugin_directory, get_temp_dir
 from .util.log_helper import critical, debug, info
-from .util.network_helper import http_get, url_exists
+from .util.network_helper import get_loading_error, http_get_response
 from .util.qgis_helper import get_loaded_layers_of_connection
 from .util.tile_helper import (
     WORLD_BOUNDS,
@@ -111,6 +112,7 @@ class VtrPlugin:
         self.connections_dialog.on_add.connect(self._on_add_layer)
         self.connections_dialog.on_zoom_change.connect(self._on_zoom_change)
         self._current_reader: VtReader = None
+        self._decoder_pool: DecoderPool = None
         self._add_path_to_icons()
         self._current_layer_filter: List[str] = []
         self._auto_zoom = False
@@ -265,8 +267,20 @@ class VtrPlugin:
                 self._extent_to_load = new_target_extent
 
         if self._is_loading and (self._scale_to_load or self._extent_to_load):
-            info("Cancelling loading due to new request...")
-            self._cancel_load()
+            if self._is_viewport_of_current_load(self._extent_to_load) and self._current_reader.set_viewport(
+                self._extent_to_load
+            ):
+                info("Map extent changed, tiles outside of the new extent won't be loaded anymore")
+            else:
+                info("Cancelling loading due to new request...")
+                self._cancel_load()
+
+    def _is_viewport_of_current_load(self, extent: Optional[Bounds]) -> bool:
+        """
+         * Returns True if the extent has the zoom level of the current loading process, i.e. if the map has been
+           panned but not zoomed
+        """
+        return not self._scale_to_load and extent is not None and extent.zoom() == self._current_zoom
 
     def _on_add_layer(self, connection: dict, selected_layers: List):
         assert connection
@@ -389,11 +403,9 @@ class VtrPlugin:
             try:
                 reader = self._create_reader(connection=connection)
                 if reader:
-                    layers = reader.get_source().vector_layers()
-                    self.connections_dialog.set_layers(layers)
-                    self.connections_dialog.options.set_zoom(
-                        min_zoom=reader.get_source().min_zoom(), max_zoom=reader.get_source().max_zoom()
-                    )
+                    summary = reader.get_source().metadata_summary()
+                    self.connections_dialog.set_layers(summary["vector_layers"])
+                    self.connections_dialog.options.set_zoom(min_zoom=summary["min_zoom"], max_zoom=summary["max_zoom"])
                     self.reload_action.setEnabled(True)
                     self._current_reader = reader
                     proj = QgsProject.instance()
@@ -428,13 +440,15 @@ class VtrPlugin:
             return
         url = connection["style"]
         info("Creating styles from: {}", url)
-        valid, error, url = url_exists(url)
-        if not valid:
-            info("StyleJSON not found. URL invalid? {}", error)
+        # a single request serves as existence check and loads the StyleJSON
+        response = http_get_response(url)
+        if response.error:
+            info("StyleJSON not found. URL invalid? {}", get_loading_error(url, response.status, response.error))
         else:
             output_directory = get_temp_dir(os.path.join("styles", connection["name"]))
-            status, data = http_get(url)
+            status = response.status
             if status == 200:
+                data = response.content.decode("utf-8")
                 try:
                     core.register_qgis_expressions()
                     info("Styles will be written to: {}", output_directory)
@@ -794,6 +808,7 @@ class VtrPlugin:
                     max_tiles=tile_limit,
                     layer_filter=layers_to_load,
                     is_inspection_mode=inspection_mode,
+                    progressive_update_interval_ms=options.progressive_update_interval(),
                 )
                 self._is_loading = True
                 reader.load_tiles_async(bounds=bounds)
@@ -824,13 +839,31 @@ class VtrPlugin:
         for layer in self.iface.mapCanvas().layers():
             layer.triggerRepaint()
 
+    def _get_decoder_pool(self) -> DecoderPool:
+        """
+         * The decoder processes are shared by all readers and kept running until the plugin is unloaded
+        """
+        options = self.connections_dialog.options
+        size = options.decoder_pool_size()
+        max_tasks_per_worker = options.decoder_max_tasks_per_worker()
+        max_worker_memory_mb = options.decoder_max_worker_memory_mb()
+        if not self._decoder_pool:
+            self._decoder_pool = DecoderPool(
+                size=size, max_tasks_per_worker=max_tasks_per_worker, max_worker_memory_mb=max_worker_memory_mb
+            )
+        else:
+            self._decoder_pool.configure(
+                size=size, max_tasks_per_worker=max_tasks_per_worker, max_worker_memory_mb=max_worker_memory_mb
+            )
+        return self._decoder_pool
+
     def _create_reader(self, connection: dict) -> Optional[VtReader]:
         # A lazy import is required because the vtreader depends on the external libs
         from .vt_reader import VtReader
 
         reader = None
         try:
-            reader = VtReader(self.iface, connection=connection)
+            reader = VtReader(self.iface, connection=connection, decoder_pool=self._get_decoder_pool())
             reader.progress_changed.connect(self.reader_progress_changed)
             reader.max_progress_changed.connect(self.reader_max_progress_changed)
             reader.show_progress_changed.connect(self.reader_show_progress_changed)
@@ -1003,6 +1036,9 @@ class VtrPlugin:
         if self._current_reader:
             self._current_reader.get_source().close_connection()
             self._current_reader = None
+        if self._decoder_pool:
+            self._decoder_pool.shutdown()
+            self._decoder_pool = None
 
         self.iface.mapCanvas().xyCoordinates.disconnect(self._handle_mouse_move)
         QgsProject.instance().layersWillBeRemoved.disconnect(self._on_remove)
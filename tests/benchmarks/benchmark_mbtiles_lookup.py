@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+"""
+ * Compares the former string based tile lookup of MBTilesSource with the indexed range lookup
+ * A synthetic MBTiles file is created in the temp directory on the first run (this takes a while)
+
+ Usage: python -m tests.benchmarks.benchmark_mbtiles_lookup [zoom_level] [viewport_size]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from plugin.util.tile_source import MBTilesSource
+
+_TILE_DATA = b"\x1a\x00" * 512
+
+
+def _create_synthetic_mbtiles(zoom_level, with_index):
+    name = "vtr_benchmark_z{}_{}.mbtiles".format(zoom_level, "indexed" if with_index else "unindexed")
+    path = os.path.join(tempfile.gettempdir(), name)
+    if os.path.isfile(path):
+        return path
+
+    print("Creating synthetic MBTiles file: {}".format(path))
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE metadata (name text, value text)")
+    conn.execute("CREATE TABLE tiles (zoom_level integer, tile_column integer, tile_row integer, tile_data blob)")
+    nr_tiles = 2 ** zoom_level
+    with conn:
+        for x in range(nr_tiles):
+            conn.executemany(
+                "INSERT INTO tiles VALUES (?, ?, ?, ?)", ((zoom_level, x, y, _TILE_DATA) for y in range(nr_tiles))
+            )
+    if with_index:
+        conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _viewport(zoom_level, size):
+    center = 2 ** zoom_level // 2
+    return [(x, y) for x in range(center, center + size) for y in range(center, center + size)]
+
+
+def _load_with_string_lookup(path, zoom_level, tiles):
+    conn = sqlite3.connect(path)
+    tile_coords = ", ".join("'{};{}'".format(x, y) for x, y in tiles)
+    sql = 'SELECT tile_data FROM tiles WHERE zoom_level = {} AND tile_column || ";" || tile_row IN ({})'
+    rows = conn.execute(sql.format(zoom_level, tile_coords)).fetchall()
+    conn.close()
+    return rows
+
+
+def _load_with_range_lookup(path, zoom_level, tiles):
+    src = MBTilesSource(path)
+    rows = src.load_tiles(zoom_level, tiles_to_load=tiles)
+    src.close_connection()
+    return rows
+
+
+def _measure(name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    duration = time.perf_counter() - start
+    print("{:<40} {:>6} tiles {:>10.3f}s".format(name, len(result), duration))
+
+
+def run(zoom_level=10, viewport_size=8):
+    tiles = _viewport(zoom_level, viewport_size)
+    for with_index in [True, False]:
+        path = _create_synthetic_mbtiles(zoom_level, with_index=with_index)
+        suffix = "indexed" if with_index else "unindexed"
+        _measure("string lookup ({})".format(suffix), _load_with_string_lookup, path, zoom_level, tiles)
+        _measure("range lookup ({}, first run)".format(suffix), _load_with_range_lookup, path, zoom_level, tiles)
+        _measure("range lookup ({})".format(suffix), _load_with_range_lookup, path, zoom_level, tiles)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
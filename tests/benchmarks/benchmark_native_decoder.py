@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+"""
+ * Compares the ways of passing the tile data to the native decoder: the former hex string created with a join,
+   the hex string created with bytes.hex and the buffer (decodeMvtBufferToJson)
+ * The buffer is only measured, if the binary of the platform exports decodeMvtBufferToJson
+ * The binary output (WKB and typed properties instead of GeoJSON) is measured, if the binary exports
+   decodeMvtBufferToWkb
+
+ Usage: python -m tests.benchmarks.benchmark_native_decoder [path to mbtiles] [nr_of_runs]
+"""
+import gzip
+import os
+import sqlite3
+import sys
+import time
+
+from plugin.util import mp_helper
+from plugin.util.file_helper import is_gzipped
+from plugin.util.mp_helper import (
+    decode_tile_native,
+    native_binary_output_supported,
+    native_buffer_abi_supported,
+    native_decoding_supported,
+)
+from plugin.util.tile_helper import VectorTile, get_tile_location
+
+_PBF_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "uster.pbf")
+_MBTILES_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "sample_data", "koh-samui_thailand.mbtiles")
+
+
+def _read_pbf(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return [(VectorTile("tms", 14, 8568, 10636), data)]
+
+
+def _read_mbtiles(path, max_tiles=200):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles ORDER BY length(tile_data) DESC LIMIT ?",
+        (max_tiles,),
+    ).fetchall()
+    conn.close()
+    tiles = []
+    for zoom_level, col, row, data in rows:
+        data = bytes(data)
+        if is_gzipped(data):
+            data = gzip.decompress(data)
+        tiles.append((VectorTile("tms", zoom_level, col, row), data))
+    return tiles
+
+
+def _decode_with_joined_hex(tile_data_clip):
+    """
+     * The hex string as it has been created before bytes.hex was used
+    """
+    tile, data, clip_tile = tile_data_clip
+    hex_bytes = "".join("%02x" % b for b in bytearray(data)).encode(encoding="UTF-8")
+    tile_x, tile_y, tile_span_x, tile_span_y = get_tile_location(tile)
+    ptr = mp_helper._native_lib_handle.decodeMvtToJson(
+        clip_tile, tile.zoom_level, tile.column, tile.row, tile_x, tile_y, tile_span_x, tile_span_y, hex_bytes
+    )
+    mp_helper._native_lib_handle.freeme(ptr)
+
+
+def _decode(tile_data_clip, use_buffer_abi=True, use_binary_output=False):
+    return decode_tile_native(tile_data_clip, use_buffer_abi=use_buffer_abi, use_binary_output=use_binary_output)
+
+
+def _measure(name, func, tiles, nr_of_runs):
+    nr_of_bytes = sum(len(data) for _, data in tiles)
+    start = time.perf_counter()
+    for _ in range(nr_of_runs):
+        for tile, data in tiles:
+            func((tile, data, True))
+    duration = (time.perf_counter() - start) / nr_of_runs
+    print("{:<30} {:>5} tiles {:>10} bytes {:>10.3f}s".format(name, len(tiles), nr_of_bytes, duration))
+
+
+def run(mbtiles_path=_MBTILES_PATH, nr_of_runs=5):
+    if not native_decoding_supported():
+        print("The native decoder is not available on this platform")
+        return
+
+    tile_sets = [("uster.pbf", _read_pbf(_PBF_PATH))]
+    if os.path.isfile(mbtiles_path):
+        tile_sets.append((os.path.basename(mbtiles_path), _read_mbtiles(mbtiles_path)))
+
+    for name, tiles in tile_sets:
+        print(name)
+        _measure("hex string (join)", _decode_with_joined_hex, tiles, nr_of_runs)
+        _measure("hex string (bytes.hex)", lambda t: _decode(t, use_buffer_abi=False), tiles, nr_of_runs)
+        if native_buffer_abi_supported():
+            _measure("buffer", lambda t: _decode(t, use_buffer_abi=True), tiles, nr_of_runs)
+        else:
+            print("buffer: not supported by the binary, rebuild pbf2geojson to measure it")
+        if native_binary_output_supported():
+            _measure("buffer, binary output", lambda t: _decode(t, use_binary_output=True), tiles, nr_of_runs)
+        else:
+            print("binary output: not supported by the binary, rebuild pbf2geojson to measure it")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(
+        mbtiles_path=args[0] if len(args) > 0 else _MBTILES_PATH,
+        nr_of_runs=int(args[1]) if len(args) > 1 else 5,
+    )
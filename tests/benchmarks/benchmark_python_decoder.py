@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+"""
+ * Compares the decoding of a tile with mapbox_vector_tile (protobuf messages) and with mvt_parser (wire format)
+
+ Usage: python -m tests.benchmarks.benchmark_python_decoder [path to pbf] [nr_of_runs]
+"""
+import os
+import sys
+import time
+
+import mapbox_vector_tile
+
+from plugin.util import mvt_parser
+
+_PBF_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "uster.pbf")
+
+
+def _measure(name, func, data, nr_of_runs):
+    start = time.perf_counter()
+    for _ in range(nr_of_runs):
+        func(data)
+    duration = (time.perf_counter() - start) / nr_of_runs
+    print("{:<25} {:>10} bytes {:>10.3f}s".format(name, len(data), duration))
+
+
+def run(path=_PBF_PATH, nr_of_runs=5):
+    with open(path, "rb") as f:
+        data = f.read()
+    _measure("mapbox_vector_tile", mapbox_vector_tile.decode, data, nr_of_runs)
+    _measure("mvt_parser", mvt_parser.decode, data, nr_of_runs)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(path=args[0] if len(args) > 0 else _PBF_PATH, nr_of_runs=int(args[1]) if len(args) > 1 else 5)
@@ -13,11 +13,20 @@ def get_tests():
 
     from tests.test_mbtiles_source import MbtileSourceTests
     from tests.test_server_source import ServerSourceTests
+    from tests.test_directory_source import DirectorySourceTests
+    from tests.test_pmtiles_source import PMTilesSourceTests
+    from tests.test_postgis_source import PostGISSourceTests
     from tests.test_tilehelper import TileHelperTests
     from tests.test_filehelper import FileHelperTests
     from tests.test_vtreader import VtReaderTests
     from tests.test_tilejson import TileJsonTests
     from tests.test_networkhelper import NetworkHelperTests
+    from tests.test_decode_memo import DecodeMemoTests
+    from tests.test_binary_tile_reader import BinaryTileReaderTests
+    from tests.test_decoder_pool import DecoderPoolTests
+    from tests.test_mp_helper import MpHelperTests
+    from tests.test_mvt_parser import MvtParserTests
+    from tests.test_tile_seeder import TileSeederTests
 
     from tests.style_converter_tests.test_filters import StyleConverterFilterTests
     from tests.style_converter_tests.test_helper import StyleConverterHelperTests
@@ -27,10 +36,19 @@ def get_tests():
         unittest.TestLoader().loadTestsFromTestCase(VtrPluginTests),
         unittest.TestLoader().loadTestsFromTestCase(MbtileSourceTests),
         unittest.TestLoader().loadTestsFromTestCase(ServerSourceTests),
+        unittest.TestLoader().loadTestsFromTestCase(DirectorySourceTests),
+        unittest.TestLoader().loadTestsFromTestCase(PMTilesSourceTests),
+        unittest.TestLoader().loadTestsFromTestCase(PostGISSourceTests),
         unittest.TestLoader().loadTestsFromTestCase(TileHelperTests),
         unittest.TestLoader().loadTestsFromTestCase(FileHelperTests),
         unittest.TestLoader().loadTestsFromTestCase(TileJsonTests),
         unittest.TestLoader().loadTestsFromTestCase(NetworkHelperTests),
+        unittest.TestLoader().loadTestsFromTestCase(DecodeMemoTests),
+        unittest.TestLoader().loadTestsFromTestCase(BinaryTileReaderTests),
+        unittest.TestLoader().loadTestsFromTestCase(DecoderPoolTests),
+        unittest.TestLoader().loadTestsFromTestCase(MpHelperTests),
+        unittest.TestLoader().loadTestsFromTestCase(MvtParserTests),
+        unittest.TestLoader().loadTestsFromTestCase(TileSeederTests),
         unittest.TestLoader().loadTestsFromTestCase(VtReaderTests),
         unittest.TestLoader().loadTestsFromTestCase(StyleConverterFilterTests),
         unittest.TestLoader().loadTestsFromTestCase(StyleConverterHelperTests),
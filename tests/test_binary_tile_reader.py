@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import struct
+import sys
+
+from qgis.testing import unittest
+
+from plugin.util.binary_tile_reader import map_wkb, read_binary_tile, read_wkb, to_geojson_feature
+from plugin.util.tile_helper import VectorTile
+
+
+def _string(value):
+    encoded = value.encode("utf-8")
+    return struct.pack("<I", len(encoded)) + encoded
+
+
+def _points(points):
+    return struct.pack("<I", len(points)) + b"".join(struct.pack("<2d", *p) for p in points)
+
+
+def _feature(feature_id, wkb, properties):
+    data = struct.pack("<QI", feature_id, len(wkb)) + wkb + struct.pack("<I", len(properties))
+    for key, value_type, value in properties:
+        data += _string(key) + struct.pack("<B", value_type)
+        data += _string(value) if value_type == 0 else value
+    return data
+
+
+_POINT_WKB = struct.pack("<BI2d", 1, 1, 10.0, 20.0)
+_MULTI_LINE_STRING_WKB = struct.pack("<BII", 1, 5, 1) + struct.pack("<BI", 1, 2) + _points([(0, 0), (1, 1)])
+_MULTI_POLYGON_WKB = (
+    struct.pack("<BII", 1, 6, 1) + struct.pack("<BII", 1, 3, 1) + _points([(0, 0), (1, 0), (1, 1), (0, 0)])
+)
+
+
+class BinaryTileReaderTests(unittest.TestCase):
+    def _create_tile_data(self):
+        layer = _string("poi") + struct.pack("<I", 4096)
+        point = _feature(
+            7,
+            _POINT_WKB,
+            [
+                ("name", 0, "Zürich"),
+                ("height", 1, struct.pack("<d", 408.5)),
+                ("rank", 2, struct.pack("<q", -3)),
+                ("population", 3, struct.pack("<Q", 400000)),
+                ("capital", 4, struct.pack("<B", 0)),
+            ],
+        )
+        layer += struct.pack("<I", 1) + point
+        layer += struct.pack("<I", 1) + _feature(8, _MULTI_LINE_STRING_WKB, [])
+        layer += struct.pack("<I", 0)
+        return b"VTRB" + struct.pack("<II", 1, 1) + layer
+
+    def test_read_binary_tile(self):
+        decoded_data = read_binary_tile(self._create_tile_data(), VectorTile("xyz", 14, 3, 4))
+        self.assertEqual(["poi"], list(decoded_data))
+        layer = decoded_data["poi"]
+        self.assertEqual(4096, layer["extent"])
+        self.assertTrue(layer["isGeojson"])
+        self.assertEqual([], layer["Polygon"])
+        self.assertEqual(1, len(layer["LineString"]))
+        point = layer["Point"][0]
+        self.assertEqual(7, point["id"])
+        self.assertEqual(_POINT_WKB, point["wkb"])
+        self.assertEqual(
+            {
+                "name": "Zürich",
+                "height": 408.5,
+                "rank": -3,
+                "population": 400000,
+                "capital": False,
+                "_col": 3,
+                "_row": 4,
+                "_zoom": 14,
+            },
+            point["properties"],
+        )
+
+    def test_to_geojson_feature(self):
+        decoded_data = read_binary_tile(self._create_tile_data(), VectorTile("xyz", 14, 3, 4))
+        feature = to_geojson_feature(decoded_data["poi"]["Point"][0])
+        self.assertNotIn("wkb", feature)
+        self.assertEqual({"type": "Point", "coordinates": [10.0, 20.0]}, feature["geometry"])
+        self.assertEqual("Zürich", feature["properties"]["name"])
+
+    def test_read_from_memoryview(self):
+        data = bytearray(self._create_tile_data())
+        decoded_data = read_binary_tile(memoryview(data), VectorTile("xyz", 14, 3, 4))
+        self.assertEqual(8, decoded_data["poi"]["LineString"][0]["id"])
+
+    def test_invalid_data(self):
+        with self.assertRaises(RuntimeError):
+            read_binary_tile(b"{}", VectorTile("xyz", 14, 3, 4))
+
+    def test_unsupported_version(self):
+        with self.assertRaises(RuntimeError):
+            read_binary_tile(b"VTRB" + struct.pack("<II", 2, 0), VectorTile("xyz", 14, 3, 4))
+
+    def test_read_wkb(self):
+        self.assertEqual(
+            {"type": "MultiLineString", "coordinates": [[[0.0, 0.0], [1.0, 1.0]]]}, read_wkb(_MULTI_LINE_STRING_WKB)
+        )
+        self.assertEqual(
+            {"type": "MultiPolygon", "coordinates": [[[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]]]},
+            read_wkb(_MULTI_POLYGON_WKB),
+        )
+
+    def test_map_wkb(self):
+        def map_point(point):
+            return [point[0] + 1, point[1] * 2]
+
+        self.assertEqual({"type": "Point", "coordinates": [11.0, 40.0]}, read_wkb(map_wkb(_POINT_WKB, map_point)))
+        self.assertEqual(
+            {"type": "MultiPolygon", "coordinates": [[[[1.0, 0.0], [2.0, 0.0], [2.0, 2.0], [1.0, 0.0]]]]},
+            read_wkb(map_wkb(_MULTI_POLYGON_WKB, map_point)),
+        )
+
+    def test_big_endian_wkb(self):
+        with self.assertRaises(RuntimeError):
+            read_wkb(struct.pack(">BI2d", 0, 1, 10.0, 20.0))
+
+
+def suite():
+    suite = unittest.makeSuite(BinaryTileReaderTests, "test")
+    return suite
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import struct
+import sys
+
+from qgis.testing import unittest
+
+from plugin.util.binary_tile_reader import read_wkb
+from plugin.util.decode_memo import DecodeMemo, get_content_key
+from plugin.util.tile_helper import VectorTile, get_tile_location
+
+
+class DecodeMemoTests(unittest.TestCase):
+    def test_content_key_from_data(self):
+        tile_a = VectorTile("xyz", 14, 1, 1)
+        tile_b = VectorTile("xyz", 14, 2, 1)
+        self.assertEqual(get_content_key(tile_a, b"ocean"), get_content_key(tile_b, b"ocean"))
+        self.assertNotEqual(get_content_key(tile_a, b"ocean"), get_content_key(tile_b, b"land"))
+
+    def test_content_key_from_tile_id(self):
+        tile = VectorTile("xyz", 14, 1, 1)
+        tile.content_key = "abc"
+        self.assertEqual(("tile_id", "abc"), get_content_key(tile, b"ocean"))
+
+    def test_tile_relative_data_is_shared(self):
+        memo = DecodeMemo()
+        data = {"water": {"extent": 4096, "features": []}}
+        memo.put("key", data)
+        self.assertIs(data, memo.get("key", VectorTile("xyz", 14, 5, 5)))
+
+    def test_unknown_key(self):
+        self.assertIsNone(DecodeMemo().get("key", VectorTile("xyz", 14, 5, 5)))
+
+    def test_max_entries(self):
+        memo = DecodeMemo(max_entries=2)
+        memo.put("a", {})
+        memo.put("b", {})
+        memo.get("a", VectorTile("xyz", 14, 5, 5))
+        memo.put("c", {})
+        self.assertEqual(2, len(memo))
+        self.assertIn("a", memo)
+        self.assertNotIn("b", memo)
+
+    def test_absolute_coordinates_are_mapped(self):
+        source_tile = VectorTile("xyz", 14, 8580, 5738)
+        target_tile = VectorTile("xyz", 14, 8581, 5739)
+        x, y, span_x, span_y = get_tile_location(source_tile)
+        feature = {
+            "id": 1,
+            "type": "Feature",
+            "properties": {"class": "ocean", "_col": 8580, "_row": 5738, "_zoom": 14},
+            "geometry": {"type": "Point", "coordinates": [x + span_x / 2, y + span_y / 2]},
+        }
+        data = {"water": {"extent": 4096, "isGeojson": True, "Point": [feature], "LineString": [], "Polygon": []}}
+        memo = DecodeMemo()
+        memo.put("key", data, location=(x, y, span_x, span_y))
+
+        mapped = memo.get("key", target_tile)
+        mapped_feature = mapped["water"]["Point"][0]
+        target_x, target_y, target_span_x, target_span_y = get_tile_location(target_tile)
+        self.assertAlmostEqual(target_x + target_span_x / 2, mapped_feature["geometry"]["coordinates"][0])
+        self.assertAlmostEqual(target_y + target_span_y / 2, mapped_feature["geometry"]["coordinates"][1])
+        self.assertEqual(8581, mapped_feature["properties"]["_col"])
+        self.assertEqual(5739, mapped_feature["properties"]["_row"])
+        self.assertEqual(8580, feature["properties"]["_col"])
+
+    def test_wkb_coordinates_are_mapped(self):
+        source_tile = VectorTile("xyz", 14, 8580, 5738)
+        target_tile = VectorTile("xyz", 14, 8581, 5739)
+        x, y, span_x, span_y = get_tile_location(source_tile)
+        feature = {
+            "id": 1,
+            "type": "Feature",
+            "properties": {"class": "ocean", "_col": 8580, "_row": 5738, "_zoom": 14},
+            "wkb": struct.pack("<BI2d", 1, 1, x + span_x / 2, y + span_y / 2),
+        }
+        data = {"water": {"extent": 4096, "isGeojson": True, "Point": [feature], "LineString": [], "Polygon": []}}
+        memo = DecodeMemo()
+        memo.put("key", data, location=(x, y, span_x, span_y))
+
+        mapped_feature = memo.get("key", target_tile)["water"]["Point"][0]
+        target_x, target_y, target_span_x, target_span_y = get_tile_location(target_tile)
+        coordinates = read_wkb(mapped_feature["wkb"])["coordinates"]
+        self.assertAlmostEqual(target_x + target_span_x / 2, coordinates[0])
+        self.assertAlmostEqual(target_y + target_span_y / 2, coordinates[1])
+        self.assertEqual(8581, mapped_feature["properties"]["_col"])
+
+
+def suite():
+    s = unittest.makeSuite(DecodeMemoTests, "test")
+    return s
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import sys
+
+from qgis.testing import unittest
+
+from plugin.util.decoder_pool import (
+    DecoderPool,
+    default_max_tasks_per_worker,
+    default_max_worker_memory_mb,
+    get_default_pool_size,
+    get_peak_memory_mb,
+)
+
+
+def _square(value):
+    return value * value
+
+
+class DecoderPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = DecoderPool(size=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_defaults(self):
+        pool = DecoderPool()
+        self.assertEqual(get_default_pool_size(), pool.size)
+        self.assertEqual(default_max_tasks_per_worker, pool.max_tasks_per_worker)
+        self.assertEqual(default_max_worker_memory_mb, pool.max_worker_memory_mb)
+
+    def test_started_lazily(self):
+        self.assertFalse(self.pool.is_running())
+        self.assertEqual([1, 4, 9], sorted(self.pool.imap_unordered(_square, [1, 2, 3])))
+        self.assertTrue(self.pool.is_running())
+
+    def test_processes_are_reused(self):
+        list(self.pool.imap_unordered(_square, [1, 2, 3]))
+        processes = self.pool._pool
+        self.assertEqual([16], list(self.pool.imap_unordered(_square, [4])))
+        self.assertIs(processes, self.pool._pool)
+
+    def test_configure(self):
+        list(self.pool.imap_unordered(_square, [1]))
+        self.pool.configure(size=2)
+        self.assertTrue(self.pool.is_running())
+        self.pool.configure(size=3, max_tasks_per_worker=0)
+        self.assertFalse(self.pool.is_running())
+        self.assertEqual(3, self.pool.size)
+        self.assertEqual(0, self.pool.max_tasks_per_worker)
+        self.assertEqual([1, 4], sorted(self.pool.imap_unordered(_square, [1, 2])))
+
+    def test_terminate(self):
+        list(self.pool.imap_unordered(_square, [1]))
+        self.pool.terminate()
+        self.assertFalse(self.pool.is_running())
+        self.assertEqual([4], list(self.pool.imap_unordered(_square, [2])))
+
+    def test_results_iterator_with_timeout(self):
+        results = self.pool.imap_unordered(_square, [3])
+        self.assertEqual(9, results.next(timeout=5))
+        self.assertRaises(StopIteration, results.next, 5)
+
+    @unittest.skipIf(get_peak_memory_mb() is None, "The memory usage can't be retrieved on this platform")
+    def test_processes_replaced_above_memory_limit(self):
+        self.pool.configure(size=2, max_worker_memory_mb=1)
+        list(self.pool.imap_unordered(_square, [1, 2]))
+        processes = self.pool._pool
+        self.assertTrue(self.pool._recycle_requested)
+        self.assertEqual([9], list(self.pool.imap_unordered(_square, [3])))
+        self.assertIsNot(processes, self.pool._pool)
+
+    def test_memory_limit_disabled(self):
+        self.pool.configure(size=2, max_worker_memory_mb=0)
+        list(self.pool.imap_unordered(_square, [1, 2]))
+        processes = self.pool._pool
+        self.assertFalse(self.pool._recycle_requested)
+        list(self.pool.imap_unordered(_square, [3]))
+        self.assertIs(processes, self.pool._pool)
+
+    def test_chunk_size(self):
+        self.assertEqual(1, self.pool.get_chunk_size(0))
+        self.assertEqual(1, self.pool.get_chunk_size(8))
+        self.assertEqual(2, self.pool.get_chunk_size(9))
+        self.assertEqual(125, self.pool.get_chunk_size(1000))
+
+
+def suite():
+    suite = unittest.makeSuite(DecoderPoolTests, "test")
+    return suite
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
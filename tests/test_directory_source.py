@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from qgis.testing import unittest
+
+from plugin.util.tile_index import DirectoryTileIndex
+from plugin.util.tile_source import DirectorySource
+
+
+class DirectorySourceTests(unittest.TestCase):
+    """
+    Tests for DirectorySource
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        metadata = {"bounds": [-180, -85, 180, 85], "minzoom": 0, "maxzoom": 3, "vector_layers": [{"id": "water"}]}
+        with open(os.path.join(self.path, "metadata.json"), "w") as f:
+            json.dump(metadata, f)
+        for x in range(4):
+            os.makedirs(os.path.join(self.path, "3", str(x)))
+            for y in range(4):
+                with open(os.path.join(self.path, "3", str(x), "{}.pbf".format(y)), "wb") as f:
+                    f.write("{};{}".format(x, y).encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_metadata(self):
+        src = DirectorySource(self.path)
+        self.assertEqual(0, src.min_zoom())
+        self.assertEqual(3, src.max_zoom())
+        self.assertEqual([{"id": "water"}], src.vector_layers())
+
+    def test_load_tiles(self):
+        src = DirectorySource(self.path, max_concurrent_reads=3)
+        tiles = src.load_tiles(3, tiles_to_load=[(x, y) for x in range(5) for y in range(5)])
+        self.assertEqual(16, len(tiles))
+        for tile, data in tiles:
+            self.assertEqual("{};{}".format(tile.column, tile.row).encode(), data)
+
+    def test_load_tiles_center_first(self):
+        src = DirectorySource(self.path, max_concurrent_reads=1)
+        tiles = src.load_tiles(3, tiles_to_load=[(x, y) for x in range(3) for y in range(3)])
+        self.assertEqual((1, 1), tiles[0][0].coord())
+
+    def test_load_tiles_with_mmap(self):
+        src = DirectorySource(self.path, mmap_min_size_kb=0)
+        tiles = src.load_tiles(3, tiles_to_load=[(2, 3)])
+        self.assertEqual(b"2;3", tiles[0][1])
+
+    def test_mmap_disabled_by_default(self):
+        src = DirectorySource(self.path)
+        self.assertIsNone(src.mmap_min_size_kb)
+
+    def test_load_tiles_with_limit(self):
+        src = DirectorySource(self.path)
+        tiles = src.load_tiles(3, tiles_to_load=[(x, y) for x in range(4) for y in range(4)], max_tiles=2)
+        self.assertEqual(2, len(tiles))
+
+    def test_load_tiles_with_other_extensions(self):
+        column_dir = os.path.join(self.path, "3", "5")
+        os.makedirs(column_dir)
+        with open(os.path.join(column_dir, "1.mvt"), "wb") as f:
+            f.write(b"mvt")
+        with gzip.open(os.path.join(column_dir, "2.pbf.gz"), "wb") as f:
+            f.write(b"gzipped")
+        src = DirectorySource(self.path)
+        tiles = src.load_tiles(3, tiles_to_load=[(5, 1), (5, 2)])
+        data_by_coord = {t.coord(): data for t, data in tiles}
+        self.assertEqual(b"mvt", data_by_coord[(5, 1)])
+        self.assertEqual(b"gzipped", gzip.decompress(data_by_coord[(5, 2)]))
+
+    def test_tile_index_is_refreshed(self):
+        src = DirectorySource(self.path)
+        self.assertEqual(0, len(src.load_tiles(3, tiles_to_load=[(0, 7)])))
+        with open(os.path.join(self.path, "3", "0", "7.pbf"), "wb") as f:
+            f.write(b"new")
+        os.utime(os.path.join(self.path, "3", "0"), ns=(0, 1))
+        self.assertEqual(1, len(src.load_tiles(3, tiles_to_load=[(0, 7)])))
+
+    def test_tile_index(self):
+        index = DirectoryTileIndex.from_template(os.path.join(self.path, "{z}/{x}/{y}.pbf"))
+        files = index.get_tile_files(3, [(0, 0), (0, 9), (9, 0)])
+        self.assertEqual([(0, 0)], list(files.keys()))
+        self.assertIsNone(DirectoryTileIndex.from_template("/tiles/{z}-{x}-{y}.pbf"))
+
+
+def suite():
+    s = unittest.makeSuite(DirectorySourceTests, "test")
+    return s
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
@@ -1,5 +1,7 @@
 import sys
 import os
+import shutil
+import time
 from qgis.testing import unittest
 from plugin.util.file_helper import (
     get_temp_dir,
@@ -14,6 +16,9 @@ from plugin.util.file_helper import (
     assure_temp_dirs_exist,
     get_styles,
     get_cache_entry,
+    get_cache_validators,
+    cache_tile,
+    refresh_cache_entry,
 )
 from plugin.util import file_helper
 
@@ -31,6 +36,9 @@ class FileHelperTests(unittest.TestCase):
     def tearDownClass(cls):
         pass
 
+    def tearDown(self):
+        shutil.rmtree(os.path.join(get_cache_directory(), "revalidation_test"), ignore_errors=True)
+
     def test_get_plugin_dir(self):
         self.assertEqual("/tests_directory", get_plugin_directory())
 
@@ -83,6 +91,36 @@ class FileHelperTests(unittest.TestCase):
         path = os.path.join(get_cache_directory(), "test", "2", "3", "4.bin")
         self.assertEqual(path, file_helper._get_cache_entry_path("test", zoom_level=2, x=3, y=4))
 
+    def test_cache_tile_with_lifetime(self):
+        cache_headers = {"etag": '"abc"', "last_modified": None, "expires": time.time() + 60}
+        cache_tile("revalidation_test", 1, 2, 3, {"layer": {}}, cache_headers=cache_headers)
+        self.assertEqual({"layer": {}}, get_cache_entry("revalidation_test", 1, 2, 3))
+        self.assertIsNone(get_cache_validators("revalidation_test", 1, 2, 3))
+
+    def test_expired_tile_is_revalidated(self):
+        cache_headers = {"etag": '"abc"', "last_modified": None, "expires": time.time() - 1}
+        cache_tile("revalidation_test", 1, 2, 3, {"layer": {}}, cache_headers=cache_headers)
+        self.assertIsNone(get_cache_entry("revalidation_test", 1, 2, 3))
+        validators = get_cache_validators("revalidation_test", 1, 2, 3)
+        self.assertEqual('"abc"', validators["etag"])
+
+        decoded_data = refresh_cache_entry("revalidation_test", 1, 2, 3, {"expires": time.time() + 60})
+        self.assertEqual({"layer": {}}, decoded_data)
+        self.assertEqual({"layer": {}}, get_cache_entry("revalidation_test", 1, 2, 3))
+        self.assertIsNone(get_cache_validators("revalidation_test", 1, 2, 3))
+
+    def test_expired_tile_without_validators_is_removed(self):
+        cache_tile("revalidation_test", 1, 2, 3, {"layer": {}}, cache_headers={"expires": time.time() - 1})
+        self.assertIsNone(get_cache_entry("revalidation_test", 1, 2, 3))
+        self.assertFalse(os.path.isfile(file_helper._get_cache_entry_path("revalidation_test", 1, 2, 3)))
+
+    def test_cache_tile_replaced_when_downloaded_again(self):
+        cache_tile("revalidation_test", 1, 2, 3, {"old": {}})
+        cache_tile("revalidation_test", 1, 2, 3, {"ignored": {}})
+        self.assertEqual({"old": {}}, get_cache_entry("revalidation_test", 1, 2, 3))
+        cache_tile("revalidation_test", 1, 2, 3, {"new": {}}, cache_headers={})
+        self.assertEqual({"new": {}}, get_cache_entry("revalidation_test", 1, 2, 3))
+
 
 def suite():
     s = unittest.makeSuite(FileHelperTests, "test")
@@ -4,8 +4,14 @@
 #
 from qgis.testing import unittest
 import os
+import sqlite3
 import sys
+import tempfile
+import threading
+import types
 from plugin.util.tile_source import MBTilesSource
+from plugin.util.tile_index import TilePresenceIndex, ZoomPresence, get_tile_ranges
+from plugin.util.metadata_summary import load_metadata_summary
 
 
 class MbtileSourceTests(unittest.TestCase):
@@ -112,10 +118,148 @@ class MbtileSourceTests(unittest.TestCase):
         self.assertEqual(1, len(all_tiles))
         self.assertEqual((8586, 10642), all_tiles[0][0].coord())
 
-    def test_where_clause(self):
+    def test_iter_tiles(self):
         src = _create("uster_zh.mbtiles", directory=_sample_dir())
-        where_clause = src._get_where_clause(tiles_to_load=[], zoom_level=14)
-        self.assertEqual('WHERE zoom_level = 14 AND tile_column || ";" || tile_row IN ()', where_clause)
+        tiles = src.iter_tiles(14, tiles_to_load=[(8586, 10642), (8586, 10643)])
+        self.assertIsInstance(tiles, types.GeneratorType)
+        tile, data = next(tiles)
+        self.assertEqual((8586, 10642), tile.coord())
+        self.assertTrue(data)
+
+    def test_connection_pool_shared(self):
+        src_a = _create("uster_zh.mbtiles", directory=_sample_dir())
+        src_b = _create("uster_zh.mbtiles", directory=_sample_dir())
+        self.assertIs(src_a._get_pool(), src_b._get_pool())
+        src_a.close_connection()
+        self.assertIsNotNone(src_b.bounds())
+        src_b.close_connection()
+
+    def test_load_tiles_from_other_thread(self):
+        src = _create("uster_zh.mbtiles", directory=_sample_dir())
+        self.assertEqual(14, src.max_zoom())
+        result = []
+        thread = threading.Thread(target=lambda: result.extend(src.load_tiles(14, tiles_to_load=[(8586, 10642)])))
+        thread.start()
+        thread.join()
+        self.assertEqual(1, len(result))
+        src.close_connection()
+
+    def test_tile_ranges(self):
+        ranges = get_tile_ranges([(8586, 10643), (8586, 10642), (8586, 10645), (8587, 10642)])
+        self.assertEqual([(8586, 10642, 10643), (8586, 10645, 10645), (8587, 10642, 10642)], ranges)
+
+    def test_tile_ranges_empty(self):
+        self.assertEqual([], get_tile_ranges([]))
+
+    def test_load_tiles_without_index(self):
+        path = _create_unindexed_mbtiles(zoom_level=3)
+        src = MBTilesSource(path)
+        tiles = src.load_tiles(3, tiles_to_load=[(1, 1), (1, 2), (5, 7)])
+        self.assertEqual([(1, 1), (1, 2), (5, 7)], sorted(t[0].coord() for t in tiles))
+        self.assertIsNotNone(src._get_shadow_index())
+        self.assertTrue(os.path.isfile(src._get_shadow_index().path))
+        src.close_connection()
+
+    def test_load_tiles_with_index_uses_no_shadow_index(self):
+        src = _create("uster_zh.mbtiles", directory=_sample_dir())
+        self.assertIsNone(src._get_shadow_index())
+
+    def test_presence_index(self):
+        path = _create_unindexed_mbtiles(zoom_level=3)
+        src = MBTilesSource(path)
+        presence_index = src._get_presence_index()
+        self.assertEqual(64, presence_index.count(3))
+        self.assertEqual(0, presence_index.count(4))
+        self.assertEqual(3, presence_index.min_zoom())
+        self.assertEqual(3, presence_index.max_zoom())
+        self.assertEqual({(1, 1)}, presence_index.filter_existing(3, [(1, 1), (8, 1), (1, -1)]))
+        src.close_connection()
+
+        persisted_index = TilePresenceIndex(path)
+        self.assertTrue(persisted_index.load())
+        self.assertEqual(64, persisted_index.count(3))
+        self.assertTrue(persisted_index.get(3).contains(7, 7))
+
+    def test_presence_index_without_bitmap(self):
+        path = _create_unindexed_mbtiles(zoom_level=3)
+        with sqlite3.connect(path) as conn:
+            conn.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", [(10, 0, 0, b"data"), (10, 1023, 1023, b"data")])
+        presence_index = TilePresenceIndex(path)
+        max_bitmap_bits = ZoomPresence.max_bitmap_bits
+        ZoomPresence.max_bitmap_bits = 64
+        try:
+            with sqlite3.connect(path) as conn:
+                presence_index.build(conn)
+        finally:
+            ZoomPresence.max_bitmap_bits = max_bitmap_bits
+        self.assertTrue(presence_index.get(3).contains(7, 7))
+        self.assertIsNone(presence_index.get(10).bitmap)
+        self.assertIsNone(presence_index.get(10).contains(5, 5))
+        self.assertEqual(2, presence_index.count(10))
+
+    def test_zoom_from_tiles_table_builds_no_presence_index(self):
+        path = _create_unindexed_mbtiles(zoom_level=3)
+        src = MBTilesSource(path)
+        self.assertEqual(3, src._get_zoom_from_tiles_table(max_zoom=True))
+        self.assertIsNone(src._presence_index)
+        src.close_connection()
+
+    def test_get_bounds_from_data_of_missing_zoom_level(self):
+        path = _create_unindexed_mbtiles(zoom_level=3)
+        src = MBTilesSource(path)
+        self.assertIsNone(src._get_bounds_from_data(zoom_level=5))
+        src.close_connection()
+
+    def test_metadata_summary(self):
+        path = _create_unindexed_mbtiles(zoom_level=3)
+        src = MBTilesSource(path)
+        summary = src.metadata_summary()
+        self.assertEqual(3, summary["min_zoom"])
+        self.assertEqual(3, summary["max_zoom"])
+        self.assertEqual("tms", summary["scheme"])
+        self.assertEqual([], summary["vector_layers"])
+        src.close_connection()
+        self.assertEqual(summary, load_metadata_summary(path))
+
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO metadata VALUES ('scheme', 'xyz')")
+        conn.close()
+        self.assertIsNone(load_metadata_summary(path))
+        src = MBTilesSource(path)
+        self.assertEqual("xyz", src.scheme())
+        src.close_connection()
+
+    def test_load_tiles_deduplicated_schema(self):
+        path = _create_deduplicated_mbtiles()
+        src = MBTilesSource(path)
+        tiles = src.load_tiles(1, tiles_to_load=[(0, 0), (0, 1), (1, 0)])
+        content_keys = {t[0].coord(): t[0].content_key for t in tiles}
+        self.assertEqual({(0, 0): "water", (0, 1): "water", (1, 0): "land"}, content_keys)
+        self.assertIsNone(src._get_shadow_index())
+        src.close_connection()
+
+
+def _create_deduplicated_mbtiles():
+    path = os.path.join(tempfile.gettempdir(), "vtr_deduplicated.mbtiles")
+    if os.path.isfile(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE metadata (name text, value text)")
+    conn.execute("CREATE TABLE map (zoom_level integer, tile_column integer, tile_row integer, tile_id text)")
+    conn.execute("CREATE UNIQUE INDEX map_index ON map (zoom_level, tile_column, tile_row)")
+    conn.execute("CREATE TABLE images (tile_data blob, tile_id text)")
+    conn.execute("CREATE UNIQUE INDEX images_id ON images (tile_id)")
+    conn.execute(
+        """CREATE VIEW tiles AS SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+        map.tile_row AS tile_row, images.tile_data AS tile_data FROM map JOIN images ON images.tile_id = map.tile_id"""
+    )
+    conn.executemany("INSERT INTO images VALUES (?, ?)", [(b"water", "water"), (b"land", "land")])
+    conn.executemany(
+        "INSERT INTO map VALUES (?, ?, ?, ?)", [(1, 0, 0, "water"), (1, 0, 1, "water"), (1, 1, 0, "land")]
+    )
+    conn.commit()
+    conn.close()
+    return path
 
 
 def _sample_dir():
@@ -130,6 +274,21 @@ def _get_path(mbtiles_file, directory=None):
     return path
 
 
+def _create_unindexed_mbtiles(zoom_level):
+    path = os.path.join(tempfile.gettempdir(), "vtr_unindexed_{}.mbtiles".format(zoom_level))
+    if os.path.isfile(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE metadata (name text, value text)")
+    conn.execute("CREATE TABLE tiles (zoom_level integer, tile_column integer, tile_row integer, tile_data blob)")
+    nr_tiles = 2 ** zoom_level
+    tiles = [(zoom_level, x, y, b"data") for x in range(nr_tiles) for y in range(nr_tiles)]
+    conn.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", tiles)
+    conn.commit()
+    conn.close()
+    return path
+
+
 def _create(mbtiles_file, directory=None):
     path = _get_path(mbtiles_file=mbtiles_file, directory=directory)
     return MBTilesSource(path)
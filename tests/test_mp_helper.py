@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import os
+import sys
+
+import mock
+from qgis.testing import unittest
+
+from plugin.util import mp_helper
+from plugin.util.binary_tile_reader import to_geojson_feature
+from plugin.util.mp_helper import (
+    decode_tile_native,
+    native_binary_output_supported,
+    native_buffer_abi_supported,
+    native_decoding_supported,
+)
+from plugin.util.tile_helper import VectorTile
+
+
+def _read_pbf():
+    with open(os.path.join(os.path.dirname(__file__), "data", "uster.pbf"), "rb") as f:
+        return f.read()
+
+
+def _round_coordinates(value):
+    """
+     * The GeoJSON output of the native decoder has 6 decimals, the binary output has full precision
+    """
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, list):
+        return [_round_coordinates(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _round_coordinates(v) for k, v in value.items()}
+    return value
+
+
+def _to_geojson(decoded_data):
+    for layer in decoded_data.values():
+        for geo_type, features in layer.items():
+            if isinstance(features, list):
+                layer[geo_type] = [to_geojson_feature(f) for f in features]
+    return decoded_data
+
+
+class _LibWithoutBinaryOutput(object):
+    """
+     * The native decoder as built before the binary output existed, like the prebuilt binaries for Windows
+    """
+
+    def __init__(self, lib):
+        self._lib = lib
+
+    def __getattr__(self, name):
+        if name == "decodeMvtBufferToWkb":
+            raise AttributeError(name)
+        return getattr(self._lib, name)
+
+
+def _without_empty_geometries(decoded_data):
+    """
+     * The GeoJSON output contains the points removed by clipping as features without coordinates,
+       the binary output omits them
+    """
+    for layer in decoded_data.values():
+        for geo_type, features in layer.items():
+            if isinstance(features, list):
+                layer[geo_type] = [f for f in features if f["geometry"]["coordinates"]]
+    return decoded_data
+
+
+@unittest.skipIf(not native_decoding_supported(), "The native decoder is not available on this platform")
+class MpHelperTests(unittest.TestCase):
+    def _decode(self, clip_tile, **kwargs):
+        tile, decoded_data = decode_tile_native((VectorTile("tms", 14, 8568, 10636), _read_pbf(), clip_tile), **kwargs)
+        self.assertTrue(decoded_data)
+        return decoded_data
+
+    @unittest.skipIf(not native_buffer_abi_supported(), "The native decoder doesn't support buffers")
+    def test_buffer_with_large_column_and_row(self):
+        tile = VectorTile("xyz", 17, 70000, 66000)
+        tile, decoded_data = decode_tile_native(
+            (tile, _read_pbf(), False), use_buffer_abi=True, use_binary_output=False
+        )
+        feature = decoded_data["water"]["Polygon"][0]
+        self.assertEqual(70000, feature["properties"]["_col"])
+        self.assertEqual(66000, feature["properties"]["_row"])
+
+    @unittest.skipIf(not native_binary_output_supported(), "The native decoder has no binary output")
+    def test_binary_output_same_as_geojson(self):
+        for clip_tile in [False, True]:
+            geojson = _without_empty_geometries(self._decode(clip_tile, use_binary_output=False))
+            binary = self._decode(clip_tile, use_binary_output=True)
+            self.assertTrue(all("wkb" in f for f in binary["water"]["Polygon"]))
+            self.assertEqual(_round_coordinates(geojson), _round_coordinates(_to_geojson(binary)))
+
+    @mock.patch("plugin.util.mp_helper.warn")
+    def test_fallback_without_binary_output(self, mock_warn):
+        lib = _LibWithoutBinaryOutput(mp_helper._native_lib_handle)
+        mp_helper._set_binary_output(lib)
+        self.assertTrue(mock_warn.called)
+        with mock.patch("plugin.util.mp_helper._native_lib_handle", lib):
+            self.assertFalse(native_binary_output_supported())
+            decoded_data = self._decode(False)
+        feature = decoded_data["water"]["Polygon"][0]
+        self.assertNotIn("wkb", feature)
+        self.assertTrue(feature["geometry"]["coordinates"])
+
+
+def suite():
+    s = unittest.makeSuite(MpHelperTests, "test")
+    return s
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import os
+import struct
+import sys
+
+import mapbox_vector_tile
+from qgis.testing import unittest
+
+from plugin.util.mvt_parser import (
+    LINESTRING,
+    POINT,
+    POLYGON,
+    decode,
+    decode_geometries,
+    decode_geometry,
+    decode_geometry_arrays,
+    iter_layers,
+    numpy_supported,
+)
+
+
+def _varint(value):
+    data = b""
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data += bytes([byte | 0x80])
+        else:
+            return data + bytes([byte])
+
+
+def _field(field_number, wire_type, payload):
+    return _varint((field_number << 3) | wire_type) + payload
+
+
+def _message(field_number, content):
+    return _field(field_number, 2, _varint(len(content)) + content)
+
+
+def _packed(field_number, values):
+    return _message(field_number, b"".join(_varint(v) for v in values))
+
+
+def _packed_geometry(geometry):
+    return memoryview(b"".join(_varint(v) for v in geometry))
+
+
+# a square of 10x10 with a square hole of 2x2, in MVT the exterior ring is clockwise (y pointing down)
+_POLYGON_WITH_HOLE = [9, 0, 0, 26, 20, 0, 0, 20, 19, 0, 15, 9, 8, 13, 26, 0, 4, 4, 0, 0, 3, 15]
+
+
+def _layer(values, extra_fields=b""):
+    feature = _field(1, 0, _varint(42)) + _packed(2, [0, 0, 1, 1, 2, 2, 3, 3]) + _field(3, 0, _varint(POINT))
+    feature += _packed(4, [9, 50, 34])
+    layer = _message(1, b"poi") + _message(2, feature) + extra_fields
+    for key in ["name", "rank", "offset", "height"]:
+        layer += _message(3, key.encode("utf-8"))
+    for value in values:
+        layer += _message(4, value)
+    return _message(3, layer + _field(5, 0, _varint(4096)) + _field(15, 0, _varint(2)))
+
+
+class MvtParserTests(unittest.TestCase):
+    def _get_data(self):
+        with open(os.path.join(os.path.dirname(__file__), "data", "uster.pbf"), "rb") as f:
+            return f.read()
+
+    def test_same_result_as_mapbox_vector_tile(self):
+        data = self._get_data()
+        self.assertEqual(mapbox_vector_tile.decode(data), decode(data))
+
+    def test_layers_are_iterated_lazily(self):
+        layers = iter_layers(self._get_data())
+        first_layer = next(layers)
+        self.assertTrue(first_layer.name)
+        self.assertEqual(4096, first_layer.extent)
+        self.assertGreater(len(first_layer), 0)
+        self.assertEqual(len(first_layer), len(list(first_layer.features())))
+
+    def test_values(self):
+        values = [
+            _message(1, "Zürich".encode("utf-8")),
+            _field(4, 0, _varint((1 << 64) - 3)),
+            _field(6, 0, _varint(5)),
+            _field(3, 1, struct.pack("<d", 408.5)),
+        ]
+        tile = decode(_layer(values))
+        layer = tile["poi"]
+        self.assertEqual(2, layer["version"])
+        feature = layer["features"][0]
+        self.assertEqual(42, feature["id"])
+        self.assertEqual(POINT, feature["type"])
+        self.assertEqual([[25, 4096 - 17]], feature["geometry"])
+        self.assertEqual({"name": "Zürich", "rank": -3, "offset": -3, "height": 408.5}, feature["properties"])
+
+    def test_unknown_fields_are_skipped(self):
+        values = [_message(1, b"a"), _field(5, 0, _varint(1)), _field(7, 0, _varint(1)), _field(2, 5, b"\0\0\0\0")]
+        unknown_fields = _field(9, 0, _varint(300)) + _message(10, b"ignored") + _field(11, 1, b"\0" * 8)
+        tile = decode(_layer(values, extra_fields=unknown_fields))
+        properties = tile["poi"]["features"][0]["properties"]
+        self.assertEqual({"name": "a", "rank": 1, "offset": True, "height": 0.0}, properties)
+
+    def test_truncated_data(self):
+        with self.assertRaises(RuntimeError):
+            decode(self._get_data()[:1000])
+
+    def test_polygon_with_hole(self):
+        polygon = decode_geometry(_POLYGON_WITH_HOLE, POLYGON, 10, y_coord_down=True)
+        self.assertEqual(2, len(polygon))
+        self.assertEqual([[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], polygon[0])
+        self.assertEqual([[4, 3], [4, 5], [6, 5], [6, 3], [4, 3]], polygon[1])
+
+    @unittest.skipIf(not numpy_supported(), "numpy is not available")
+    def test_vectorized_same_as_scalar(self):
+        data = self._get_data()
+        for y_coord_down in [False, True]:
+            self.assertEqual(
+                decode(data, y_coord_down, vectorized=False), decode(data, y_coord_down, vectorized=True)
+            )
+
+    @unittest.skipIf(not numpy_supported(), "numpy is not available")
+    def test_vectorized_geometries_same_as_scalar(self):
+        geometries = [
+            ([9, 50, 34, 9, 2, 2], POINT),
+            ([17, 10, 14, 3, 9], POINT),
+            ([9, 4, 4, 18, 0, 16, 16, 0], LINESTRING),
+            ([9, 4, 4, 10, 2, 2, 9, 10, 10, 10, 4, 4], LINESTRING),
+            ([9, 4, 4, 10, 2, 2, 15, 9, 10, 10, 10, 4, 4], LINESTRING),
+            ([], LINESTRING),
+            (_POLYGON_WITH_HOLE, POLYGON),
+            # two polygons, the second ring isn't closed by a ClosePath
+            ([9, 0, 0, 26, 20, 0, 0, 20, 19, 0, 15, 9, 40, 0, 26, 20, 0, 0, 20, 19, 0], POLYGON),
+            # a ring without an area is skipped, the last point of a ring is the same as the first
+            ([9, 0, 0, 10, 20, 0, 15, 9, 0, 0, 26, 20, 0, 0, 20, 19, 0, 15], POLYGON),
+            ([15], POLYGON),
+        ]
+        buffers = [[_packed_geometry(g)] for g, _ in geometries]
+        geometry_types = [t for _, t in geometries]
+        for y_coord_down in [False, True]:
+            expected = [decode_geometry(g, t, 30, y_coord_down) for g, t in geometries]
+            self.assertEqual(expected, decode_geometries(buffers, geometry_types, 30, y_coord_down))
+        self.assertEqual([], decode_geometries([], [], 30))
+
+    @unittest.skipIf(not numpy_supported(), "numpy is not available")
+    def test_geometry_arrays(self):
+        geometries = [[_packed_geometry([9, 50, 34])], [_packed_geometry(_POLYGON_WITH_HOLE)]]
+        arrays = decode_geometry_arrays(geometries, [POINT, POLYGON], 10, y_coord_down=True)
+        self.assertEqual([[25, 17], [0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], arrays.coordinates[:6].tolist())
+        self.assertEqual([0, 1, 6, 11, 11], arrays.part_offsets.tolist())
+        self.assertEqual([0, 1, 4], arrays.feature_offsets.tolist())
+        self.assertEqual([1, -1], arrays.area_signs[1:3].tolist())
+
+    @unittest.skipIf(not numpy_supported(), "numpy is not available")
+    def test_vectorized_truncated_geometry(self):
+        geometries = [[_packed_geometry([9, 50])], [_packed_geometry([9, 50, 34])]]
+        with self.assertRaises(RuntimeError):
+            decode_geometries(geometries, [POINT, POINT], 4096)
+        with self.assertRaises(RuntimeError):
+            decode_geometries([[memoryview(b"\x09\xb2")]], [POINT], 4096)
+
+
+def suite():
+    suite = unittest.makeSuite(MvtParserTests, "test")
+    return suite
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
@@ -1,5 +1,23 @@
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QCoreApplication, QUrl
 from qgis.testing import unittest
-from plugin.util.network_helper import url_exists
+from plugin.util.network_helper import (
+    HostStats,
+    HttpResponse,
+    InFlightRegistry,
+    TileRequestScheduler,
+    get_conditional_headers,
+    http_get,
+    load_tiles_async,
+    parse_cache_headers,
+    parse_retry_after,
+    url_exists,
+)
+
+_TILE_URL = QUrl.fromLocalFile(os.path.join(os.path.dirname(__file__), "data", "uster.pbf")).toString()
 
 
 class NetworkHelperTests(unittest.TestCase):
@@ -23,3 +41,188 @@ class NetworkHelperTests(unittest.TestCase):
     def test_url_exists_not(self):
         exists, error, _ = url_exists("https://traaadsfadsfadssfdsfdsfdsvis-ci.org/")
         self.assertFalse(exists)
+
+    def test_http_get_timeout(self):
+        # a non-routable address, the connection attempt doesn't return before the timeout
+        status, content = http_get("http://10.255.255.1/tiles.json", timeout_ms=100)
+        self.assertIsNone(status)
+        self.assertTrue(content.startswith("Request failed"))
+
+    def test_load_tiles_async(self):
+        urls = [(_TILE_URL, col, 1) for col in range(5)]
+        progress = []
+        results = list(load_tiles_async(urls, on_progress_changed=progress.append, max_requests_per_host=2))
+        self.assertEqual(5, len(results))
+        self.assertEqual(set(range(5)), {coord[0] for coord, _ in results})
+        self.assertTrue(all(data for _, data in results))
+        self.assertEqual([1, 2, 3, 4, 5], progress)
+
+    def test_load_tiles_async_cancelled(self):
+        urls = [(_TILE_URL, col, 1) for col in range(5)]
+        results = list(load_tiles_async(urls, cancelling_func=lambda: True))
+        self.assertEqual(0, len(results))
+
+    def test_scheduler_limits_requests_per_host(self):
+        scheduler = TileRequestScheduler(max_requests_per_host=2)
+        for i in range(5):
+            scheduler.add(_TILE_URL, i)
+        self.assertEqual(2, scheduler.in_flight())
+        keys = []
+        for key, response in scheduler.results():
+            self.assertLessEqual(scheduler.in_flight(), 2)
+            self.assertTrue(response.content)
+            keys.append(key)
+        self.assertEqual(list(range(5)), sorted(keys))
+
+    def test_parse_cache_headers_max_age(self):
+        headers = {"cache-control": "public, max-age=3600", "age": "600", "etag": '"abc"'}
+        cache_headers = parse_cache_headers(headers, now=1000)
+        self.assertEqual({"etag": '"abc"', "last_modified": None, "expires": 4000}, cache_headers)
+
+    def test_parse_cache_headers_expires(self):
+        headers = {
+            "date": "Sun, 06 Nov 1994 08:49:37 GMT",
+            "expires": "Sun, 06 Nov 1994 09:49:37 GMT",
+            "last-modified": "Sat, 05 Nov 1994 08:49:37 GMT",
+        }
+        cache_headers = parse_cache_headers(headers, now=1000)
+        self.assertEqual(4600, cache_headers["expires"])
+        self.assertEqual("Sat, 05 Nov 1994 08:49:37 GMT", cache_headers["last_modified"])
+
+    def test_parse_cache_headers_no_cache(self):
+        cache_headers = parse_cache_headers({"cache-control": "no-cache", "etag": '"abc"'}, now=1000)
+        self.assertEqual(1000, cache_headers["expires"])
+
+    def test_parse_cache_headers_no_store(self):
+        self.assertEqual({}, parse_cache_headers({"cache-control": "no-store", "etag": '"abc"'}))
+
+    def test_parse_cache_headers_without_headers(self):
+        self.assertEqual({}, parse_cache_headers({}))
+
+    def test_get_conditional_headers(self):
+        validators = {"etag": '"abc"', "last_modified": "Sat, 05 Nov 1994 08:49:37 GMT", "expires": 0}
+        headers = get_conditional_headers(validators)
+        self.assertEqual({"If-None-Match": '"abc"', "If-Modified-Since": "Sat, 05 Nov 1994 08:49:37 GMT"}, headers)
+        self.assertIsNone(get_conditional_headers({"etag": None, "last_modified": None, "expires": 0}))
+
+    def test_host_stats_latency(self):
+        stats = HostStats()
+        stats.add_response(latency=1.0, failed=False)
+        stats.add_response(latency=2.0, failed=False)
+        self.assertAlmostEqual(1.2, stats.latency)
+        self.assertEqual(2, stats.nr_of_requests)
+
+    def test_host_stats_skipped_after_errors(self):
+        stats = HostStats()
+        for _ in range(HostStats.max_consecutive_errors - 1):
+            stats.add_response(latency=1.0, failed=True)
+        self.assertTrue(stats.is_available())
+        stats.add_response(latency=1.0, failed=True)
+        self.assertFalse(stats.is_available())
+        self.assertEqual(HostStats.max_consecutive_errors, stats.nr_of_errors)
+
+    def test_host_stats_shared_by_threads(self):
+        stats = HostStats()
+
+        def add_responses():
+            for _ in range(1000):
+                stats.add_response(latency=1.0, failed=False, throttled=True, max_requests=4)
+                stats.get_request_limit(4)
+
+        threads = [threading.Thread(target=add_responses) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(4000, stats.nr_of_requests)
+        self.assertEqual(4000, stats.nr_of_throttled)
+
+    def test_scheduler_reprioritize(self):
+        scheduler = TileRequestScheduler(max_requests_per_host=1)
+        for i in range(5):
+            scheduler.add(_TILE_URL, i, priority=i)
+        dropped = scheduler.reprioritize(lambda key: None if key in (1, 2) else -key)
+        self.assertEqual(2, dropped)
+        keys = []
+        for key, _ in scheduler.results():
+            keys.append(key)
+        self.assertEqual([0, 4, 3], keys)
+
+    def test_scheduler_attaches_to_requests_in_flight(self):
+        registry = InFlightRegistry()
+        first = TileRequestScheduler(in_flight_registry=registry)
+        second = TileRequestScheduler(in_flight_registry=registry)
+        first.add(_TILE_URL, "first")
+        second.add(_TILE_URL, "second")
+        self.assertEqual(1, first.in_flight())
+        self.assertEqual(0, second.in_flight())
+        self.assertEqual(1, second.attached())
+        self.assertEqual(["first"], [key for key, _ in first.results()])
+        results = list(second.results())
+        self.assertEqual(["second"], [key for key, _ in results])
+        self.assertTrue(results[0][1].content)
+
+    def test_scheduler_passes_on_late_responses(self):
+        late_keys = []
+        scheduler = TileRequestScheduler(
+            in_flight_registry=InFlightRegistry(), on_late_response=lambda key, response: late_keys.append(key)
+        )
+        scheduler.add(_TILE_URL, "late")
+        self.assertEqual([], list(scheduler.results(cancelling_func=lambda: True)))
+        deadline = time.monotonic() + 5
+        while not late_keys and time.monotonic() < deadline:
+            QCoreApplication.processEvents()
+        self.assertEqual(["late"], late_keys)
+
+    def test_in_flight_registry_attach(self):
+        registry = InFlightRegistry()
+        responses = []
+        shared = registry.register(["http://a/1", "http://b/1"], headers=None)
+        self.assertIsNone(registry.attach(["http://a/2"], None, responses.append))
+        self.assertIsNone(registry.attach(["http://b/1"], {"If-None-Match": '"abc"'}, responses.append))
+        self.assertIs(shared, registry.attach(["http://b/1"], None, responses.append))
+        response = HttpResponse("http://a/1", 200, content=b"data")
+        registry.publish(shared, response)
+        self.assertEqual([response], responses)
+        self.assertEqual(0, registry.in_flight())
+        self.assertEqual(0, registry.kept_responses())
+
+    def test_in_flight_registry_detach(self):
+        registry = InFlightRegistry()
+        responses = []
+        shared = registry.register(["http://a/1"], headers=None)
+        registry.attach(["http://a/1"], None, responses.append)
+        registry.detach(shared, responses.append)
+        registry.publish(shared, None)
+        self.assertEqual([], responses)
+
+    def test_in_flight_registry_keeps_late_responses(self):
+        registry = InFlightRegistry()
+        shared = registry.register(["http://a/1"], headers=None)
+        registry.publish(shared, HttpResponse("http://a/1", None, error="Connection refused"), keep=True)
+        self.assertEqual(0, registry.kept_responses())
+
+        shared = registry.register(["http://a/1"], headers=None)
+        response = HttpResponse("http://a/1", 200, content=b"data")
+        registry.publish(shared, response, keep=True)
+        self.assertEqual(1, registry.kept_responses())
+        responses = []
+        self.assertIsNotNone(registry.attach(["http://a/1"], None, responses.append))
+        self.assertEqual([response], responses)
+        self.assertEqual(0, registry.kept_responses())
+
+    def test_host_stats_throttled(self):
+        stats = HostStats()
+        self.assertEqual(8, stats.get_request_limit(8))
+        stats.add_response(latency=1.0, failed=True, throttled=True, retry_after=60, max_requests=8)
+        self.assertEqual(4, stats.get_request_limit(8))
+        self.assertFalse(stats.is_available())
+        for _ in range(5):
+            stats.add_response(latency=1.0, failed=False)
+        self.assertEqual(5, stats.get_request_limit(8))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(120, parse_retry_after("120"))
+        self.assertEqual(30, parse_retry_after("Sun, 06 Nov 1994 08:50:07 GMT", now=784111777))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
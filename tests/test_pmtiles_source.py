@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import gzip
+import json
+import os
+import struct
+import sys
+import tempfile
+
+from qgis.testing import unittest
+
+from plugin.util.pmtiles import coalesce_ranges, zxy_to_tile_id
+from plugin.util.tile_source import PMTilesSource
+
+
+class PMTilesSourceTests(unittest.TestCase):
+    """
+    Tests for PMTilesSource
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        tiles = {(1, 0, 0): b"land", (1, 0, 1): b"ocean", (1, 1, 1): b"ocean", (1, 1, 0): b"ocean", (2, 1, 1): b"z2"}
+        cls.path = _create_pmtiles(tiles)
+
+    def test_tile_ids(self):
+        tiles = [(0, 0, 0), (1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0), (2, 0, 0)]
+        self.assertEqual([0, 1, 2, 3, 4, 5], [zxy_to_tile_id(*t) for t in tiles])
+
+    def test_coalesce_ranges(self):
+        reads = coalesce_ranges([(0, 10), (10, 5), (100, 5), (10, 5)], max_gap=20, max_size=1000)
+        self.assertEqual([(0, 15, [(0, 10), (10, 5)]), (100, 5, [(100, 5)])], reads)
+
+    def test_metadata(self):
+        src = PMTilesSource(self.path)
+        self.assertEqual(1, src.min_zoom())
+        self.assertEqual(2, src.max_zoom())
+        self.assertEqual("xyz", src.scheme())
+        self.assertEqual([{"id": "water"}], src.vector_layers())
+        self.assertEqual("test", src.name())
+        src.close_connection()
+
+    def test_load_tiles(self):
+        src = PMTilesSource(self.path)
+        tiles = src.load_tiles(1, tiles_to_load=[(0, 0), (0, 1), (1, 0), (1, 1), (5, 5)])
+        data_by_coord = {t.coord(): data for t, data in tiles}
+        self.assertEqual({(0, 0): b"land", (0, 1): b"ocean", (1, 0): b"ocean", (1, 1): b"ocean"}, data_by_coord)
+        ocean_keys = set(t.content_key for t, data in tiles if data == b"ocean")
+        self.assertEqual(1, len(ocean_keys))
+        src.close_connection()
+
+    def test_load_tiles_with_limit(self):
+        src = PMTilesSource(self.path)
+        tiles = src.load_tiles(1, tiles_to_load=[(0, 0), (0, 1), (1, 0), (1, 1)], max_tiles=2)
+        self.assertEqual(2, len(tiles))
+        src.close_connection()
+
+    def test_non_pmtiles(self):
+        with self.assertRaises(RuntimeError):
+            PMTilesSource(os.path.join(os.path.dirname(__file__), "data", "textfile.txt"))
+
+
+def _varint(value):
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7F) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def _create_pmtiles(tiles):
+    """
+     * Writes a PMTiles archive with a single gzipped root directory. Consecutive tiles with the same content
+       are run-length encoded.
+    """
+    entries = []
+    tile_data = bytearray()
+    offsets_by_content = {}
+    for tile_id, content in sorted((zxy_to_tile_id(*k), v) for k, v in tiles.items()):
+        if entries and entries[-1][0] + entries[-1][1] == tile_id and _get_content(entries[-1], tile_data) == content:
+            entries[-1][1] += 1
+            continue
+        if content not in offsets_by_content:
+            offsets_by_content[content] = len(tile_data)
+            tile_data.extend(content)
+        entries.append([tile_id, 1, offsets_by_content[content], len(content)])
+
+    directory = bytearray(_varint(len(entries)))
+    last_id = 0
+    for e in entries:
+        directory += _varint(e[0] - last_id)
+        last_id = e[0]
+    for e in entries:
+        directory += _varint(e[1])
+    for e in entries:
+        directory += _varint(e[3])
+    for e in entries:
+        directory += _varint(e[2] + 1)
+    directory = gzip.compress(bytes(directory))
+    metadata = gzip.compress(json.dumps({"name": "test", "vector_layers": [{"id": "water"}]}).encode())
+
+    root_offset = 127
+    metadata_offset = root_offset + len(directory)
+    tile_data_offset = metadata_offset + len(metadata)
+    header = struct.pack(
+        "<7sBQQQQQQQQQQQBBBBBBiiiiBii",
+        b"PMTiles",
+        3,
+        root_offset,
+        len(directory),
+        metadata_offset,
+        len(metadata),
+        tile_data_offset,
+        0,
+        tile_data_offset,
+        len(tile_data),
+        len(tiles),
+        len(entries),
+        len(offsets_by_content),
+        1,
+        2,
+        1,
+        1,
+        1,
+        2,
+        -1800000000,
+        -850000000,
+        1800000000,
+        850000000,
+        1,
+        0,
+        0,
+    )
+    path = os.path.join(tempfile.gettempdir(), "vtr_test.pmtiles")
+    with open(path, "wb") as f:
+        f.write(header + directory + metadata + bytes(tile_data))
+    return path
+
+
+def _get_content(entry, tile_data):
+    return bytes(tile_data[entry[2] : entry[2] + entry[3]])
+
+
+def suite():
+    s = unittest.makeSuite(PMTilesSourceTests, "test")
+    return s
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+import copy
+import os
+import sys
+
+from qgis.testing import unittest
+
+from plugin.util.connection import POSTGIS_CONNECTION_TEMPLATE
+from plugin.util.postgis_helper import postgis_supported
+from plugin.util.tile_source import PostGISSource
+
+_HOST = os.environ.get("VTR_POSTGIS_HOST")
+
+
+def _create_connection():
+    connection = copy.deepcopy(POSTGIS_CONNECTION_TEMPLATE)
+    connection["name"] = "postgis_test"
+    connection["host"] = _HOST
+    connection["port"] = os.environ.get("VTR_POSTGIS_PORT", 5432)
+    connection["username"] = os.environ.get("VTR_POSTGIS_USER", "postgres")
+    connection["password"] = os.environ.get("VTR_POSTGIS_PASSWORD")
+    connection["database"] = os.environ.get("VTR_POSTGIS_DATABASE", "postgres")
+    return connection
+
+
+@unittest.skipUnless(postgis_supported() and _HOST, "requires psycopg2 and a PostGIS database (VTR_POSTGIS_HOST)")
+class PostGISSourceTests(unittest.TestCase):
+    """
+    Tests for PostGISSource. A table 'vtr_test_points' is created in the database specified by
+    the environment variables VTR_POSTGIS_HOST, VTR_POSTGIS_PORT, VTR_POSTGIS_USER, VTR_POSTGIS_PASSWORD
+    and VTR_POSTGIS_DATABASE.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        import psycopg2
+
+        connection = _create_connection()
+        cls.conn = psycopg2.connect(
+            host=connection["host"],
+            port=connection["port"],
+            user=connection["username"],
+            password=connection["password"],
+            dbname=connection["database"],
+        )
+        with cls.conn, cls.conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+            cur.execute("DROP TABLE IF EXISTS vtr_test_points")
+            cur.execute("CREATE TABLE vtr_test_points (id integer, name text, geom geometry(Point, 4326))")
+            cur.execute(
+                """INSERT INTO vtr_test_points VALUES
+                (1, 'uster', ST_SetSRID(ST_MakePoint(8.72, 47.35), 4326)),
+                (2, 'sydney', ST_SetSRID(ST_MakePoint(151.2, -33.86), 4326)),
+                (3, 'edge', ST_SetSRID(ST_MakePoint(11.26, 47.35), 4326))"""
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.conn, cls.conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS vtr_test_points")
+        cls.conn.close()
+
+    def test_vector_layers(self):
+        src = PostGISSource(_create_connection())
+        layers = {layer["id"]: layer for layer in src.vector_layers()}
+        self.assertIn("vtr_test_points", layers)
+        self.assertEqual({"id": "Number", "name": "String"}, layers["vtr_test_points"]["fields"])
+        src.close_connection()
+
+    def test_zoom_range_default(self):
+        src = PostGISSource(_create_connection())
+        self.assertEqual(0, src.min_zoom())
+        self.assertEqual(14, src.max_zoom())
+        src.close_connection()
+
+    def test_zoom_range_from_connection(self):
+        connection = _create_connection()
+        connection["min_zoom"] = 2
+        connection["max_zoom"] = 16
+        src = PostGISSource(connection)
+        self.assertEqual(2, src.min_zoom())
+        self.assertEqual(16, src.max_zoom())
+        src.close_connection()
+
+    def test_zoom_range_from_table_comment(self):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("""COMMENT ON TABLE vtr_test_points IS '{"minzoom": 3, "maxzoom": 12}'""")
+        try:
+            src = PostGISSource(_create_connection())
+            layers = {layer["id"]: layer for layer in src.vector_layers()}
+            self.assertEqual(3, layers["vtr_test_points"]["minzoom"])
+            self.assertEqual(12, layers["vtr_test_points"]["maxzoom"])
+            tiles = src.load_tiles(1, tiles_to_load=[(0, 0), (1, 0), (0, 1), (1, 1)])
+            self.assertEqual([], tiles)
+            src.close_connection()
+        finally:
+            with self.conn, self.conn.cursor() as cur:
+                cur.execute("COMMENT ON TABLE vtr_test_points IS NULL")
+
+    def test_load_tiles(self):
+        src = PostGISSource(_create_connection())
+        tiles = src.load_tiles(1, tiles_to_load=[(0, 0), (1, 0), (0, 1), (1, 1)])
+        self.assertEqual([(1, 0), (1, 1)], sorted(t.coord() for t, data in tiles))
+        src.close_connection()
+
+    def test_load_tiles_with_limit(self):
+        src = PostGISSource(_create_connection())
+        tiles = src.load_tiles(1, tiles_to_load=[(0, 0), (1, 0), (0, 1), (1, 1)], max_tiles=1)
+        self.assertLessEqual(len(tiles), 1)
+        src.close_connection()
+
+    def test_load_tiles_with_feature_in_buffer(self):
+        src = PostGISSource(_create_connection())
+        tiles = src.load_tiles(5, tiles_to_load=[(16, 11)])
+        self.assertEqual([(16, 11)], [t.coord() for t, data in tiles])
+        src.close_connection()
+
+
+def suite():
+    s = unittest.makeSuite(PostGISSourceTests, "test")
+    return s
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
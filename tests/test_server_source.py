@@ -30,13 +30,53 @@ class ServerSourceTests(unittest.TestCase):
 
     @mock.patch("plugin.util.tile_source.TileJSON")
     @mock.patch("plugin.util.tile_source.load_tiles_async", return_value=[((1, 2), "data")])
-    @mock.patch("plugin.util.tile_source.url_exists", return_value=(True, None, "https://localhost"))
-    def test_load(self, mock_url_exists, mock_load_tiles_async, mock_tile_json):
+    def test_load(self, mock_load_tiles_async, mock_tile_json):
         src = ServerSource("https://localhost")
-        mock_url_exists.assert_called_with("https://localhost")
+        mock_tile_json.assert_called_with("https://localhost")
         tiles = src.load_tiles(14, [(1, 1)])
         self.assertEqual(1, len(tiles))
 
+    @mock.patch("plugin.util.tile_source.TileJSON")
+    @mock.patch("plugin.util.tile_source.load_tiles_async", return_value=[((1, 2), "data")])
+    def test_load_from_all_url_templates(self, mock_load_tiles_async, mock_tile_json):
+        mock_tile_json.return_value.tiles.return_value = [
+            "https://{s}.tiles.example.com/{z}/{x}/{y}.pbf",
+            "https://cdn.example.org/{z}/{x}/{y}.pbf",
+        ]
+        mock_tile_json.return_value.subdomains.return_value = None
+        src = ServerSource("https://localhost")
+        src.load_tiles(14, [(1, 2)])
+        urls = mock_load_tiles_async.call_args[1]["urls_with_col_and_row"]
+        expected_urls = [
+            "https://a.tiles.example.com/14/1/2.pbf",
+            "https://b.tiles.example.com/14/1/2.pbf",
+            "https://c.tiles.example.com/14/1/2.pbf",
+            "https://d.tiles.example.com/14/1/2.pbf",
+            "https://cdn.example.org/14/1/2.pbf",
+        ]
+        self.assertEqual([(expected_urls, 1, 2)], urls)
+
+    @mock.patch("plugin.util.tile_source.TileJSON")
+    @mock.patch("plugin.util.tile_source.load_tiles_async", return_value=[((1, 2), "data")])
+    def test_load_with_subdomains_of_tilejson(self, mock_load_tiles_async, mock_tile_json):
+        mock_tile_json.return_value.tiles.return_value = ["https://{s}.tiles.example.com/{z}/{x}/{y}.pbf"]
+        mock_tile_json.return_value.subdomains.return_value = ["t1", "t2"]
+        src = ServerSource("https://localhost")
+        src.load_tiles(14, [(1, 2)])
+        urls = mock_load_tiles_async.call_args[1]["urls_with_col_and_row"]
+        expected_urls = ["https://t1.tiles.example.com/14/1/2.pbf", "https://t2.tiles.example.com/14/1/2.pbf"]
+        self.assertEqual([(expected_urls, 1, 2)], urls)
+
+    @mock.patch("plugin.util.tile_source.TileJSON")
+    @mock.patch("plugin.util.tile_source.load_tiles_async", return_value=[((1, 2), "data")])
+    def test_load_with_subdomains_of_connection(self, mock_load_tiles_async, mock_tile_json):
+        mock_tile_json.return_value.tiles.return_value = ["https://{s}.tiles.example.com/{z}/{x}/{y}.pbf"]
+        mock_tile_json.return_value.subdomains.return_value = ["t1", "t2"]
+        src = ServerSource("https://localhost", subdomains=["x"])
+        src.load_tiles(14, [(1, 2)])
+        urls = mock_load_tiles_async.call_args[1]["urls_with_col_and_row"]
+        self.assertEqual([(["https://x.tiles.example.com/14/1/2.pbf"], 1, 2)], urls)
+
 
 def suite():
     s = unittest.makeSuite(ServerSourceTests, "test")
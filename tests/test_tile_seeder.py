@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# This code is licensed under the GPL 2.0 license.
+#
+from qgis.testing import unittest
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import mock
+from plugin.util.tile_helper import VectorTile
+from plugin.util.tile_seeder import TileSeeder
+from plugin.util.tile_source import MBTilesSource
+
+_EXTENT = (8.70, 47.33, 8.74, 47.36)
+
+
+class TileSeederTests(unittest.TestCase):
+    """
+    Tests for TileSeeder
+    """
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, "seeded.mbtiles")
+        with open(os.path.join(os.path.dirname(__file__), "data", "uster.pbf"), "rb") as f:
+            self._data = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def _create_source(self, scheme="xyz"):
+        source = mock.MagicMock()
+        source.min_zoom.return_value = 0
+        source.max_zoom.return_value = 14
+        source.scheme.return_value = scheme
+        source.name.return_value = "seeded"
+        source.attribution.return_value = "attribution"
+        source.crs.return_value = "EPSG:3857"
+        source.vector_layers.return_value = [{"id": "water"}]
+
+        def iter_tiles(zoom_level, tiles_to_load, max_tiles=None):
+            for col, row in tiles_to_load:
+                yield VectorTile(scheme, zoom_level, col, row), self._data
+
+        source.iter_tiles.side_effect = iter_tiles
+        return source
+
+    def _get_tiles(self):
+        with sqlite3.connect(self._path) as conn:
+            return conn.execute("SELECT zoom_level, tile_column, tile_row FROM tiles").fetchall()
+
+    def test_seed(self):
+        seeder = TileSeeder(self._create_source(), self._path)
+        nr_written = seeder.seed(_EXTENT, min_zoom=12, max_zoom=13)
+        tiles = self._get_tiles()
+        self.assertEqual(nr_written, len(tiles))
+        self.assertEqual({12, 13}, {t[0] for t in tiles})
+        # the rows are stored in the TMS scheme
+        self.assertIn((12, 2146, 2661), tiles)
+
+    def test_seed_resume(self):
+        source = self._create_source()
+        TileSeeder(source, self._path).seed(_EXTENT, min_zoom=12, max_zoom=12)
+        nr_of_tiles = len(self._get_tiles())
+        nr_written = TileSeeder(source, self._path).seed(_EXTENT, min_zoom=12, max_zoom=13)
+        self.assertEqual(len(self._get_tiles()) - nr_of_tiles, nr_written)
+        requested_zoom_levels = [c[1]["zoom_level"] for c in source.iter_tiles.call_args_list]
+        self.assertEqual([12, 13], requested_zoom_levels)
+
+    def test_seed_in_batches(self):
+        seeder = TileSeeder(self._create_source(), self._path)
+        seeder.batch_size = 2
+        seeder.chunk_size = 3
+        nr_written = seeder.seed(_EXTENT, min_zoom=13, max_zoom=13)
+        self.assertEqual(nr_written, len(self._get_tiles()))
+
+    def test_seeded_file_can_be_opened(self):
+        TileSeeder(self._create_source(), self._path).seed(_EXTENT, min_zoom=12, max_zoom=13)
+        src = MBTilesSource(self._path)
+        self.assertEqual("tms", src.scheme())
+        self.assertEqual(12, src.min_zoom())
+        self.assertEqual(13, src.max_zoom())
+        self.assertEqual([{"id": "water"}], src.vector_layers())
+        tiles = src.load_tiles(12, [(2146, 2661)])
+        self.assertEqual(1, len(tiles))
+        src.close_connection()
+
+    def test_zoom_levels_outside_of_source(self):
+        seeder = TileSeeder(self._create_source(), self._path)
+        with self.assertRaises(RuntimeError):
+            seeder.seed(_EXTENT, min_zoom=15, max_zoom=16)
+
+
+def suite():
+    suite = unittest.makeSuite(TileSeederTests, "test")
+    return suite
+
+
+# run all tests using unittest skipping nose or testplugin
+def run_all():
+    unittest.TextTestRunner(verbosity=3, stream=sys.stdout).run(suite())
+
+
+if __name__ == "__main__":
+    run_all()
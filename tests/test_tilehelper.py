@@ -11,6 +11,7 @@ from plugin.util.tile_helper import (
     get_code_from_epsg,
     get_tile_bounds,
     get_tiles_from_center,
+    get_center_distance,
 )
 import itertools
 
@@ -113,6 +114,12 @@ class TileHelperTests(unittest.TestCase):
         tiles_equal = center_tiles_equal(tile_limit=tile_limit, extent_a=extent_a, extent_b=extent_b)
         self.assertTrue(tiles_equal)
 
+    def test_center_distance(self):
+        bounds = Bounds(y_min=2, y_max=4, zoom=3, x_max=4, x_min=2, scheme="xyz")
+        self.assertEqual(0, get_center_distance((3, 3), bounds))
+        self.assertEqual(2, get_center_distance((2, 4), bounds))
+        self.assertIsNone(get_center_distance((5, 3), bounds))
+
 
 def suite():
     s = unittest.makeSuite(TileHelperTests, "test")
@@ -1,6 +1,9 @@
 from qgis.testing import unittest
+import json
+import mock
+from plugin.util.network_helper import HttpResponse
 from plugin.util.tile_helper import get_tile_bounds, tile_to_latlon, WORLD_BOUNDS
-from plugin.util.tile_json import TileJSON
+from plugin.util.tile_json import TileJSON, TileJSONCache
 
 
 class TileJsonTests(unittest.TestCase):
@@ -89,6 +92,51 @@ class TileJsonTests(unittest.TestCase):
         world_bounds_tile = get_tile_bounds(zoom=14, source_crs=4326, scheme="xyz", extent=WORLD_BOUNDS)
         self.assertEqual(world_bounds_tile, b)
 
+    def test_subdomains(self):
+        self.assertIsNone(_get_loaded({"scheme": "xyz"}).subdomains())
+        self.assertEqual(["t1", "t2"], _get_loaded({"subdomains": ["t1", "t2"]}).subdomains())
+        self.assertEqual(["a", "b", "c"], _get_loaded({"subdomains": "abc"}).subdomains())
+
+    @mock.patch("plugin.util.tile_json.http_get_response")
+    def test_cache_shares_request(self, mock_get):
+        mock_get.return_value = _get_response(200)
+        cache = TileJSONCache()
+        first = cache.get("https://localhost/tiles.json")
+        second = cache.get("https://localhost/tiles.json")
+        self.assertIs(first, second)
+        self.assertEqual(1, mock_get.call_count)
+
+    @mock.patch("plugin.util.tile_json.http_get_response")
+    def test_cache_revalidates_expired_entries(self, mock_get):
+        response = _get_response(200, cache_headers={"etag": '"abc"', "last_modified": None, "expires": None})
+        mock_get.return_value = response
+        cache = TileJSONCache()
+        cache.ttl_seconds = 0
+        cache.get("https://localhost/tiles.json")
+        mock_get.return_value = _get_response(304)
+        self.assertIs(response, cache.get("https://localhost/tiles.json"))
+        self.assertEqual({"If-None-Match": '"abc"'}, mock_get.call_args[1]["headers"])
+
+    @mock.patch("plugin.util.tile_json.http_get_response")
+    def test_cache_does_not_cache_errors(self, mock_get):
+        mock_get.return_value = HttpResponse("https://localhost/tiles.json", None, error="Connection refused")
+        cache = TileJSONCache()
+        self.assertEqual("Connection refused", cache.get("https://localhost/tiles.json").error)
+        cache.get("https://localhost/tiles.json")
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch("plugin.util.tile_json.http_get_response")
+    def test_load_error(self, mock_get):
+        mock_get.return_value = HttpResponse("https://localhost/missing.json", 404, error="Not found")
+        tj = TileJSON("https://localhost/missing.json")
+        self.assertFalse(tj.load())
+        self.assertEqual("Loading error: Resource not found.\n\nURL incorrect?", tj.error)
+
+
+def _get_response(status, cache_headers=None):
+    content = json.dumps(_get_test_tilejson()).encode("utf-8") if status == 200 else None
+    return HttpResponse("https://localhost/tiles.json", status, content=content, cache_headers=cache_headers or {})
+
 
 def _get_loaded(json=None):
     tj = TileJSON("")
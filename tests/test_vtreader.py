@@ -8,14 +8,17 @@ from qgis.utils import iface  # noqa # dont remove! is required for testing (ifa
 from plugin.vt_reader import VtReader
 from plugin.util.connection import MBTILES_CONNECTION_TEMPLATE
 import copy
+import json
 import mock
 import shutil
 from osgeo import gdal
-from plugin.util.file_helper import clear_cache, get_style_folder
-from plugin.util.tile_helper import Bounds
-from qgis.core import QgsProject
+from plugin.util.file_helper import clear_cache, get_cache_entry, get_style_folder
+from plugin.util.tile_helper import Bounds, VectorTile
+from qgis.core import QgsProject, QgsVectorLayer
 from PyQt5.QtWidgets import QApplication
 import os
+import struct
+import tempfile
 import time
 
 
@@ -161,6 +164,87 @@ class VtReaderTests(unittest.TestCase):
         mock_info.assert_any_call("Native decoding not supported. ({}, {}bit)", "Linux", "64")
         mock_info.assert_any_call("Import complete")
 
+    def test_get_windows(self):
+        windows = list(VtReader._get_windows(range(7), window_size=3))
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], windows)
+
+    def test_get_windows_with_max_duration(self):
+        def slow_range():
+            for i in range(4):
+                time.sleep(0.02)
+                yield i
+
+        windows = list(VtReader._get_windows(slow_range(), window_size=10, max_window_duration_ms=1))
+        self.assertEqual([[0], [1], [2], [3]], windows)
+
+    @mock.patch.object(VtReader, "_create_qgis_layers")
+    def test_progressive_update_interval_backed_off(self, mock_create_layers):
+        conn = copy.deepcopy(MBTILES_CONNECTION_TEMPLATE)
+        conn["path"] = os.path.join(os.path.dirname(__file__), "..", "sample_data", "uster_zh.mbtiles")
+        reader = VtReader(iface=iface, connection=conn)
+        reader.set_options(progressive_update_interval_ms=10)
+        mock_create_layers.side_effect = lambda **kwargs: time.sleep(0.05)
+        reader._update_layers_progressively(force=True)
+        self.assertEqual(1, mock_create_layers.call_count)
+        time.sleep(0.02)
+        reader._update_layers_progressively()
+        self.assertEqual(1, mock_create_layers.call_count)
+        time.sleep(0.3)
+        reader._update_layers_progressively()
+        self.assertEqual(2, mock_create_layers.call_count)
+
+    def test_late_tile_cached(self):
+        clear_cache()
+        conn = copy.deepcopy(MBTILES_CONNECTION_TEMPLATE)
+        conn["path"] = os.path.join(os.path.dirname(__file__), "..", "sample_data", "uster_zh.mbtiles")
+        reader = VtReader(iface=iface, connection=conn)
+        with open(os.path.join(os.path.dirname(__file__), "data", "uster.pbf"), "rb") as f:
+            data = f.read()
+        tile = VectorTile("xyz", 14, 8568, 5747)
+        tile.cache_headers = {"etag": '"abc"', "last_modified": None, "expires": None}
+        reader._source.late_tile_received.emit(tile, data)
+        self.assertTrue(get_cache_entry(cache_name=reader._source.name(), zoom_level=14, x=8568, y=5747))
+
+    def test_update_layer_source_with_wkb_features(self):
+        feature_collection = self._get_collection_with_wkb_features()
+        path = os.path.join(tempfile.mkdtemp(), "water.Point.geojson")
+        VtReader._update_layer_source(path, feature_collection)
+        layer = QgsVectorLayer(path, "water", "ogr")
+        self.assertEqual(2, layer.featureCount())
+        features = sorted(layer.getFeatures(), key=lambda f: f["_col"])
+        self.assertEqual("ocean", features[0]["class"])
+        self.assertEqual(2.5, features[1]["depth"])
+        self.assertEqual((1.0, 2.0), (features[0].geometry().asPoint().x(), features[0].geometry().asPoint().y()))
+        shutil.rmtree(os.path.dirname(path))
+
+    def test_update_layer_source_with_mixed_features(self):
+        feature_collection = self._get_collection_with_wkb_features()
+        feature_collection["features"].append(
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [5.0, 6.0]}, "properties": {"_col": 3}}
+        )
+        path = os.path.join(tempfile.mkdtemp(), "water.Point.geojson")
+        VtReader._update_layer_source(path, feature_collection)
+        with open(path) as f:
+            written = json.load(f)
+        coordinates = [f["geometry"]["coordinates"] for f in written["features"]]
+        self.assertEqual([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], coordinates)
+        # the collection itself keeps the WKB features
+        self.assertIn("wkb", feature_collection["features"][0])
+        shutil.rmtree(os.path.dirname(path))
+
+    @staticmethod
+    def _get_collection_with_wkb_features():
+        crs = {"type": "name", "properties": {"name": "urn:ogc:def:crs:EPSG::3857"}}
+        features = [
+            {
+                "type": "Feature",
+                "wkb": struct.pack("<BI2d", 1, 1, 1.0, 2.0),
+                "properties": {"class": "ocean", "depth": 2, "_col": 1},
+            },
+            {"type": "Feature", "wkb": struct.pack("<BI2d", 1, 1, 3.0, 4.0), "properties": {"depth": 2.5, "_col": 2}},
+        ]
+        return {"type": "FeatureCollection", "crs": crs, "tiles": [], "features": features}
+
     def _load(
         self,
         iface,